@@ -2,34 +2,120 @@ from fastapi import FastAPI
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import TYPE_CHECKING, Dict, Any, Optional, List
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 import os
+import re
+import atexit
+import shutil
+import logging
+import sys
+import hmac
+import json
+import time
+import random
+import threading
 from dotenv import load_dotenv
-from urllib.parse import quote_plus, urlparse
-
-from util.calculos_util import calcular_pegada_completa
-from services.db_service import (
-    register_user_api as sqlite_register_user_api,
-    login_user_api as sqlite_login_user_api,
-    get_user_by_id as sqlite_get_user_by_id,
-    update_user as sqlite_update_user,
-    save_user_daily_data as sqlite_save_user_daily_data,
-    load_user_daily_data as sqlite_load_user_daily_data,
-    load_user_monthly_data as sqlite_load_user_monthly_data,
-    get_monthly_ranking as sqlite_get_monthly_ranking,
-    get_user_achievements as sqlite_get_user_achievements,
-)
-from services.mongo_service import MongoService
-from config.dicas import DICAS_REDUCAO
-from config.fatores_emissao import FATORES_EMISSAO
+from urllib.parse import urlparse
 
+# Antes dos módulos de util, que leem parte da configuração na importação (METRICAS, RASTREIO)
 load_dotenv()
 
+from util.calculos_util import calcular_pegada_unitaria, calcular_pegada_lote
+from services.repositorio import Repositorio, RepositorioEmCache
+from services.fatores_service import RecarregadorFatores, FonteFatoresArquivo, FonteFatoresBanco
+from config.dicas import DICAS_REDUCAO
+from util.fatores_util import obter_tabela_fatores
+from util.cache_util import AUSENTE, CacheLRU, UnicoVoo
+from util.escrita_util import GravadorEmGrupo
+from util.senhas_util import FilaSenhasCheia, LimitadorFalhas, TempoSenhasEsgotado, executor_senhas
+from util.ranking_util import Placares, RankingsPorJanela, intervalo_periodo
+from util.assincrono_util import ExecutorBanco
+from util.admissao_util import ClasseAdmissao, ControleAdmissao
+from util.compartilhado_util import CacheCompartilhado, instancia, pasta_padrao
+from util.metricas_util import ChamadasMedidas, formatar, metricas
+from util.rastreio_util import INSTALADO as RASTREIO_INSTALADO, ExportadorRastreio, Rastreio, rastreado, trecho
+from util.perfil_util import AmostradorPerfil
+
+# Backends são importados só quando selecionados (pymongo/certifi não pesam no SQLite)
+if TYPE_CHECKING:
+    from services.mongo_service import MongoService
+    from services.mongo_service_async import AsyncMongoService
+
 app = FastAPI()
 
+
+"""
+Controle de admissão por classe de rotas (por worker): cada classe tem seu limite de
+requisições simultâneas (ADMISSAO_<CLASSE>_LIMITE) e prazo máximo de espera na fila
+(ADMISSAO_<CLASSE>_PRAZO_MS). Passado o prazo, ou com a fila cheia, responde 503 na hora
+com Retry-After. Rotas baratas (/dicas, /fatores-emissao, /health) não entram em fila.
+ADMISSAO=0 desliga o controle.
+"""
+ADMISSAO_PADROES = {
+    # classe: (limite, prazo em ms)
+    "calculo": (16, 500),
+    "autenticacao": (16, 1000),
+    "leitura_historico": (64, 1000),
+    "gravacao_historico": (32, 2000),
+    "ranking": (16, 1000),
+}
+controle_admissao = ControleAdmissao(
+    [
+        ClasseAdmissao(
+            nome,
+            int(os.getenv(f"ADMISSAO_{nome.upper()}_LIMITE", str(limite))),
+            float(os.getenv(f"ADMISSAO_{nome.upper()}_PRAZO_MS", str(prazo_ms))) / 1000,
+        )
+        for nome, (limite, prazo_ms) in ADMISSAO_PADROES.items()
+    ],
+    [
+        ("/pegada/calcular", None, "calculo"),
+        ("/autenticacao/", None, "autenticacao"),
+        ("/usuarios/", None, "autenticacao"),
+        ("/historico/diario/salvar", None, "gravacao_historico"),
+        ("/historico/", None, "leitura_historico"),
+        ("/conquistas/", None, "leitura_historico"),
+        ("/ranking", None, "ranking"),
+    ],
+)
+
+
+class MiddlewareAdmissao:
+    """Middleware ASGI: a vaga da classe só é liberada depois de enviado todo o corpo (inclusive streaming)."""
+
+    def __init__(self, app, controle: ControleAdmissao):
+        self.app = app
+        self.controle = controle
+
+    async def __call__(self, scope, receive, send):
+        classe = self.controle.classificar(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if classe is None:
+            return await self.app(scope, receive, send)
+        with trecho("admissao", classe=classe.nome):
+            admitida = await classe.entrar()
+        if not admitida:
+            resposta = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"success": False, "message": f"Servidor ocupado ({classe.nome}); tente novamente em instantes."},
+                headers={"Retry-After": str(classe.retry_after())},
+            )
+            return await resposta(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            classe.sair()
+
+
+ADMISSAO_ATIVA = str(os.getenv("ADMISSAO", "1")).lower() in ("1", "true", "yes")
+if ADMISSAO_ATIVA:
+    # Adicionado antes do CORS, fica dentro dele: as respostas 503 também levam os cabeçalhos CORS
+    app.add_middleware(MiddlewareAdmissao, controle=controle_admissao)
+
 # CORS
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",") if o.strip()]
 app.add_middleware(
@@ -41,6 +127,161 @@ app.add_middleware(
 )
 
 
+"""
+Métricas no formato do Prometheus em GET /metrics (METRICAS=1, padrão; 0 desliga a coleta):
+requisições e latência por rota, duração de cada chamada ao banco, bcrypt, motor de cálculo,
+acertos dos caches, admissão e consultas lentas (acima de METRICAS_CONSULTA_LENTA_MS, também no
+log e em GET /metricas/consultas-lentas). Com o cache compartilhado, cada worker publica suas
+métricas na pasta dele a cada METRICAS_PUBLICACAO_SEGUNDOS e /metrics soma as de todos os
+workers do host.
+"""
+DURACAO_HTTP = metricas.histograma("http_duracao_segundos", "Duração das requisições por rota", ("metodo", "rota", "status"))
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: mede cada requisição até o fim do corpo, rotulada pelo caminho declarado da
+    rota. A série do histograma de cada (método, rota, status) é guardada na primeira requisição;
+    as seguintes não montam rótulos nem os procuram no histograma.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._series: Dict[tuple, list] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        codigo = [500]  # sem resposta (exceção não tratada)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                codigo[0] = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            # Caminho declarado (/usuarios/{user_id}), não o da URL, para não multiplicar as séries
+            chave = (scope["method"], getattr(scope.get("route"), "path", "nao_encontrada"), codigo[0])
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = DURACAO_HTTP.serie(chave[:2] + (str(chave[2]),))
+            DURACAO_HTTP.observar_serie(serie, duracao)
+
+
+if metricas.ativo:
+    # Adicionado por último, fica por fora dos outros: inclui a espera na fila de admissão e os 503
+    app.add_middleware(MiddlewareMetricas)
+
+
+"""
+Rastreio por requisição (RASTREIO=1; desligado por padrão): trechos da espera na admissão,
+autenticação, repositório, cada chamada ao banco, decodificação de JSON, cálculo, agregação do
+ranking e codificação da resposta, gravados em RASTREIO_ARQUIVO (JSONL, uma requisição por
+linha) para a fração RASTREIO_AMOSTRAGEM das requisições. Perfil de uma requisição: com
+PERFIL_TOKEN definido, o cabeçalho `X-Perfil: <PERFIL_TOKEN>` troca a resposta pelo perfil por
+amostragem (a cada PERFIL_INTERVALO_MS) e pelos trechos dela. Com os dois desligados, o
+middleware e a rota rastreada não são instalados e os pontos de rastreio só leem uma ContextVar.
+"""
+RASTREIO_ATIVO = str(os.getenv("RASTREIO", "0")).lower() in ("1", "true", "yes")
+RASTREIO_AMOSTRAGEM = float(os.getenv("RASTREIO_AMOSTRAGEM", "1"))
+RASTREIO_TRECHOS_MAX = int(os.getenv("RASTREIO_TRECHOS_MAX", "500"))
+PERFIL_TOKEN = os.getenv("PERFIL_TOKEN", "").strip().encode()
+PERFIL_INTERVALO_SEGUNDOS = float(os.getenv("PERFIL_INTERVALO_MS", "1")) / 1000
+exportador_rastreio = ExportadorRastreio(os.getenv("RASTREIO_ARQUIVO", "rastreio.jsonl")) if RASTREIO_ATIVO else None
+
+
+class MiddlewareRastreio:
+    """
+    Middleware ASGI: abre o rastreio das requisições sorteadas (RASTREIO_AMOSTRAGEM), que levam
+    o id no cabeçalho X-Rastreio, ou com o cabeçalho de perfil, cuja resposta é descartada e
+    trocada pelo perfil.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _perfil_pedido(scope) -> bool:
+        if not PERFIL_TOKEN:
+            return False
+        for nome, valor in scope["headers"]:
+            if nome == b"x-perfil":
+                return hmac.compare_digest(valor, PERFIL_TOKEN)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        perfil = self._perfil_pedido(scope)
+        exportar = exportador_rastreio is not None and random.random() < RASTREIO_AMOSTRAGEM
+        if not (perfil or exportar):
+            return await self.app(scope, receive, send)
+        rastreio = Rastreio(RASTREIO_TRECHOS_MAX, perfil=perfil)
+        codigo = [500]  # sem resposta (exceção não tratada)
+        amostrador = None
+        if perfil:
+            # O quadro desta corrotina identifica, na pilha do event loop, as amostras desta requisição
+            amostrador = AmostradorPerfil(rastreio, sys._getframe(), threading.get_ident(), PERFIL_INTERVALO_SEGUNDOS)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                codigo[0] = mensagem["status"]
+                mensagem = {**mensagem, "headers": [*mensagem.get("headers", ()), (b"x-rastreio", rastreio.id.encode())]}
+            if amostrador is None:
+                await send(mensagem)
+
+        token = rastreio.ativar()
+        if amostrador:
+            amostrador.iniciar()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if amostrador:
+                amostrador.parar()
+            rastreio.desativar(token)
+            campos = {"metodo": scope["method"], "rota": getattr(scope.get("route"), "path", "nao_encontrada"),
+                      "caminho": scope["path"], "status": codigo[0]}
+            if exportar:
+                exportador_rastreio.enviar(rastreio, **campos)
+        if amostrador:
+            resposta = JSONResponse({**rastreio.exportar(**campos), "perfil": amostrador.resultado()}, headers={"X-Rastreio": rastreio.id})
+            await resposta(scope, receive, send)
+
+
+class RotaRastreada(APIRoute):
+    """Rota com os trechos `rota` (dependências, função, serialização e resposta) e `endpoint` (só a função)."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, rastreado("endpoint", funcao=endpoint.__name__)(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        manipulador = super().get_route_handler()
+
+        async def manipulador_rastreado(request):
+            with trecho("rota"):
+                return await manipulador(request)
+        return manipulador_rastreado
+
+
+class RespostaJSON(JSONResponse):
+    """JSONResponse com o trecho `codificacao` (json.dumps do corpo)."""
+
+    def render(self, content) -> bytes:
+        with trecho("codificacao"):
+            return super().render(content)
+
+
+if RASTREIO_INSTALADO:
+    # Antes da declaração das rotas; o middleware fica por fora dos outros (inclui a admissão)
+    app.router.route_class = RotaRastreada
+    app.router.default_response_class = RespostaJSON
+    app.add_middleware(MiddlewareRastreio)
+
+
 # MODELS
 class UserRegisterRequest(BaseModel):
     username: str
@@ -94,13 +335,27 @@ class PegadaRequest(BaseModel):
     kg_creditos_carbono: float = 0.0
 
 
+class PegadaLoteRequest(BaseModel):
+    itens: List[PegadaRequest]
+
+
 class SaveDailyDataRequest(BaseModel):
     user_id: Optional[int] = None  # Será validado contra o token, se presente
     date: str  # formato 'YYYY-MM-DD'
-    pegada_total: float
+    pegada_total: Optional[float] = None  # ignorado: a pegada é calculada no servidor a partir de input_data
     input_data: Dict[str, Any]
 
 
+class DiaLoteItem(BaseModel):
+    date: str  # formato 'YYYY-MM-DD'
+    input_data: Dict[str, Any]  # mesmos campos de PegadaRequest; validado linha a linha
+
+
+class SaveDailyBatchRequest(BaseModel):
+    user_id: Optional[int] = None  # Será validado contra o token, se presente
+    itens: List[DiaLoteItem]
+
+
 class LoadDailyDataRequest(BaseModel):
     user_id: Optional[int] = None
     date: str  # formato 'YYYY-MM-DD'
@@ -131,22 +386,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+"""
+Cache dos tokens já verificados (por worker): assinatura e expiração conferidas guardam o
+`sub`, para não decodificar o JWT de novo. Os usuários resolvidos pelo id ficam no cache do
+repositório (REPOSITORIO_CACHE_TTL_SEGUNDOS), invalidados na hora por update_user neste worker.
+"""
+AUTH_CACHE_TAMANHO = int(os.getenv("AUTH_CACHE_TAMANHO", "10000"))
+AUTH_CACHE_TTL_SEGUNDOS = float(os.getenv("AUTH_CACHE_TTL_SEGUNDOS", "30"))
+cache_tokens = CacheLRU(AUTH_CACHE_TAMANHO, ttl=AUTH_CACHE_TTL_SEGUNDOS, nome="tokens")
+
+
+@rastreado("autenticacao")
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        sub = payload.get("sub")
-        if sub is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
-        # Não force conversão aqui; deixe cada backend lidar com o tipo (Mongo: str, SQLite: int)
-        user_id = sub
-    except (JWTError, ValueError):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
-
-    user = get_user_by_id(user_id)
+    verificado = cache_tokens.obter(token)
+    if verificado is not AUSENTE and verificado[1] > time.time():
+        user_id = verificado[0]
+    else:
+        try:
+            with trecho("autenticacao.jwt"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            sub = payload.get("sub")
+            if sub is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+            # Não force conversão aqui; deixe cada backend lidar com o tipo (Mongo: str, SQLite: int)
+            user_id = sub
+        except (JWTError, ValueError):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
+        if payload.get("exp") is not None:
+            cache_tokens.definir(token, (user_id, float(payload["exp"])))
+
+    user = await get_user_by_id_async(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuário não encontrado")
-    return user
+    return dict(user)
 
 
 # SAÚDE
@@ -159,55 +432,51 @@ def raiz():
 def health_db():
     try:
         if DB_BACKEND == "MONGO" and mongo:
-            # ping no Mongo
+            # ping no Mongo (levanta o erro de conexão, mostrado abaixo)
             mongo.client.admin.command('ping')
-            # Retorna algumas infos não sensíveis para ajudar no diagnóstico
-            info = {"ok": True, "backend": "MONGO"}
-            try:
-                info.update(MONGO_CONN_INFO)
-            except Exception:
-                pass
-            return info
-        else:
-            # verificação simples no SQLite via função já existente
-            test = sqlite_get_user_by_id(-1)  # deve retornar None rapidamente
-            return {"ok": True, "backend": "SQLITE"}
+        elif not repositorio.ping():
+            raise RuntimeError("banco não respondeu")
+        # Retorna algumas infos não sensíveis para ajudar no diagnóstico
+        info = {"ok": True, "backend": DB_BACKEND}
+        if mongo:
+            info["aquecimento"] = {"concluido": mongo.aquecido.is_set(), "erro": mongo.erro_aquecimento}
+        if gravador_diario:
+            info["grupo_commit"] = gravador_diario.estatisticas()
+        info["repositorio"] = repositorio.estatisticas()
+        info["placares"] = placares.estatisticas()
+        if compartilhado:
+            info["cache_compartilhado"] = compartilhado.estatisticas()
+        info["rankings_janela"] = rankings_janela.estatisticas()
+        info["cargas_placar"] = cargas_placar.estatisticas()
+        info["autenticacao"] = cache_tokens.estatisticas()
+        info["senhas"] = executor_senhas.estatisticas()
+        info["falhas_login"] = limitador_login.estatisticas()
+        info["executor_banco"] = executor_banco.estatisticas()
+        if exportador_rastreio:
+            info["rastreio"] = exportador_rastreio.estatisticas()
+        info.update(MONGO_CONN_INFO)
+        return info
     except Exception as e:
         info = {"ok": False, "backend": DB_BACKEND, "error": str(e)}
-        try:
-            if DB_BACKEND == "MONGO":
-                info.update(MONGO_CONN_INFO)
-        except Exception:
-            pass
+        info.update(MONGO_CONN_INFO)
         return info
 
 
 """
-Seleção do backend de dados (SQLite ou MongoDB) via variável de ambiente DB_BACKEND.
-Valores aceitos: 'MONGO' para MongoDB, qualquer outro valor -> SQLite.
+Seleção do backend de dados via variável de ambiente DB_BACKEND: 'MONGO' para MongoDB,
+'MEMORIA' para o repositório em memória (testes e benchmarks), qualquer outro valor -> SQLite.
 """
 DB_BACKEND = os.getenv("DB_BACKEND", "SQLITE").upper()
-mongo: Optional[MongoService] = None
+mongo: Optional["MongoService"] = None
+mongo_async: Optional["AsyncMongoService"] = None
 MONGO_CONN_INFO: Dict[str, Any] = {}
 if DB_BACKEND == "MONGO":
-    MONGODB_URI = os.getenv("MONGODB_URI", "").strip()
+    from services.mongo_service import MongoService, uri_do_ambiente
+    from services.mongo_service_async import AsyncMongoService
+
+    # MONGODB_URI ou a URI montada de variáveis separadas (MONGODB_USER, MONGODB_PASSWORD, MONGODB_HOST)
+    MONGODB_URI = uri_do_ambiente()
     MONGODB_DBNAME = os.getenv("MONGODB_DBNAME", "ecoechos")
-    # Permite construir a URI a partir de variáveis separadas, caso MONGODB_URI não esteja definida
-    if not MONGODB_URI:
-        MONGODB_USER = os.getenv("MONGODB_USER", "").strip()
-        MONGODB_PASSWORD = os.getenv("MONGODB_PASSWORD", "").strip()
-        MONGODB_HOST = os.getenv("MONGODB_HOST", "").strip()  # ex.: cluster0.xxxxx.mongodb.net
-        MONGODB_APPNAME = os.getenv("MONGODB_APPNAME", "EcoEchos").strip()
-        MONGODB_AUTH_SOURCE = os.getenv("MONGODB_AUTH_SOURCE", "admin").strip()
-        MONGODB_AUTH_MECH = os.getenv("MONGODB_AUTH_MECH", "").strip()  # opcional, ex.: SCRAM-SHA-256
-        if MONGODB_USER and MONGODB_PASSWORD and MONGODB_HOST:
-            mech_q = f"&authMechanism={MONGODB_AUTH_MECH}" if MONGODB_AUTH_MECH else ""
-            MONGODB_URI = (
-                f"mongodb+srv://{quote_plus(MONGODB_USER)}:{quote_plus(MONGODB_PASSWORD)}@{MONGODB_HOST}/"
-                f"?retryWrites=true&w=majority&appName={MONGODB_APPNAME}&authSource={MONGODB_AUTH_SOURCE}{mech_q}"
-            )
-    if not MONGODB_URI:
-        raise RuntimeError("MONGODB_URI não definido e variáveis (MONGODB_USER, MONGODB_PASSWORD, MONGODB_HOST) ausentes")
     # Prepara informações não sensíveis para health
     mode = "URI" if os.getenv("MONGODB_URI", "").strip() else "COMPONENTS"
     host = ""
@@ -225,7 +494,75 @@ if DB_BACKEND == "MONGO":
         "authSource": os.getenv("MONGODB_AUTH_SOURCE", "admin").strip(),
         "authMechanism": os.getenv("MONGODB_AUTH_MECH", "").strip() or None,
     }
-    mongo = MongoService(MONGODB_URI, MONGODB_DBNAME)
+    # Índices criados em segundo plano: o worker não espera o servidor para subir
+    mongo = MongoService(MONGODB_URI, MONGODB_DBNAME, aquecer_em_segundo_plano=True)
+    mongo_async = AsyncMongoService(MONGODB_URI, MONGODB_DBNAME)
+    banco: Repositorio = mongo
+elif DB_BACKEND == "MEMORIA":
+    from services.memoria_service import MemoriaService
+
+    banco = MemoriaService()
+else:
+    from services.db_service import RepositorioSQLite, init_db as sqlite_init_db
+
+    sqlite_init_db()
+    banco = RepositorioSQLite()
+
+# Cada chamada ao banco (db_service, MongoService, leituras async) é medida; as lentas vão para o log.
+# Com rastreio ou perfil, cada chamada também vira um trecho
+METRICAS_CONSULTA_LENTA_SEGUNDOS = float(os.getenv("METRICAS_CONSULTA_LENTA_MS", "100")) / 1000
+bancos_medidos: List[ChamadasMedidas] = []
+if metricas.ativo or RASTREIO_INSTALADO:
+    banco = ChamadasMedidas(banco, DB_BACKEND.lower(), metricas, METRICAS_CONSULTA_LENTA_SEGUNDOS)
+    bancos_medidos.append(banco)
+    if mongo_async:
+        mongo_async = ChamadasMedidas(mongo_async, "mongo_async", metricas, METRICAS_CONSULTA_LENTA_SEGUNDOS)
+        bancos_medidos.append(mongo_async)
+
+"""
+Cache compartilhado entre os workers do host (CACHE_COMPARTILHADO=1, padrão; exceto no
+backend MEMORIA, cujos dados são de cada processo): quadro de versões em mmap e fotografias
+em CACHE_COMPARTILHADO_DIR (padrão: /dev/shm/ecoechos-<instância>, uma pasta por instância da
+API; ver compartilhado_util.instancia). Uma gravação em qualquer worker invalida na hora, em
+todos, o usuário gravado e os placares do mês; placares e o conjunto de fatores são lidos do
+banco/fonte por um worker e reaproveitados pelos demais. Sem fcntl (Windows), ou com a pasta
+de outro usuário ou aberta a escrita de outros, fica desligado.
+"""
+compartilhado: Optional[CacheCompartilhado] = None
+if DB_BACKEND != "MEMORIA" and str(os.getenv("CACHE_COMPARTILHADO", "1")).lower() in ("1", "true", "yes"):
+    _pasta_compartilhada = os.getenv("CACHE_COMPARTILHADO_DIR", "").strip() or pasta_padrao()
+    try:
+        compartilhado = CacheCompartilhado(_pasta_compartilhada)
+    except (OSError, RuntimeError) as e:
+        logging.getLogger(__name__).warning("Cache compartilhado desligado: %s", e)
+        compartilhado = None  # segue com os caches de cada worker
+    if compartilhado and _pasta_compartilhada == pasta_padrao() and instancia().startswith("pid-"):
+        atexit.register(shutil.rmtree, _pasta_compartilhada, True)  # pasta só deste processo
+
+"""
+Repositório com cache (por worker) de usuários, dias, totais e consolidações do mês e
+conquistas: até REPOSITORIO_CACHE_TAMANHO entradas (0 desliga o cache), expiradas após
+REPOSITORIO_CACHE_TTL_SEGUNDOS. Gravações invalidam na hora o usuário gravado: em todos os
+workers com o cache compartilhado; sem ele, só neste (nos outros, o TTL é o atraso máximo).
+Leituras simultâneas da mesma chave compartilham uma única ida ao banco.
+"""
+repositorio = RepositorioEmCache(
+    banco,
+    tamanho_maximo=int(os.getenv("REPOSITORIO_CACHE_TAMANHO", "10000")),
+    ttl=float(os.getenv("REPOSITORIO_CACHE_TTL_SEGUNDOS", "30")),
+    compartilhado=compartilhado,
+)
+
+
+"""
+Rotas async (autenticação, histórico, ranking): as chamadas bloqueantes ao banco rodam no
+executor_banco (DB_THREADS threads próprias, cada uma com sua conexão SQLite), sem ocupar o
+threadpool das rotas síncronas; as leituras do Mongo usam o driver async (mongo_async).
+"""
+executor_banco = ExecutorBanco(int(os.getenv("DB_THREADS", "32")))
+
+# Carga de um placar de ranking: requisições simultâneas da mesma janela compartilham a leitura
+cargas_placar = UnicoVoo(nome="cargas_placar")
 
 
 def as_user_id(value: Any) -> str:
@@ -233,127 +570,401 @@ def as_user_id(value: Any) -> str:
     return str(value)
 
 
-def register_user_api(username: str, password: str):
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.register_user_api(username, password)
-    return sqlite_register_user_api(username, password)
+def update_user(user_id: Any, new_username: Optional[str] = None, new_password: Optional[str] = None):
+    user_id = repositorio.normalizar_id(user_id)
+    ok, msg = repositorio.update_user(user_id, new_username, new_password)
+    if ok and new_username is not None:
+        placares.renomear(user_id, new_username)
+        rankings_janela.renomear(user_id, new_username)
+        rankings_janela.registrar_renomeacao(placares.registrar_renomeacao())
+    return ok, msg
+
+
+def save_user_daily_data(user_id: Any, date: str, pegada_total: float, input_data: Dict[str, Any], fatores_versao: Optional[str] = None):
+    user_id = repositorio.normalizar_id(user_id)
+    if gravador_diario:
+        # Group commit: retorna só depois do commit do lote que contém este dia
+        gravador_diario.enviar((user_id, date, pegada_total, input_data, fatores_versao))
+    else:
+        repositorio.save_user_daily_data(user_id, date, pegada_total, input_data, fatores_versao)
+    atualizar_placares([(user_id, date, pegada_total)])
 
 
-def login_user_api(username: str, password: str) -> Optional[Dict[str, Any]]:
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.login_user_api(username, password)
-    return sqlite_login_user_api(username, password)
+def save_user_daily_data_many(registros: List[tuple]):
+    """Grava (user_id, date, pegada_total, input_data, fatores_versao) em um único commit/bulk_write."""
+    repositorio.save_user_daily_data_many(registros)
+    atualizar_placares([(r[0], r[1], r[2]) for r in registros])
 
 
-def get_user_by_id(user_id: Any) -> Optional[Dict[str, Any]]:
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.get_user_by_id(str(user_id))
-    return sqlite_get_user_by_id(int(user_id))
+"""
+Group commit opcional para picos de gravação (GRUPO_COMMIT=1): salvamentos diários
+concorrentes são enfileirados e gravados juntos a cada GRUPO_COMMIT_INTERVALO_MS ou a cada
+GRUPO_COMMIT_MAX_LINHAS linhas, em uma transação (SQLite) ou bulk_write (Mongo).
+"""
+gravador_diario: Optional[GravadorEmGrupo] = None
+if str(os.getenv("GRUPO_COMMIT", "")).lower() in ("1", "true", "yes"):
+    gravador_diario = GravadorEmGrupo(
+        repositorio.save_user_daily_data_many,
+        max_itens=int(os.getenv("GRUPO_COMMIT_MAX_LINHAS", "256")),
+        intervalo=float(os.getenv("GRUPO_COMMIT_INTERVALO_MS", "5")) / 1000,
+        nome="diario",
+    )
 
 
-def update_user(user_id: Any, new_username: Optional[str] = None, new_password: Optional[str] = None):
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.update_user(str(user_id), new_username, new_password)
-    return sqlite_update_user(int(user_id), new_username, new_password)
+"""
+Rankings em memória (por worker). Mensais: cada mês é carregado da consolidação mensal na
+primeira consulta. Outras janelas (semana, trimestre, ano, últimos N dias, intervalo): somas
+por usuário (árvore de Fenwick) dos dias salvos, lidos por mês quando uma janela consulta o mês
+pela primeira vez. Ambos são atualizados a cada salvamento feito por este worker. Com o cache
+compartilhado, salvamentos de outros workers invalidam na hora o placar do mês (recarregado da
+fotografia do primeiro worker que o ler) e os dias do mês nas outras janelas (só esse mês é
+relido); sem ele, aparecem na recarga (RANKING_RECARGA_SEGUNDOS), que também só relê os meses
+das janelas consultadas. No máximo RANKING_MESES_MAX meses mensais e RANKING_JANELA_MESES_MAX
+meses de dias ficam em memória. Usuários sem registro no mês ou na janela aparecem com 0.
+"""
+RANKING_RECARGA_SEGUNDOS = float(os.getenv("RANKING_RECARGA_SEGUNDOS", "60"))
+placares = Placares(
+    repositorio.load_monthly_totals,
+    meses_maximo=int(os.getenv("RANKING_MESES_MAX", "24")),
+    recarga=RANKING_RECARGA_SEGUNDOS,
+    compartilhado=compartilhado,
+)
+rankings_janela = RankingsPorJanela(
+    repositorio.load_daily_totals,
+    recarga=RANKING_RECARGA_SEGUNDOS,
+    compartilhado=compartilhado,
+    meses_maximo=int(os.getenv("RANKING_JANELA_MESES_MAX", "36")),
+    carregar_usuarios=repositorio.load_usernames,
+)
 
 
-def save_user_daily_data(user_id: Any, date: str, pegada_total: float, input_data: Dict[str, Any]):
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.save_user_daily_data(str(user_id), date, pegada_total, input_data)
-    return sqlite_save_user_daily_data(int(user_id), date, pegada_total, input_data)
+def atualizar_placares(dias):
+    """Aplica nos rankings em memória os (user_id, date, pegada_total) recém-salvos."""
+    nomes: Dict[Any, Optional[str]] = {}
 
+    def nome(user_id):
+        if user_id not in nomes:
+            usuario = repositorio.get_user_by_id(user_id)
+            nomes[user_id] = usuario["username"] if usuario else None
+        return nomes[user_id]
 
-def load_user_daily_data(user_id: Any, date: str) -> Optional[Dict[str, Any]]:
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.load_user_daily_data(str(user_id), date)
-    data = sqlite_load_user_daily_data(int(user_id), date)
-    return data
+    for user_id, date, pegada_total in dias:
+        try:
+            rankings_janela.registrar_dia(user_id, date, pegada_total, None if rankings_janela.conhece(user_id) else nome(user_id))
+        except Exception:
+            pass  # sem o nome, o usuário aparece com username None até a próxima recarga
+    atualizados: Dict[str, Optional[Any]] = {}
+    for user_id, mes in {(user_id, str(date)[:7]) for user_id, date, _ in dias}:
+        placar = placares.carregado(mes)
+        atualizados.setdefault(mes, placar)
+        if placar is None:
+            continue
+        try:
+            consolidacao = repositorio.load_user_monthly_rollup(user_id, mes)
+            username = None if user_id in placar else nome(user_id)
+        except Exception:
+            # O dia já foi salvo; o mês é recarregado na próxima consulta
+            placares.descartar(mes)
+            atualizados[mes] = None
+            continue
+        placar.atualizar(user_id, consolidacao["pegada_total"] if consolidacao else 0.0, username)
+    for mes, placar in atualizados.items():
+        rankings_janela.registrar_gravacao(mes, placares.registrar_gravacao(mes, placar))
+
+
+# Versões async (rotas async): acertos do cache do repositório respondem sem sair do event
+# loop; no Mongo, as leituras usam o driver async; nos demais, o executor_banco
+async def login_user_api_async(username: str, password: str) -> Optional[Dict[str, Any]]:
+    if mongo_async:
+        return await mongo_async.login_user_api(username, password)
+    registro = await executor_banco.executar(repositorio.load_user_credentials, username)
+    # A senha é verificada no pool de senhas sem prender uma thread do executor
+    if registro and await executor_senhas.verificar_async(password, registro[2]):
+        return {"id": registro[0], "username": registro[1]}
+    return None
+
+
+async def get_user_by_id_async(user_id: Any) -> Optional[Dict[str, Any]]:
+    user_id = repositorio.normalizar_id(user_id)
+    if mongo_async:
+        carregar = lambda: mongo_async.get_user_by_id(user_id)
+    else:
+        carregar = lambda: executor_banco.executar(banco.get_user_by_id, user_id)
+    return await repositorio.obter_async("usuario", user_id, (), carregar)
 
 
-def load_user_monthly_data(user_id: Any, month_year: str) -> float:
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.load_user_monthly_data(str(user_id), month_year)
-    return sqlite_load_user_monthly_data(int(user_id), month_year)
+async def load_user_daily_data_async(user_id: Any, date: str) -> Optional[Dict[str, Any]]:
+    user_id = repositorio.normalizar_id(user_id)
+    if mongo_async:
+        carregar = lambda: mongo_async.load_user_daily_data(user_id, date)
+    else:
+        carregar = lambda: executor_banco.executar(banco.load_user_daily_data, user_id, date)
+    return await repositorio.obter_async("dia", user_id, (date,), carregar)
 
 
-def get_monthly_ranking(month_year: str, limit: int = 10):
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.get_monthly_ranking(month_year, limit)
-    return sqlite_get_monthly_ranking(month_year, limit)
+def iter_user_daily_data_range_async(user_id: Any, inicio: str, fim: str, apos: Optional[str] = None, limite: Optional[int] = None):
+    user_id = repositorio.normalizar_id(user_id)
+    if mongo_async:
+        return mongo_async.iter_user_daily_data_range(user_id, inicio, fim, apos, limite)
+    return executor_banco.iterar(repositorio.iter_user_daily_data_range(user_id, inicio, fim, apos, limite))
+
+
+async def load_user_monthly_rollup_async(user_id: Any, month_year: str) -> Optional[Dict[str, Any]]:
+    user_id = repositorio.normalizar_id(user_id)
+    if mongo_async:
+        carregar = lambda: mongo_async.load_user_monthly_rollup(user_id, month_year)
+    else:
+        carregar = lambda: executor_banco.executar(banco.load_user_monthly_rollup, user_id, month_year)
+    return await repositorio.obter_async("consolidacao", user_id, (month_year,), carregar)
+
+
+async def get_user_achievements_async(user_id: Any, month_year: str):
+    user_id = repositorio.normalizar_id(user_id)
+    if mongo_async:
+        carregar = lambda: mongo_async.get_user_achievements(user_id, month_year)
+    else:
+        carregar = lambda: executor_banco.executar(banco.get_user_achievements, user_id, month_year)
+    return await repositorio.obter_async("conquistas", user_id, (month_year,), carregar)
+
+
+"""
+Fatores de emissão versionados, recarregados sem reiniciar os workers.
+FATORES_ARQUIVO=/caminho/fatores.json lê de um arquivo JSON; FATORES_FONTE=DB lê o conjunto
+ativo da tabela/coleção emission_factor_sets. Sem nenhum dos dois, usa config/fatores_emissao.py.
+"""
+FATORES_ARQUIVO = os.getenv("FATORES_ARQUIVO", "").strip()
+FATORES_FONTE = os.getenv("FATORES_FONTE", "").strip().upper()
+recarregador_fatores: Optional[RecarregadorFatores] = None
+if FATORES_ARQUIVO:
+    recarregador_fatores = RecarregadorFatores(
+        FonteFatoresArquivo(FATORES_ARQUIVO), float(os.getenv("FATORES_RECARGA_SEGUNDOS", "30")), compartilhado=compartilhado
+    )
+elif FATORES_FONTE == "DB":
+    recarregador_fatores = RecarregadorFatores(
+        FonteFatoresBanco(repositorio.get_active_factor_version, repositorio.load_active_factor_set),
+        float(os.getenv("FATORES_RECARGA_SEGUNDOS", "30")),
+        compartilhado=compartilhado,
+    )
+if recarregador_fatores:
+    recarregador_fatores.verificar()
+
+
+@app.on_event("startup")
+def iniciar_recarregador_fatores():
+    if recarregador_fatores:
+        recarregador_fatores.iniciar()
+    if metricas.ativo and compartilhado:
+        metricas.iniciar_publicacao(os.path.join(compartilhado.pasta, "metricas"), float(os.getenv("METRICAS_PUBLICACAO_SEGUNDOS", "5")))
+
+
+@app.on_event("shutdown")
+def parar_gravador_diario():
+    if gravador_diario:
+        gravador_diario.parar()  # grava o que ainda estiver na fila
+    executor_senhas.parar()
+    executor_banco.parar()
+    if exportador_rastreio:
+        exportador_rastreio.parar()
+    metricas.parar()
 
 
-def get_user_achievements(user_id: Any, month_year: str):
-    if DB_BACKEND == "MONGO" and mongo:
-        return mongo.get_user_achievements(str(user_id), month_year)
-    return sqlite_get_user_achievements(int(user_id), month_year)
 @app.post("/usuarios/registrar")
-def registrar_usuario(req: UserRegisterRequest):
-    ok, msg = register_user_api(req.username, req.password)
+async def registrar_usuario(req: UserRegisterRequest):
+    ok, msg = await executor_banco.executar(repositorio.register_user_api, req.username, req.password)
+    if ok:
+        # Os rankings listam todos os usuários cadastrados (0 sem registro no mês ou na janela)
+        try:
+            credenciais = await executor_banco.executar(repositorio.load_user_credentials, req.username)
+            if credenciais:
+                rankings_janela.registrar_cadastro(credenciais[0], credenciais[1])
+                rankings_janela.registrar_renomeacao(placares.registrar_cadastro(credenciais[0], credenciais[1]))
+        except Exception:
+            placares.limpar()  # o usuário já foi cadastrado; os meses são recarregados na próxima consulta
     return {"success": ok, "message": msg}
 
 
+# Falhas de login por username: após LOGIN_FALHAS_MAX em LOGIN_JANELA_SEGUNDOS, responde 429
+# sem verificar a senha até o fim da janela (por worker)
+limitador_login = LimitadorFalhas(
+    max_falhas=int(os.getenv("LOGIN_FALHAS_MAX", "5")),
+    janela=float(os.getenv("LOGIN_JANELA_SEGUNDOS", "300")),
+)
+
+
+@app.exception_handler(FilaSenhasCheia)
+def senhas_ocupado(request, exc: FilaSenhasCheia):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"success": False, "message": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(TempoSenhasEsgotado)
+def senhas_tempo_esgotado(request, exc: TempoSenhasEsgotado):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"success": False, "message": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.post("/autenticacao/entrar")
-def entrar(req: UserLoginRequest):
-    user_data = login_user_api(req.username, req.password)
+async def entrar(req: UserLoginRequest):
+    chave = req.username.strip().lower()
+    espera = limitador_login.bloqueado(chave)
+    if espera:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas tentativas de login; tente novamente mais tarde.",
+            headers={"Retry-After": str(espera)},
+        )
+    user_data = await login_user_api_async(req.username, req.password)
     if user_data:
+        limitador_login.limpar(chave)
         # Gera token JWT
         access_token = create_access_token({"sub": str(user_data["id"]), "username": user_data["username"]})
         return {"success": True, "access_token": access_token, "token_type": "bearer", "user": user_data}
     else:
+        limitador_login.registrar_falha(chave)
         return {"success": False, "message": "Usuário ou senha inválidos."}
 
 
 @app.get("/usuarios/{usuario_id}")
-def obter_usuario(usuario_id: int, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def obter_usuario(usuario_id: int, current_user: Dict[str, Any] = Depends(get_current_user)):
     if str(current_user["id"]) != str(usuario_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-    data = get_user_by_id(usuario_id)
+    data = await get_user_by_id_async(usuario_id)
     if data:
         return {"success": True, "user": data}
     return {"success": False, "message": "Usuário não encontrado."}
 
 
 @app.get("/usuarios/eu")
-def eu(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def eu(current_user: Dict[str, Any] = Depends(get_current_user)):
     return {"success": True, "user": current_user}
 
 
 @app.put("/usuarios/{usuario_id}")
-def atualizar_usuario(usuario_id: int, req: UserUpdateRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def atualizar_usuario(usuario_id: int, req: UserUpdateRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
     if str(current_user["id"]) != str(usuario_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-    ok, msg = update_user(usuario_id, req.username, req.password)
+    ok, msg = await executor_banco.executar(update_user, usuario_id, req.username, req.password)
     return {"success": ok, "message": msg}
 
 
 # CÁLCULO
 @app.post("/pegada/calcular")
 def calcular_pegada(req: PegadaRequest):
-    resultado = calcular_pegada_completa(req.dict())
+    resultado = calcular_pegada_unitaria(req.dict())
     return resultado
 
 
+@app.post("/pegada/calcular/lote")
+def calcular_pegada_em_lote(req: PegadaLoteRequest):
+    """Calcula a pegada de vários conjuntos de entrada em uma única chamada."""
+    resultados = calcular_pegada_lote([item.dict() for item in req.itens])
+    return {"quantidade": len(resultados), "resultados": resultados}
+
+
 # HISTÓRICO
 @app.post("/historico/diario/salvar")
-def salvar_historico_diario(req: SaveDailyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def salvar_historico_diario(req: SaveDailyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
     try:
         # Valida/usa o user_id do token
         user_id = current_user["id"] if req.user_id is None else req.user_id
         if str(user_id) != str(current_user["id"]):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-        save_user_daily_data(user_id, req.date, req.pegada_total, req.input_data)
-        return {"success": True, "message": "Dados salvos com sucesso!"}
+        try:
+            # Campos de PegadaRequest validados e normalizados; os demais são guardados como vieram
+            input_data = {**req.input_data, **PegadaRequest(**req.input_data).dict()}
+        except ValidationError as e:
+            return {"success": False, "message": "input_data inválido: " + ", ".join(str(erro["loc"][0]) for erro in e.errors())}
+        # A pegada é calculada aqui, com a tabela cuja versão fica registrada no dia
+        tabela = obter_tabela_fatores()
+        pegada_total = calcular_pegada_lote([input_data], tabela)[0]["pegada_total"]
+        await executor_banco.executar(save_user_daily_data, user_id, req.date, pegada_total, input_data, tabela.versao)
+        return {"success": True, "message": "Dados salvos com sucesso!", "pegada_total": pegada_total}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
+# Limite de dias por chamada de /historico/diario/salvar-lote (um ano com folga para reenvios)
+LOTE_DIAS_MAX = int(os.getenv("LOTE_DIAS_MAX", "5000"))
+
+
+@app.post("/historico/diario/salvar-lote")
+def salvar_historico_diario_lote(req: SaveDailyBatchRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Salva vários dias de uma vez (ex.: app móvel sincronizando após ficar offline).
+    A pegada de cada dia é calculada no servidor, em lote, e os dias válidos são gravados
+    em um único commit. Retorna o status de cada linha, na ordem recebida.
+    Rota síncrona (threadpool do FastAPI): o cálculo em lote ocupa CPU e a gravação usa o
+    backend síncrono, mesmo no Mongo.
+    """
+    user_id = current_user["id"] if req.user_id is None else req.user_id
+    if str(user_id) != str(current_user["id"]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+    if len(req.itens) > LOTE_DIAS_MAX:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Máximo de {LOTE_DIAS_MAX} dias por lote")
+
+    # Validação em uma passada: data, campos de entrada e datas repetidas (vale a última)
+    resultados: List[Dict[str, Any]] = []
+    validos: Dict[str, int] = {}  # date -> índice em `resultados`
+    entradas: Dict[int, Dict[str, Any]] = {}
+    for i, item in enumerate(req.itens):
+        resultado: Dict[str, Any] = {"date": item.date, "status": "erro"}
+        resultados.append(resultado)
+        try:
+            datetime.strptime(item.date, "%Y-%m-%d")
+        except ValueError:
+            resultado["message"] = "Data inválida; use o formato YYYY-MM-DD"
+            continue
+        try:
+            entradas[i] = PegadaRequest(**item.input_data).dict()
+        except ValidationError as e:
+            resultado["message"] = "input_data inválido: " + ", ".join(str(erro["loc"][0]) for erro in e.errors())
+            continue
+        anterior = validos.get(item.date)
+        if anterior is not None:
+            resultados[anterior].update(status="ignorado", message="Data repetida no lote; vale a última ocorrência")
+            entradas.pop(anterior)
+        validos[item.date] = i
+
+    indices = list(entradas)
+    tabela = obter_tabela_fatores()
+    calculados = calcular_pegada_lote([entradas[i] for i in indices], tabela)
+    registros = []
+    for i, calculado in zip(indices, calculados):
+        resultados[i]["pegada_total"] = calculado["pegada_total"]
+        registros.append((user_id, req.itens[i].date, calculado["pegada_total"], entradas[i], tabela.versao))
+    try:
+        if registros:
+            user_id = repositorio.normalizar_id(user_id)
+            save_user_daily_data_many([(user_id, *resto) for _, *resto in registros])
+        for i in indices:
+            resultados[i]["status"] = "salvo"
+    except Exception as e:
+        # Um único commit: se a gravação falhar, nenhum dia do lote foi salvo
+        for i in indices:
+            resultados[i].pop("pegada_total", None)
+            resultados[i]["message"] = str(e)
+    salvos = sum(1 for r in resultados if r["status"] == "salvo")
+    return {
+        "success": all(r["status"] != "erro" for r in resultados),
+        "quantidade": len(resultados),
+        "salvos": salvos,
+        "resultados": resultados,
+    }
+
+
 @app.post("/historico/diario/carregar")
-def carregar_historico_diario(req: LoadDailyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def carregar_historico_diario(req: LoadDailyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
     try:
         user_id = current_user["id"] if req.user_id is None else req.user_id
         if str(user_id) != str(current_user["id"]):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-        dados = load_user_daily_data(user_id, req.date)
+        dados = await load_user_daily_data_async(user_id, req.date)
         if dados:
             return {"success": True, "data": dados}
         else:
@@ -362,21 +973,103 @@ def carregar_historico_diario(req: LoadDailyDataRequest, current_user: Dict[str,
         return {"success": False, "message": str(e)}
 
 
+# Máximo de dias por página de /historico/diario/intervalo
+HISTORICO_PAGINA_MAX = int(os.getenv("HISTORICO_PAGINA_MAX", "1000"))
+
+
+@app.get("/historico/diario/intervalo")
+async def historico_diario_intervalo(inicio: str, fim: str, cursor: Optional[str] = None, limite: int = HISTORICO_PAGINA_MAX,
+                                     current_user: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Dias salvos do usuário entre `inicio` e `fim` (inclusive, YYYY-MM-DD) em NDJSON: uma linha
+    JSON por dia, em ordem de data, e uma última linha {"proximo_cursor": ...}. Para a página
+    seguinte, repita a chamada com `cursor` igual ao valor recebido (null = intervalo concluído).
+    """
+    for nome, valor in (("inicio", inicio), ("fim", fim), ("cursor", cursor)):
+        if valor is None:
+            continue
+        try:
+            datetime.strptime(valor, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{nome}' inválido; use o formato YYYY-MM-DD")
+    limite = max(1, min(limite, HISTORICO_PAGINA_MAX))
+    dias = iter_user_daily_data_range_async(current_user["id"], inicio, fim, cursor, limite)
+
+    async def linhas():
+        quantidade, ultimo = 0, None
+        async for dia in dias:
+            quantidade += 1
+            ultimo = dia["date"]
+            yield json.dumps(dia, ensure_ascii=False, default=str) + "\n"
+        yield json.dumps({"proximo_cursor": ultimo if quantidade == limite else None}) + "\n"
+
+    return StreamingResponse(linhas(), media_type="application/x-ndjson")
+
+
 @app.post("/historico/mensal/carregar")
-def carregar_historico_mensal(req: LoadMonthlyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def carregar_historico_mensal(req: LoadMonthlyDataRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
     try:
         user_id = current_user["id"] if req.user_id is None else req.user_id
         if str(user_id) != str(current_user["id"]):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-        dados = load_user_monthly_data(user_id, req.month_year)
-        if dados is not None:
-            return {"success": True, "data": dados}
-        else:
-            return {"success": False, "message": "Nenhum dado encontrado para este mês."}
+        # Consolidação mensal: total, dias registrados e soma por categoria em uma única leitura
+        consolidacao = await load_user_monthly_rollup_async(user_id, req.month_year)
+        dados = consolidacao["pegada_total"] if consolidacao else 0.0
+        return {"success": True, "data": dados, "consolidacao": consolidacao}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
+@app.get("/metricas/admissao")
+def metricas_admissao():
+    """Limites, ocupação, rejeições (fila cheia / prazo) e espera na fila de cada classe de rotas, neste worker."""
+    return {"ativo": ADMISSAO_ATIVA, "classes": controle_admissao.estatisticas()}
+
+
+def coletar_metricas():
+    """Contadores já mantidos pelos caches e pelo controle de admissão, lidos na exportação."""
+    caches = {
+        "repositorio": repositorio.estatisticas(),
+        "autenticacao": cache_tokens.estatisticas(),
+        "placares": placares.estatisticas(),
+    }
+    if compartilhado:
+        caches["compartilhado"] = compartilhado.estatisticas()
+    yield "cache_acertos_total", "Consultas respondidas pelo cache", ("cache",), {(n,): e["acertos"] for n, e in caches.items()}
+    yield "cache_falhas_total", "Consultas que não estavam no cache", ("cache",), {(n,): e["falhas"] for n, e in caches.items()}
+    classes = controle_admissao.estatisticas()
+    yield "admissao_admitidas_total", "Requisições admitidas por classe", ("classe",), {(c["classe"],): c["admitidas"] for c in classes}
+    rejeitadas = {}
+    for c in classes:
+        rejeitadas[(c["classe"], "fila")] = c["rejeitadas_fila"]
+        rejeitadas[(c["classe"], "prazo")] = c["rejeitadas_prazo"]
+    yield "admissao_rejeitadas_total", "Requisições rejeitadas (fila cheia ou prazo)", ("classe", "motivo"), rejeitadas
+
+
+metricas.coletor(coletar_metricas)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas de todos os workers do host, no formato texto do Prometheus."""
+    agregado = metricas.agregado()
+    acertos = agregado.get("ecoechos_cache_acertos_total")
+    falhas = agregado.get("ecoechos_cache_falhas_total")
+    if acertos and falhas:
+        agregado["ecoechos_cache_taxa_acerto"] = {
+            "tipo": "gauge", "ajuda": "Fração das consultas respondidas pelo cache", "rotulos": ("cache",), "limites": None,
+            "valores": {r: a / (a + falhas["valores"].get(r, 0)) if a else 0.0 for r, a in acertos["valores"].items()},
+        }
+    return PlainTextResponse(formatar(agregado), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/metricas/consultas-lentas")
+def consultas_lentas():
+    """Chamadas ao banco mais lentas que METRICAS_CONSULTA_LENTA_MS neste worker (as mais recentes primeiro)."""
+    lentas = sorted((c for b in bancos_medidos for c in b.lentas), key=lambda c: c["em"], reverse=True)
+    return {"limite_ms": round(1000 * METRICAS_CONSULTA_LENTA_SEGUNDOS, 2), "consultas": lentas}
+
+
 # DADOS DE CONFIG
 @app.get("/dicas")
 def obter_dicas():
@@ -385,22 +1078,101 @@ def obter_dicas():
 
 @app.get("/fatores-emissao")
 def obter_fatores_emissao():
-    return {"fatores_emissao": FATORES_EMISSAO}
+    tabela = obter_tabela_fatores()
+    return {"versao": tabela.versao, "fatores_emissao": tabela.fatores}
+
+
+@app.get("/fatores-emissao/versoes")
+def versoes_fatores_emissao():
+    """Dias salvos por versão de fatores; os de versão diferente da ativa estão defasados."""
+    versao_ativa = obter_tabela_fatores().versao
+    por_versao = repositorio.count_daily_data_by_factor_version()
+    return {
+        "versao_ativa": versao_ativa,
+        "dias_por_versao": [{"versao": v, "dias": n} for v, n in por_versao.items()],
+        "dias_defasados": sum(n for v, n in por_versao.items() if v != versao_ativa),
+        "erro_recarga": recarregador_fatores.ultimo_erro if recarregador_fatores else None,
+    }
 
 
 # GAMIFICAÇÃO
+# Máximo de posições por página de /ranking e de vizinhos em /ranking/eu
+RANKING_PAGINA_MAX = int(os.getenv("RANKING_PAGINA_MAX", "500"))
+RANKING_VIZINHOS_MAX = 50
+
+
+async def _placar_ranking(month_year: Optional[str], periodo: Optional[str], inicio: Optional[str], fim: Optional[str]):
+    """Placar e descrição da janela pedida: mês (consolidação mensal), período nomeado ou intervalo inicio/fim."""
+    try:
+        if inicio or fim:
+            if not (inicio and fim):
+                raise ValueError("informe 'inicio' e 'fim'")
+            janela = (datetime.strptime(inicio, "%Y-%m-%d").date(), datetime.strptime(fim, "%Y-%m-%d").date())
+            if janela[0] > janela[1]:
+                raise ValueError("'inicio' depois de 'fim'")
+        elif month_year or periodo:
+            janela = intervalo_periodo(month_year or periodo)
+            if re.fullmatch(r"\d{4}-\d{2}", (month_year or periodo).strip()):
+                month_year = (month_year or periodo).strip()  # mês: usa a consolidação mensal
+        else:
+            raise ValueError("informe 'month_year', 'periodo' ou 'inicio' e 'fim'")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Janela inválida: {e}")
+    placar = placares.carregado(month_year) if month_year else None
+    if placar is None:
+        # Primeira consulta da janela (ou recarga): uma única leitura no executor para todas as
+        # requisições simultâneas da mesma janela
+        if month_year:
+            placar = await cargas_placar.executar_async(("mes", month_year), lambda: executor_banco.executar(placares.obter, month_year))
+        else:
+            placar = await cargas_placar.executar_async(("janela", *janela), lambda: executor_banco.executar(rankings_janela.obter, *janela))
+    descricao = {"month_year": month_year, "periodo": periodo, "inicio": janela[0].isoformat(), "fim": janela[1].isoformat()}
+    return placar, descricao
+
+
 @app.get("/ranking")
-def ranking(month_year: str, limit: int = 10):
-    """Ranking por mês (maior pegada total primeiro). Parâmetros via query."""
-    data = get_monthly_ranking(month_year, limit)
-    return {"success": True, "month_year": month_year, "ranking": data}
+async def ranking(month_year: Optional[str] = None, periodo: Optional[str] = None, inicio: Optional[str] = None,
+            fim: Optional[str] = None, limit: int = 10, cursor: Optional[str] = None):
+    """
+    Ranking (maior pegada total primeiro) de um mês (`month_year`), de um período (`periodo`:
+    'YYYY-MM', 'YYYY-Www', 'YYYY-Qn', 'YYYY', '7d', '30d'...) ou de um intervalo `inicio`/`fim`
+    (YYYY-MM-DD, inclusive). Parâmetros via query. Para a página seguinte, repita a chamada
+    com `cursor` igual ao `proximo_cursor` recebido.
+    """
+    apos = None
+    if cursor:
+        try:
+            total, user_id = cursor.split(":", 1)
+            apos = (float(total), repositorio.normalizar_id(user_id))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'cursor' inválido")
+    limit = max(1, min(limit, RANKING_PAGINA_MAX))
+    placar, janela = await _placar_ranking(month_year, periodo, inicio, fim)
+    data = placar.pagina(limit, apos)
+    proximo = f"{data[-1]['total_pegada']}:{data[-1]['user_id']}" if len(data) == limit else None
+    return {"success": True, **janela, "participantes": len(placar), "ranking": data, "proximo_cursor": proximo}
+
+
+@app.get("/ranking/eu")
+async def ranking_eu(month_year: Optional[str] = None, periodo: Optional[str] = None, inicio: Optional[str] = None,
+               fim: Optional[str] = None, vizinhos: int = 5, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Posição do usuário no ranking da janela (mesmos parâmetros de /ranking) e até `vizinhos` posições acima e abaixo."""
+    vizinhos = max(0, min(vizinhos, RANKING_VIZINHOS_MAX))
+    placar, janela = await _placar_ranking(month_year, periodo, inicio, fim)
+    return {
+        "success": True,
+        **janela,
+        "participantes": len(placar),
+        "posicao": placar.posicao(current_user["id"]),
+        "ao_redor": placar.ao_redor(current_user["id"], vizinhos),
+    }
 
 
 @app.get("/conquistas/{usuario_id}")
-def conquistas(usuario_id: int, month_year: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+async def conquistas(usuario_id: int, month_year: str, current_user: Dict[str, Any] = Depends(get_current_user)):
     if current_user["id"] != usuario_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
-    data = get_user_achievements(usuario_id, month_year)
+    data = await get_user_achievements_async(usuario_id, month_year)
     return {"success": True, **data}
 
 
@@ -5,7 +5,8 @@ import json
 import random
 from config.fatores_emissao import FATORES_EMISSAO
 from config.dicas import DICAS_REDUCAO
-from services.db_service import init_db, register_user, login_user, save_user_daily_data, load_user_monthly_data, load_user_daily_data
+from services.db_service import init_db, load_user_monthly_data, load_user_daily_data
+from services.streamlit_service import register_user, login_user, save_user_daily_data
 from util.calculos_util import (
     calcular_pegada_energia, calcular_pegada_transporte_individual_combustivel,
     calcular_pegada_transporte_eletrico, calcular_pegada_transporte_coletivo,
@@ -0,0 +1,119 @@
+"""
+Microbenchmark do cálculo de pegada: caminho antigo (consultas aninhadas a
+FATORES_EMISSAO + cadeias if/elif) versus a tabela de fatores pré-compilada.
+
+Uso: python -m benchmarks.bench_calculo [repeticoes]
+"""
+import sys
+import timeit
+
+from config.fatores_emissao import FATORES_EMISSAO
+from util.calculos_util import calcular_pegada_completa, calcular_pegada_lote
+
+# Perfil padrão do app Streamlit (app.py)
+ENTRADA_PADRAO = {
+    "consumo_energia_kwh": 150.0, "num_botijoes_gas_13kg": 0.5, "usa_carro_moto_combustivel": True,
+    "distancia_carro_moto_combustivel": 200.0, "tipo_combustivel": "etanol", "usa_veiculo_eletrico": False,
+    "distancia_veiculo_eletrico": 0.0, "tipo_veiculo_eletrico": "carro_eletrico", "km_onibus": 50.0,
+    "km_metro": 50.0, "km_aviao_domestico": 0.0, "km_aviao_internacional": 0.0, "kg_carne_bovina": 2.5,
+    "kg_carne_suina": 1.0, "kg_frango": 3.0, "kg_peixe": 0.5, "litros_leite": 5.0, "kg_queijo": 0.8,
+    "duzias_ovo": 2, "kg_arroz": 5.0, "kg_feijao": 2.0, "kg_vegetais": 10.0, "num_comodos": 5,
+    "horas_ar_condicionado_dia": 2.0, "horas_aquecedor_dia": 0.0, "num_celulares": 0.0, "num_laptops": 0.0,
+    "num_geladeiras": 0.0, "num_televisoes": 0.0, "num_veiculos_eletricos_consumo": 0.0, "num_roupas_peca": 5.0,
+    "num_sacos_lixo_100l": 2.5, "kg_lixo_reciclavel": 5.0, "kg_eletronico": 0.2, "kg_compostagem": 3.0,
+    "num_voos_eventos_ano": 0, "horas_streaming_dia": 2.0, "num_compras_online_mes": 4,
+    "num_arvores_plantadas_mensal": 0.0, "kg_creditos_carbono": 0.0,
+}
+
+
+def calcular_pegada_dicionario(inputs):
+    """Referência: implementação anterior, com consultas aninhadas ao dicionário de fatores."""
+    F = FATORES_EMISSAO
+    g = inputs.get
+    energia = 0
+    energia += g("consumo_energia_kwh", 0.0) * F["energia_combustivel"]["eletricidade_kWh"]
+    energia += g("num_botijoes_gas_13kg", 0.0) * F["energia_combustivel"]["gas_cozinha_13kg"]
+    combustivel = 0
+    if g("usa_carro_moto_combustivel", False):
+        tipo, km = g("tipo_combustivel", "gasolina"), g("distancia_carro_moto_combustivel", 0.0)
+        if tipo == "gasolina":
+            combustivel = km / 10.0 * F["energia_combustivel"]["gasolina_litro"]
+        elif tipo == "etanol":
+            combustivel = km / 7.0 * F["energia_combustivel"]["etanol_litro"]
+        elif tipo == "diesel":
+            combustivel = km / 12.0 * F["energia_combustivel"]["diesel_litro"]
+    eletrico = 0
+    if g("usa_veiculo_eletrico", False):
+        tipo, km = g("tipo_veiculo_eletrico", "carro_eletrico"), g("distancia_veiculo_eletrico", 0.0)
+        if tipo == "carro_eletrico":
+            eletrico = km * F["transporte"]["carro_eletrico_km"]
+        elif tipo == "moto_eletrica":
+            eletrico = km * F["transporte"]["moto_km"]
+    coletivo = (
+        g("km_onibus", 0.0) * F["transporte"]["onibus_km"] + g("km_metro", 0.0) * F["transporte"]["metro_km"] +
+        g("km_aviao_domestico", 0.0) * F["transporte"]["aviao_domestico_km"] +
+        g("km_aviao_internacional", 0.0) * F["transporte"]["aviao_internacional_km"]
+    )
+    transporte = combustivel + eletrico + coletivo
+    alimentacao = 0
+    alimentacao += g("kg_carne_bovina", 0.0) * F["alimentacao"]["carne_bovina_kg"]
+    alimentacao += g("kg_carne_suina", 0.0) * F["alimentacao"]["carne_suina_kg"]
+    alimentacao += g("kg_frango", 0.0) * F["alimentacao"]["frango_kg"]
+    alimentacao += g("kg_peixe", 0.0) * F["alimentacao"]["peixe_kg"]
+    alimentacao += g("litros_leite", 0.0) * F["alimentacao"]["leite_litro"]
+    alimentacao += g("kg_queijo", 0.0) * F["alimentacao"]["queijo_kg"]
+    alimentacao += g("duzias_ovo", 0.0) * F["alimentacao"]["ovo_duzia"]
+    alimentacao += g("kg_arroz", 0.0) * F["alimentacao"]["arroz_kg"]
+    alimentacao += g("kg_feijao", 0.0) * F["alimentacao"]["feijao_kg"]
+    alimentacao += g("kg_vegetais", 0.0) * F["alimentacao"]["vegetais_kg"]
+    habitacao = 0
+    habitacao += g("num_comodos", 1) * F["habitacao"]["residencia_comodo"]
+    habitacao += g("horas_ar_condicionado_dia", 0.0) * 30 * F["habitacao"]["ar_condicionado_hora"]
+    habitacao += g("horas_aquecedor_dia", 0.0) * 30 * F["habitacao"]["aquecedor_hora"]
+    consumo = 0
+    consumo += g("num_celulares", 0.0) * F["consumo"]["celular"]
+    consumo += g("num_laptops", 0.0) * F["consumo"]["laptop"]
+    consumo += g("num_geladeiras", 0.0) * F["consumo"]["geladeira"]
+    consumo += g("num_televisoes", 0.0) * F["consumo"]["televisao"]
+    consumo += g("num_veiculos_eletricos_consumo", 0.0) * F["consumo"]["veiculo_eletrico"]
+    consumo += g("num_roupas_peca", 0.0) * F["consumo"]["roupas_peca"]
+    residuos = 0
+    residuos += g("num_sacos_lixo_100l", 0.0) * F["residuos"]["lixo_comum_saco_100l"]
+    residuos += g("kg_lixo_reciclavel", 0.0) * F["residuos"]["lixo_reciclavel_kg"]
+    residuos += g("kg_eletronico", 0.0) * F["residuos"]["eletronico_kg"]
+    residuos += g("kg_compostagem", 0.0) * F["residuos"]["compostagem_kg"]
+    estilo_vida = 0
+    estilo_vida += (g("num_voos_eventos_ano", 0) / 12) * F["estilo_vida"]["voos_eventos_ano"]
+    estilo_vida += g("horas_streaming_dia", 0.0) * 30 * F["estilo_vida"]["streaming_hora"]
+    estilo_vida += g("num_compras_online_mes", 0) * F["estilo_vida"]["compras_online_mes"]
+    creditos = 0
+    creditos += g("num_arvores_plantadas_mensal", 0.0) * F["sustentavel"]["arvores_plantadas"]
+    creditos += g("kg_creditos_carbono", 0.0) * F["sustentavel"]["creditos_carbono_kg"]
+    total = energia + transporte + alimentacao + habitacao + consumo + residuos + estilo_vida + creditos
+    return {
+        "pegada_total": total,
+        "pegadas_por_categoria": {
+            "energia_combustivel": energia, "transporte": transporte, "alimentacao": alimentacao,
+            "habitacao": habitacao, "consumo": consumo, "residuos": residuos, "estilo_vida": estilo_vida,
+        },
+    }
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    antes = calcular_pegada_dicionario(ENTRADA_PADRAO)
+    depois = calcular_pegada_completa(ENTRADA_PADRAO)
+    assert abs(antes["pegada_total"] - depois["pegada_total"]) < 1e-9, (antes, depois)
+
+    t_antes = min(timeit.repeat(lambda: calcular_pegada_dicionario(ENTRADA_PADRAO), number=repeticoes, repeat=5))
+    t_depois = min(timeit.repeat(lambda: calcular_pegada_completa(ENTRADA_PADRAO), number=repeticoes, repeat=5))
+    print(f"antes  (dicionários aninhados): {t_antes / repeticoes * 1e6:8.2f} µs/chamada")
+    print(f"depois (tabela compilada):      {t_depois / repeticoes * 1e6:8.2f} µs/chamada  ({t_antes / t_depois:.2f}x)")
+
+    lote = [ENTRADA_PADRAO] * 10000
+    t_lote = min(timeit.repeat(lambda: calcular_pegada_lote(lote), number=1, repeat=5))
+    print(f"lote NumPy (10k linhas):        {t_lote * 1e3:8.2f} ms ({t_lote / len(lote) * 1e6:.2f} µs/linha)")
+
+
+if __name__ == "__main__":
+    main()
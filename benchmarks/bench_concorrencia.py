@@ -0,0 +1,106 @@
+"""
+Latência de leitura de um dia salvo (/historico/diario/carregar) com 1, 10, 50 e 200
+requisições em voo: rota síncrona (threadpool do FastAPI, como antes) versus a rota async
+(chamada ao banco no executor_banco) e versus uma leitura async nativa (como o driver async
+do Mongo), simulada com asyncio.sleep.
+
+`atraso_ms` soma uma espera a cada leitura, simulando um banco remoto; com 0 mede só o
+SQLite local. Usa um banco temporário e o app em processo (httpx + ASGITransport), sem o
+cache do repositório; cada cliente lê um dia diferente, para as leituras não serem agrupadas.
+
+Uso: python -m benchmarks.bench_concorrencia [requisicoes_por_cliente] [atraso_ms]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+EM_VOO = (1, 10, 50, 200)
+DIAS = [(date(2025, 1, 1) + timedelta(days=i)).isoformat() for i in range(max(EM_VOO))]
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    valores = sorted(valores)
+    return valores[int(p * (len(valores) - 1))] if valores else 0.0
+
+
+async def _medir(cliente, caminho: str, cabecalhos: Dict[str, str], em_voo: int, por_cliente: int) -> Dict[str, float]:
+    latencias: List[float] = []
+
+    async def cliente_fechado(dia: str):
+        for _ in range(por_cliente):
+            inicio = time.perf_counter()
+            resposta = await cliente.post(caminho, headers=cabecalhos, json={"date": dia})
+            latencias.append(time.perf_counter() - inicio)
+            assert resposta.json()["success"], resposta.text
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_fechado(DIAS[i]) for i in range(em_voo)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "p50": 1000 * _percentil(latencias, 0.5),
+        "p95": 1000 * _percentil(latencias, 0.95),
+        "vazao": len(latencias) / duracao,
+    }
+
+
+async def _executar(por_cliente: int, atraso: float):
+    import httpx
+    from fastapi import Depends
+
+    os.environ["REPOSITORIO_CACHE_TAMANHO"] = "0"
+    import api
+
+    # Leitura com latência simulada, usada pelas rotas síncrona e async (executor)
+    ler_dia = api.banco.load_user_daily_data
+
+    def ler_dia_remoto(user_id, date):
+        if atraso:
+            time.sleep(atraso)
+        return ler_dia(user_id, date)
+
+    api.banco.load_user_daily_data = ler_dia_remoto
+
+    @api.app.post("/bench/sincrona")
+    def carregar_sincrona(req: api.LoadDailyDataRequest, current_user: Dict[str, Any] = Depends(api.get_current_user)):
+        return {"success": True, "data": api.repositorio.load_user_daily_data(current_user["id"], req.date)}
+
+    # Leitura async nativa: a espera não ocupa nenhuma thread
+    @api.app.post("/bench/nativa")
+    async def carregar_nativa(req: api.LoadDailyDataRequest, current_user: Dict[str, Any] = Depends(api.get_current_user)):
+        await asyncio.sleep(atraso)
+        return {"success": True, "data": await api.executor_banco.executar(ler_dia, int(current_user["id"]), req.date)}
+
+    rotas = (
+        ("rota síncrona", "/bench/sincrona"),
+        ("async (executor)", "/historico/diario/carregar"),
+        ("async nativa", "/bench/nativa"),
+    )
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench") as cliente:
+        await cliente.post("/usuarios/registrar", json={"username": "bench", "password": "bench"})
+        login = (await cliente.post("/autenticacao/entrar", json={"username": "bench", "password": "bench"})).json()
+        cabecalhos = {"Authorization": f"Bearer {login['access_token']}"}
+        api.save_user_daily_data_many([(login["user"]["id"], dia, 10.0, {"km_onibus": 1.0}, None) for dia in DIAS])
+
+        print(f"{por_cliente} requisições por cliente, atraso simulado de {1000 * atraso:.0f} ms, DB_THREADS={api.executor_banco.threads}")
+        for em_voo in EM_VOO:
+            partes = []
+            for nome, caminho in rotas:
+                r = await _medir(cliente, caminho, cabecalhos, em_voo, por_cliente)
+                partes.append(f"{nome}: p50 {r['p50']:7.1f} ms, p95 {r['p95']:7.1f} ms, {r['vazao']:7.0f} req/s")
+            print(f"{em_voo:4d} em voo | " + " | ".join(partes))
+
+
+def main():
+    por_cliente = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    atraso = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 20 / 1000
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)  # o app usa users.db no diretório atual
+        asyncio.run(_executar(por_cliente, atraso))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Vazão de gravação de dias no SQLite com 1, 10 e 100 escritores concorrentes:
+um commit por salvamento versus group commit (GravadorEmGrupo).
+
+Usa um banco temporário; o modo de sincronismo pode ser trocado com SQLITE_SYNCHRONOUS
+(ex.: FULL para medir com fsync em todo commit).
+
+Uso: python -m benchmarks.bench_gravacao [gravacoes_por_escritor]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_calculo import ENTRADA_PADRAO
+from services import db_service
+from util.escrita_util import GravadorEmGrupo
+
+ESCRITORES = (1, 10, 100)
+
+
+def _medir(salvar, escritores: int, por_escritor: int) -> float:
+    """Gravações por segundo com `escritores` threads salvando dias distintos."""
+    barreira = threading.Barrier(escritores + 1)
+
+    def escritor(user_id: int):
+        barreira.wait()
+        for i in range(por_escritor):
+            ano, dia = 2000 + i // 365, i % 365
+            salvar((user_id, f"{ano}-{dia // 28 % 12 + 1:02d}-{dia % 28 + 1:02d}", 100.0 + i, ENTRADA_PADRAO, None))
+
+    threads = [threading.Thread(target=escritor, args=(u,)) for u in range(1, escritores + 1)]
+    for t in threads:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in threads:
+        t.join()
+    return escritores * por_escritor / (time.perf_counter() - inicio)
+
+
+def main():
+    por_escritor = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"SQLite synchronous={db_service.SQLITE_SYNCHRONOUS}, WAL={db_service.SQLITE_WAL}, {por_escritor} gravações por escritor")
+        for escritores in ESCRITORES:
+            resultados = []
+            for modo in ("commit por gravação", "group commit"):
+                db_service.DB_NAME = os.path.join(pasta, f"bench_{escritores}_{len(resultados)}.db")
+                db_service.init_db()
+                if modo == "group commit":
+                    gravador = GravadorEmGrupo(db_service.save_user_daily_data_many, nome="bench")
+                    resultados.append(_medir(gravador.enviar, escritores, por_escritor))
+                    gravador.parar()
+                    lote_medio = gravador.estatisticas()["media_por_lote"]
+                else:
+                    resultados.append(_medir(lambda r: db_service.save_user_daily_data_many([r]), escritores, por_escritor))
+            print(
+                f"{escritores:4d} escritores: {resultados[0]:9.0f} gravações/s (commit por gravação) | "
+                f"{resultados[1]:9.0f} gravações/s (group commit, {lote_medio:.1f} por lote) | {resultados[1] / resultados[0]:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Partida a frio de um worker da API, por backend, em processos Python novos: tempo do
+interpretador, da importação do api.py e até a primeira resposta (importação + eventos de
+startup + GET /), e quais módulos pesados foram carregados. É o piso de latência de um worker
+novo adicionado pelo autoscaler.
+
+O backend MONGO usa um servidor inacessível: mede que a importação não espera o Mongo (os
+índices são criados em segundo plano). Cada execução usa uma pasta temporária nova (users.db
+vazio, sem cache compartilhado).
+
+Uso: python -m benchmarks.bench_inicializacao [repeticoes]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ("streamlit", "pandas", "pymongo", "bson", "certifi", "numpy")
+
+BACKENDS = (
+    ("SQLITE", {}),
+    ("MEMORIA", {}),
+    ("MONGO", {"MONGODB_URI": "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=2000"}),
+)
+
+# Executado em cada processo novo; imprime os tempos em JSON
+_MEDIR = """
+import json, os, sys, time
+inicio = time.perf_counter()
+import api
+importacao = time.perf_counter() - inicio
+from fastapi.testclient import TestClient
+pausa = time.perf_counter()
+with TestClient(api.app) as cliente:
+    assert cliente.get("/").status_code == 200
+primeira = importacao + time.perf_counter() - pausa
+print(json.dumps({"importacao": importacao, "primeira_resposta": primeira,
+                  "pesados": [m for m in %r if m in sys.modules]}))
+sys.stdout.flush()
+os._exit(0)  # sem esperar pools e threads de fundo
+""" % (PESADOS,)
+
+
+def _executar(codigo: str, ambiente: dict) -> Tuple[float, str]:
+    with tempfile.TemporaryDirectory() as pasta:
+        env = {**os.environ, "PYTHONPATH": RAIZ, "CACHE_COMPARTILHADO": "0", **ambiente}
+        inicio = time.perf_counter()
+        saida = subprocess.run([sys.executable, "-c", codigo], cwd=pasta, env=env, capture_output=True, text=True, check=True)
+        return time.perf_counter() - inicio, saida.stdout
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    interpretador = statistics.median(_executar("pass", {})[0] for _ in range(repeticoes))
+    print(f"{repeticoes} processos por backend; interpretador sozinho: {1000 * interpretador:.0f} ms")
+    for backend, ambiente in BACKENDS:
+        medidas = [json.loads(_executar(_MEDIR, {"DB_BACKEND": backend, **ambiente})[1].strip().splitlines()[-1]) for _ in range(repeticoes)]
+        importacao = statistics.median(m["importacao"] for m in medidas)
+        primeira = statistics.median(m["primeira_resposta"] for m in medidas)
+        print(f"{backend:8s} importação do api {1000 * importacao:6.0f} ms | "
+              f"até a primeira resposta {1000 * (interpretador + primeira):6.0f} ms | "
+              f"módulos pesados: {', '.join(medidas[-1]['pesados']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Custo da instrumentação (middleware de métricas + histograma do motor de cálculo) em
+POST /pegada/calcular. O app é chamado direto pelo ASGI, sem rede nem cliente HTTP, o que dá
+o menor tempo por requisição e, portanto, o custo relativo mais alto. No mesmo processo,
+lotes curtos com e sem instrumentação se alternam (o ruído da máquina afeta os dois lados
+igualmente); vale a mediana dos lotes de cada lado.
+
+Uso: python -m benchmarks.bench_metricas [lotes] [requisicoes_por_lote]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+CORPO = json.dumps({"consumo_energia_kwh": 150.0, "km_onibus": 50.0, "kg_carne_bovina": 2.5}).encode()
+ESCOPO = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+    "path": "/pegada/calcular", "raw_path": b"/pegada/calcular", "query_string": b"", "root_path": "",
+    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(CORPO)).encode())],
+    "client": ("127.0.0.1", 1), "server": ("bench", 80),
+}
+
+
+async def _receber():
+    return {"type": "http.request", "body": CORPO, "more_body": False}
+
+
+async def _enviar(mensagem):
+    if mensagem["type"] == "http.response.start":
+        assert mensagem["status"] == 200, mensagem
+
+
+async def _lote(app, requisicoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        await app(dict(ESCOPO), _receber, _enviar)
+    return (time.perf_counter() - inicio) / requisicoes
+
+
+async def _executar(lotes: int, por_lote: int):
+    # App sem o middleware; a versão instrumentada o acrescenta por fora, como com METRICAS=1
+    os.environ["METRICAS"] = "0"
+    os.environ["DB_BACKEND"] = "MEMORIA"
+    import api
+    from util.metricas_util import metricas
+
+    lados = {"sem métricas": (api.app, False), "com métricas": (api.MiddlewareMetricas(api.app), True)}
+    tempos = {nome: [] for nome in lados}
+    for nome, (app, ativo) in lados.items():  # aquecimento (cache do cálculo, rotas, pydantic)
+        metricas.ativo = ativo
+        await _lote(app, 200)
+    for _ in range(lotes):
+        for nome, (app, ativo) in lados.items():
+            metricas.ativo = ativo
+            tempos[nome].append(await _lote(app, por_lote))
+
+    sem = statistics.median(tempos["sem métricas"])
+    com = statistics.median(tempos["com métricas"])
+    print(f"{lotes} lotes de {por_lote} requisições por lado (mediana)")
+    print(f"sem métricas: {1e6 * sem:7.1f} µs/requisição")
+    print(f"com métricas: {1e6 * com:7.1f} µs/requisição  ({100 * (com / sem - 1):+.2f}%, {1e6 * (com - sem):+.1f} µs)")
+
+
+def main():
+    lotes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    por_lote = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)
+        asyncio.run(_executar(lotes, por_lote))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Custo do rastreio por requisição. Com RASTREIO=0 e sem PERFIL_TOKEN nada é instalado; sobra,
+em cada ponto de rastreio do código, a leitura da ContextVar (primeira medida, por trecho).
+Depois, GET /conquistas/{id} (autenticação, repositório, banco, avaliação e codificação) com o
+rastreio instalado, alternando lotes curtos com RASTREIO_AMOSTRAGEM=0 (nenhuma requisição
+rastreada) e 1 (todas rastreadas e gravadas em JSONL), no mesmo processo e backend em memória,
+chamando o app direto pelo ASGI; vale a mediana dos lotes de cada lado.
+
+Uso: python -m benchmarks.bench_rastreio [lotes] [requisicoes_por_lote]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _custo_trecho_desligado(repeticoes: int = 1_000_000) -> float:
+    from util.rastreio_util import trecho
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        pass
+    vazio = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        with trecho("bench", tipo="x"):
+            pass
+    return (time.perf_counter() - inicio - vazio) / repeticoes
+
+
+async def _receber():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _enviar(mensagem):
+    if mensagem["type"] == "http.response.start":
+        assert mensagem["status"] == 200, mensagem
+
+
+async def _lote(app, escopo, requisicoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        await app(dict(escopo), _receber, _enviar)
+    return (time.perf_counter() - inicio) / requisicoes
+
+
+async def _executar(lotes: int, por_lote: int):
+    import api
+
+    ok, _ = api.banco.register_user_api("bench", "senha-bench")
+    assert ok
+    usuario = api.banco.login_user_api("bench", "senha-bench")
+    api.save_user_daily_data(usuario["id"], "2025-01-15", 12.5, {"consumo_energia_kwh": 100.0})
+    token = api.create_access_token({"sub": str(usuario["id"])})
+    caminho = f"/conquistas/{usuario['id']}"
+    escopo = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": caminho, "raw_path": caminho.encode(), "query_string": b"month_year=2025-01", "root_path": "",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    lados = {"sem rastreio": 0.0, "com rastreio": 1.0}
+    tempos = {nome: [] for nome in lados}
+    for nome, amostragem in lados.items():  # aquecimento
+        api.RASTREIO_AMOSTRAGEM = amostragem
+        await _lote(api.app, escopo, 200)
+    for _ in range(lotes):
+        for nome, amostragem in lados.items():
+            api.RASTREIO_AMOSTRAGEM = amostragem
+            tempos[nome].append(await _lote(api.app, escopo, por_lote))
+    api.exportador_rastreio.parar()
+    api.executor_senhas.parar()
+
+    sem = statistics.median(tempos["sem rastreio"])
+    com = statistics.median(tempos["com rastreio"])
+    with open(os.environ["RASTREIO_ARQUIVO"]) as f:
+        trechos = len(json.loads(f.readline())["trechos"])
+    print(f"{lotes} lotes de {por_lote} requisições por lado (mediana); "
+          f"{api.exportador_rastreio.gravados} rastreios gravados, {trechos} trechos por requisição")
+    print(f"sem rastreio: {1e6 * sem:7.1f} µs/requisição")
+    print(f"com rastreio: {1e6 * com:7.1f} µs/requisição  ({100 * (com / sem - 1):+.2f}%)")
+
+
+def main():
+    lotes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    por_lote = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)
+        # Antes de importar util.rastreio_util (lido na importação)
+        os.environ.update(DB_BACKEND="MEMORIA", RASTREIO="1", RASTREIO_ARQUIVO=os.path.join(pasta, "rastreio.jsonl"), METRICAS="0")
+        print(f"ponto de rastreio sem requisição rastreada: {1e9 * _custo_trecho_desligado():.0f} ns")
+        asyncio.run(_executar(lotes, por_lote))
+
+
+if __name__ == "__main__":
+    main()
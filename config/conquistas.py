@@ -0,0 +1,29 @@
+# Métricas acumuladas por mês a partir de cada dia salvo (além de "dias" e "pegada_total").
+# "soma": soma dos campos do input_data; "se_todos"/"se_algum": o dia conta 1 se todos/algum
+# dos campos for verdadeiro ou maior que zero.
+METRICAS_DIARIAS = {
+    "coletivo_km": {"soma": ("km_onibus", "km_metro")},
+    "carro_km": {"soma": ("distancia_carro_moto_combustivel",)},
+    "dias_eletrico": {"se_todos": ("usa_veiculo_eletrico", "distancia_veiculo_eletrico")},
+    "dias_plantio": {"se_algum": ("num_arvores_plantadas_mensal", "kg_creditos_carbono")},
+}
+
+# Regras das conquistas, avaliadas sobre o estado incremental de cada usuário.
+# escopo "mes": compara uma métrica do mês consultado com "valor" ou com outra métrica ("comparar_com");
+# escopo "sequencia_dias": maior sequência de dias seguidos com registro;
+# escopo "sequencia_meses": maior sequência de meses seguidos (com registro) em que a métrica atende à condição.
+CONQUISTAS = [
+    {"key": "registro_iniciado", "title": "Registro Iniciado", "escopo": "mes", "metrica": "dias", "operador": ">=", "valor": 1,
+     "details": "{dias} dia(s) registrado(s)"},
+    {"key": "consistencia_bronze", "title": "Consistência Bronze", "escopo": "mes", "metrica": "dias", "operador": ">=", "valor": 5},
+    {"key": "consistencia_prata", "title": "Consistência Prata", "escopo": "mes", "metrica": "dias", "operador": ">=", "valor": 10},
+    {"key": "consistencia_ouro", "title": "Consistência Ouro", "escopo": "mes", "metrica": "dias", "operador": ">=", "valor": 20},
+    {"key": "transporte_coletivo", "title": "Transporte Coletivo Adepto", "escopo": "mes", "metrica": "coletivo_km", "operador": ">",
+     "comparar_com": "carro_km"},
+    {"key": "eletrificado", "title": "Eletrificado", "escopo": "mes", "metrica": "dias_eletrico", "operador": ">", "valor": 0},
+    {"key": "plantador", "title": "Plantador/Compensador", "escopo": "mes", "metrica": "dias_plantio", "operador": ">", "valor": 0},
+    {"key": "sequencia_30_dias", "title": "30 Dias Seguidos", "escopo": "sequencia_dias", "operador": ">=", "valor": 30,
+     "details": "Maior sequência: {sequencia} dia(s)"},
+    {"key": "seis_meses_abaixo_400", "title": "Seis Meses Abaixo de 400 kg", "escopo": "sequencia_meses", "metrica": "pegada_total",
+     "condicao": "<", "limite": 400, "operador": ">=", "valor": 6, "details": "Maior sequência: {sequencia} mês(es)"},
+]
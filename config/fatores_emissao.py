@@ -55,4 +55,11 @@ FATORES_EMISSAO = {
         "creditos_carbono_kg": -1.0,
     }
 }
-    
\ No newline at end of file
+    
+
+# Rendimento médio (km por litro) usado para converter distância em litros consumidos
+RENDIMENTO_COMBUSTIVEL_KM_LITRO = {
+    "gasolina": 10.0,
+    "etanol": 7.0,
+    "diesel": 12.0,
+}
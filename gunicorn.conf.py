@@ -0,0 +1,19 @@
+"""
+Configuração lida pelo gunicorn (./gunicorn.conf.py, o padrão) no processo master.
+
+Gera o identificador desta instância antes do fork: todos os workers herdam ECOECHOS_INSTANCIA
+e usam a mesma pasta de cache compartilhado, diferente da de qualquer outra instância no host
+(ver util/compartilhado_util.py). Ao encerrar, o master remove essa pasta.
+"""
+import os
+import shutil
+import uuid
+
+os.environ.setdefault("ECOECHOS_INSTANCIA", uuid.uuid4().hex)
+
+
+def on_exit(server):
+    if not os.getenv("CACHE_COMPARTILHADO_DIR", "").strip():
+        from util.compartilhado_util import pasta_padrao
+
+        shutil.rmtree(pasta_padrao(), ignore_errors=True)
@@ -0,0 +1,44 @@
+"""
+Backfill da consolidação mensal: reconstrói monthly_data (total, dias registrados e soma
+por categoria de cada usuário/mês) e o estado das conquistas de cada usuário a partir de
+todos os dias já salvos em daily_data.
+
+Depois disso ambos são mantidos por save_user_daily_data a cada salvamento; rode de
+novo apenas se os dados diários forem alterados por fora da aplicação.
+
+Uso:
+    python -m scripts.consolidar_mensal [--backend SQLITE|MONGO] [--db users.db] [--bloco 5000]
+"""
+import argparse
+import json
+import os
+import time
+
+
+def main(argv=None):
+    from services import db_service
+    parser = argparse.ArgumentParser(description="Reconstrói a consolidação mensal e as conquistas a partir de daily_data.")
+    parser.add_argument("--backend", default=os.getenv("DB_BACKEND", "SQLITE").upper(), choices=["SQLITE", "MONGO"])
+    parser.add_argument("--db", default=db_service.DB_NAME, help="Arquivo SQLite (backend SQLITE)")
+    parser.add_argument("--bloco", type=int, default=5000, help="Dias lidos por bloco")
+    args = parser.parse_args(argv)
+
+    inicio = time.monotonic()
+    if args.backend == "MONGO":
+        from services.mongo_service import MongoService, uri_do_ambiente
+        service = MongoService(uri_do_ambiente(), os.getenv("MONGODB_DBNAME", "ecoechos"))
+        try:
+            meses = service.rebuild_monthly_rollups(args.bloco)
+            usuarios = service.rebuild_achievement_states()
+        finally:
+            service.client.close()
+    else:
+        db_service.DB_NAME = args.db
+        db_service.init_db()  # garante o esquema atual (migra monthly_data de versões antigas)
+        meses = db_service.rebuild_monthly_rollups(args.bloco)
+        usuarios = db_service.rebuild_achievement_states()
+    print(json.dumps({"backend": args.backend, "meses_consolidados": meses, "conquistas_consolidadas": usuarios, "segundos": round(time.monotonic() - inicio, 3)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Recalcula o `pegada_total` de todos os dias salvos (daily_data) com a tabela de fatores
+atual — útil depois de trocar os fatores de emissão. Os fatores vêm da mesma fonte da API:
+--fatores/FATORES_ARQUIVO, o conjunto ativo do banco com FATORES_FONTE=DB, ou os embutidos.
+No Mongo, a conexão usa MONGODB_URI ou as variáveis separadas (MONGODB_USER, ...), como a API.
+
+- Lê daily_data em blocos por paginação keyset (id / _id), sem carregar tudo em memória;
+- recalcula cada bloco em um pool de processos (json.loads + cálculo em lote);
+- grava os resultados em uma transação por bloco (SQLite) ou um bulk_write (Mongo);
+- salva um checkpoint após cada bloco gravado, permitindo retomar de onde parou;
+- em --dry-run apenas conta as divergências, sem gravar nada;
+- ao final, se algum dia foi regravado, reconstrói a consolidação mensal (monthly_data),
+  já que totais e categorias de cada mês mudam com os novos fatores.
+
+Uso:
+    python -m scripts.recalcular_pegadas [--backend SQLITE|MONGO] [--db users.db]
+        [--fatores fatores.json | --fatores-fonte DB] [--bloco 5000] [--processos N]
+        [--checkpoint recalculo.checkpoint.json] [--dry-run] [--reiniciar]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.fatores_service import FonteFatoresArquivo, FonteFatoresBanco, compilar_conjunto_fatores
+from util.calculos_util import calcular_pegada_lote
+from util.fatores_util import ativar_tabela_fatores, obter_tabela_fatores
+
+TOLERANCIA = 1e-9
+
+
+# --- Processo de trabalho ---
+def _iniciar_processo(conjunto: Optional[Dict[str, Any]]):
+    """Compila e ativa no processo filho o mesmo conjunto de fatores do processo principal."""
+    if conjunto is not None:
+        ativar_tabela_fatores(compilar_conjunto_fatores(conjunto))
+
+
+def _recalcular_bloco(linhas: List[Tuple[Any, Any, Optional[float], Optional[str]]]):
+    """
+    Recebe (id, input_data, pegada_total, fatores_versao) e devolve
+    (alteracoes [(id, nova_pegada)], divergentes, erros).
+    Linhas cuja pegada já confere mas com versão antiga também entram em `alteracoes`,
+    para que a versão registrada seja atualizada.
+    """
+    versao = obter_tabela_fatores().versao
+    ids, entradas, anteriores, versoes = [], [], [], []
+    erros = 0
+    for id_, input_data, pegada_total, fatores_versao in linhas:
+        try:
+            dados = json.loads(input_data) if isinstance(input_data, str) else input_data
+            if not isinstance(dados, dict):
+                raise ValueError("input_data inválido")
+        except Exception:
+            erros += 1
+            continue
+        ids.append(id_)
+        entradas.append(dados)
+        anteriores.append(pegada_total)
+        versoes.append(fatores_versao)
+    try:
+        resultados = calcular_pegada_lote(entradas)
+    except (TypeError, ValueError):
+        # Algum valor não numérico: recalcula linha a linha para isolar as inválidas
+        resultados = []
+        for dados in entradas:
+            try:
+                resultados.append(calcular_pegada_lote([dados])[0])
+            except (TypeError, ValueError):
+                resultados.append(None)
+
+    alteracoes = []
+    divergentes = 0
+    for id_, resultado, anterior, fatores_versao in zip(ids, resultados, anteriores, versoes):
+        if resultado is None:
+            erros += 1
+            continue
+        nova = resultado["pegada_total"]
+        diverge = anterior is None or abs(float(anterior) - nova) > TOLERANCIA
+        if diverge:
+            divergentes += 1
+        if diverge or fatores_versao != versao:
+            alteracoes.append((id_, nova))
+    return alteracoes, divergentes, erros
+
+
+# --- Backends ---
+class FonteSQLite:
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.conn = sqlite3.connect(caminho)
+
+    def ler_bloco(self, apos: Optional[int], tamanho: int):
+        cursor = self.conn.execute(
+            "SELECT id, input_data, pegada_total, fatores_versao FROM daily_data WHERE id > ? ORDER BY id LIMIT ?",
+            (apos if apos is not None else -1, tamanho),
+        )
+        return cursor.fetchall()
+
+    def gravar(self, alteracoes: List[Tuple[Any, float]], versao: str):
+        with self.conn:  # uma transação por bloco
+            self.conn.executemany(
+                "UPDATE daily_data SET pegada_total = ?, fatores_versao = ? WHERE id = ?",
+                [(nova, versao, id_) for id_, nova in alteracoes],
+            )
+
+    @staticmethod
+    def id_para_checkpoint(id_):
+        return id_
+
+    @staticmethod
+    def id_do_checkpoint(valor):
+        return valor
+
+    def fonte_fatores(self) -> FonteFatoresBanco:
+        from services.db_service import get_active_factor_version, load_active_factor_set
+        return FonteFatoresBanco(lambda: get_active_factor_version(self.caminho), lambda: load_active_factor_set(self.caminho))
+
+    def consolidar_meses(self) -> int:
+        from services.db_service import rebuild_monthly_rollups
+        return rebuild_monthly_rollups(caminho=self.caminho)
+
+    def consolidar_conquistas(self) -> int:
+        from services.db_service import rebuild_achievement_states
+        return rebuild_achievement_states(caminho=self.caminho)
+
+    def fechar(self):
+        self.conn.close()
+
+
+class FonteMongo:
+    def __init__(self, uri: str, dbname: str):
+        from services.mongo_service import MongoService
+        self.service = MongoService(uri, dbname)
+        self.daily = self.service.daily
+
+    def ler_bloco(self, apos, tamanho: int):
+        filtro = {"_id": {"$gt": apos}} if apos is not None else {}
+        cur = self.daily.find(filtro, {"input_data": 1, "pegada_total": 1, "fatores_versao": 1}).sort("_id", 1).limit(tamanho)
+        return [(d["_id"], d.get("input_data"), d.get("pegada_total"), d.get("fatores_versao")) for d in cur]
+
+    def gravar(self, alteracoes, versao: str):
+        from pymongo import UpdateOne
+        self.daily.bulk_write(
+            [UpdateOne({"_id": id_}, {"$set": {"pegada_total": float(nova), "fatores_versao": versao}}) for id_, nova in alteracoes],
+            ordered=False,
+        )
+
+    @staticmethod
+    def id_para_checkpoint(id_):
+        return str(id_)
+
+    @staticmethod
+    def id_do_checkpoint(valor):
+        from bson import ObjectId
+        return ObjectId(valor)
+
+    def fonte_fatores(self) -> FonteFatoresBanco:
+        return FonteFatoresBanco(self.service.get_active_factor_version, self.service.load_active_factor_set)
+
+    def consolidar_meses(self) -> int:
+        return self.service.rebuild_monthly_rollups()
+
+    def consolidar_conquistas(self) -> int:
+        return self.service.rebuild_achievement_states()
+
+    def fechar(self):
+        self.service.client.close()
+
+
+# --- Checkpoint ---
+def _ler_checkpoint(caminho: str) -> Dict[str, Any]:
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _gravar_checkpoint(caminho: str, estado: Dict[str, Any]):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(temporario, caminho)  # troca atômica: nunca deixa um checkpoint pela metade
+
+
+def _carregar_conjunto(args, fonte) -> Optional[Dict[str, Any]]:
+    """
+    Conjunto de fatores a usar, com a mesma precedência da API: --fatores ou FATORES_ARQUIVO;
+    com FATORES_FONTE=DB (ou --fatores-fonte DB), o conjunto ativo de emission_factor_sets
+    do banco sendo recalculado; senão, o embutido (None).
+    """
+    caminho = args.fatores or os.getenv("FATORES_ARQUIVO", "").strip()
+    if caminho:
+        return FonteFatoresArquivo(caminho).carregar()
+    if args.fatores_fonte == "DB":
+        conjunto = fonte.fonte_fatores().carregar()
+        if conjunto is None:
+            # Como na API: sem conjunto ativo no banco, vale o embutido
+            print("FATORES_FONTE=DB sem conjunto ativo em emission_factor_sets; usando os fatores embutidos.", file=sys.stderr)
+        return conjunto
+    return None
+
+
+def executar(args) -> Dict[str, Any]:
+    if args.backend == "MONGO":
+        from services.mongo_service import uri_do_ambiente
+        fonte = FonteMongo(uri_do_ambiente(), os.getenv("MONGODB_DBNAME", "ecoechos"))
+    else:
+        fonte = FonteSQLite(args.db)
+    try:
+        conjunto = _carregar_conjunto(args, fonte)
+        _iniciar_processo(conjunto)
+    except Exception:
+        fonte.fechar()
+        raise
+    versao = obter_tabela_fatores().versao
+
+    estado = {} if args.reiniciar else _ler_checkpoint(args.checkpoint)
+    if estado and (estado.get("versao") != versao or estado.get("dry_run") != args.dry_run):
+        print(
+            f"Checkpoint de outra execução (versão {estado.get('versao')}, dry_run={estado.get('dry_run')}); ignorando.",
+            file=sys.stderr,
+        )
+        estado = {}
+    estado = {
+        "versao": versao,
+        "dry_run": args.dry_run,
+        "ultimo_id": estado.get("ultimo_id"),
+        "lidas": estado.get("lidas", 0),
+        "divergentes": estado.get("divergentes", 0),
+        "gravadas": estado.get("gravadas", 0),
+        "erros": estado.get("erros", 0),
+    }
+    apos = fonte.id_do_checkpoint(estado["ultimo_id"]) if estado["ultimo_id"] is not None else None
+
+    inicio = time.monotonic()
+    lidas_nesta_execucao = 0
+    em_andamento: deque = deque()
+    max_em_andamento = max(2, args.processos * 2)  # limita a memória: poucos blocos em voo
+
+    def concluir_mais_antigo():
+        nonlocal lidas_nesta_execucao
+        ultimo_id, quantidade, futuro = em_andamento.popleft()
+        alteracoes, divergentes, erros = futuro.result()
+        if alteracoes and not args.dry_run:
+            fonte.gravar(alteracoes, versao)
+            estado["gravadas"] += len(alteracoes)
+        estado["lidas"] += quantidade
+        estado["divergentes"] += divergentes
+        estado["erros"] += erros
+        estado["ultimo_id"] = fonte.id_para_checkpoint(ultimo_id)
+        _gravar_checkpoint(args.checkpoint, estado)
+        lidas_nesta_execucao += quantidade
+        decorrido = time.monotonic() - inicio
+        print(
+            f"lidas={estado['lidas']} divergentes={estado['divergentes']} gravadas={estado['gravadas']} "
+            f"erros={estado['erros']} | {lidas_nesta_execucao / decorrido if decorrido else 0:.0f} linhas/s",
+            flush=True,
+        )
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.processos, initializer=_iniciar_processo, initargs=(conjunto,)) as pool:
+            while True:
+                bloco = fonte.ler_bloco(apos, args.bloco)
+                if not bloco:
+                    break
+                apos = bloco[-1][0]
+                em_andamento.append((apos, len(bloco), pool.submit(_recalcular_bloco, bloco)))
+                # Conclui (e grava) em ordem, para que o checkpoint só avance sobre blocos completos
+                while len(em_andamento) >= max_em_andamento:
+                    concluir_mais_antigo()
+            while em_andamento:
+                concluir_mais_antigo()
+        # Inclui gravações de execuções anteriores interrompidas (retomadas pelo checkpoint)
+        if estado["gravadas"] and not args.dry_run:
+            estado["meses_consolidados"] = fonte.consolidar_meses()
+            estado["conquistas_consolidadas"] = fonte.consolidar_conquistas()
+    finally:
+        fonte.fechar()
+
+    decorrido = time.monotonic() - inicio
+    estado["segundos"] = round(decorrido, 3)
+    print(json.dumps(estado, ensure_ascii=False))
+    return estado
+
+
+def main(argv=None):
+    from services.db_service import DB_NAME
+    parser = argparse.ArgumentParser(description="Recalcula pegada_total de daily_data com os fatores atuais.")
+    parser.add_argument("--backend", default=os.getenv("DB_BACKEND", "SQLITE").upper(), choices=["SQLITE", "MONGO"])
+    parser.add_argument("--db", default=DB_NAME, help="Arquivo SQLite (backend SQLITE)")
+    parser.add_argument("--fatores", default="", help="JSON do conjunto de fatores (padrão: FATORES_ARQUIVO ou o embutido)")
+    parser.add_argument("--fatores-fonte", default=os.getenv("FATORES_FONTE", "").strip().upper(), type=str.upper,
+                        choices=["", "DB"], help="DB: conjunto ativo de emission_factor_sets (padrão: FATORES_FONTE)")
+    parser.add_argument("--bloco", type=int, default=5000, help="Linhas por bloco")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--checkpoint", default="recalculo.checkpoint.json")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas conta divergências, sem gravar")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora o checkpoint existente")
+    executar(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Confere com EXPLAIN QUERY PLAN que as consultas por mês/usuário do backend SQLite usam
+índices (nenhuma varredura completa de daily_data/monthly_data nem ordenação em B-tree
+temporária). Sai com código 1 se algum plano regredir — útil em CI após mudar o esquema;
+tests/test_planos_sqlite.py confere os mesmos planos no pytest.
+
+Uso:
+    python -m scripts.verificar_planos [--db users.db]
+"""
+import argparse
+import sys
+
+
+def problemas_do_plano(passos):
+    """Passos do plano que indicam varredura completa ou ordenação sem índice."""
+    return [
+        passo for passo in passos
+        if passo.startswith("SCAN") or "TEMP B-TREE" in passo or ("USING" not in passo and passo.startswith("SEARCH"))
+    ]
+
+
+def main(argv=None):
+    from services import db_service
+    parser = argparse.ArgumentParser(description="Verifica os planos das consultas do SQLite.")
+    parser.add_argument("--db", default=db_service.DB_NAME, help="Arquivo SQLite")
+    args = parser.parse_args(argv)
+
+    db_service.DB_NAME = args.db
+    db_service.init_db()  # aplica migrações e índices antes de verificar
+    falhou = False
+    for nome, passos in db_service.explain_query_plans().items():
+        problemas = problemas_do_plano(passos)
+        falhou = falhou or bool(problemas)
+        print(f"[{'FALHA' if problemas else 'ok'}] {nome}")
+        for passo in passos:
+            print(f"    {passo}")
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,83 @@
+import os
 import sqlite3
 import json
-from passlib.context import CryptContext
-from typing import Optional, Tuple, Dict, Any
+import threading
+from datetime import datetime
+from itertools import groupby
+from typing import Optional, Tuple, Dict, Any, Iterator
 
-# Importa Streamlit apenas se disponível (para uso na interface antiga)
-try:
-    import streamlit as st  # type: ignore
-except Exception:  # pragma: no cover
-    st = None  # Permite rodar API sem depender de Streamlit
+from util.calculos_util import CATEGORIAS, calcular_categorias_lote
+from util.conquistas_util import aplicar_lote, avaliar_conquistas, construir_estado, novo_estado
+from util.consolidacao_util import acumular_deltas_mensais
+from util.rastreio_util import trecho
+from util.senhas_util import executor_senhas
 
 # --- CONFIGURAÇÃO DE SENHA ---
-# Define o esquema de criptografia. "bcrypt" é uma escolha forte e segura.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# Hash e verificação (bcrypt) rodam no pool de processos de util/senhas_util.py.
 def hash_password(password: str):
-    """Criptografa a senha em texto puro."""
-    return pwd_context.hash(password)
+    """Criptografa a senha em texto puro (no pool de processos de senhas)."""
+    return executor_senhas.gerar_hash(password)
 
 def verify_password(plain_password, hashed_password):
-    """Verifica a senha em texto puro contra a sua versão criptografada."""
-    try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception:
-        # Retorna False se o hash for inválido ou ocorrer outro erro, evitando que o app quebre.
-        return False
+    """Verifica a senha em texto puro contra a sua versão criptografada (False se o hash for inválido)."""
+    return executor_senhas.verificar(plain_password, hashed_password)
 
 # --- OPERAÇÕES DO BANCO DE DADOS ---
 DB_NAME = 'users.db'
 
+# --- CONEXÕES ---
+# Cada thread (o FastAPI roda endpoints síncronos em um threadpool) reutiliza sua própria
+# conexão por arquivo de banco, em vez de abrir e fechar uma a cada chamada. Conexões
+# sqlite3 não devem ser compartilhadas entre threads, então não há disputa entre elas.
+SQLITE_WAL = str(os.getenv("SQLITE_WAL", "1")).lower() in ("1", "true", "yes")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+
+_conexoes = threading.local()
+
+def _abrir_conexao(caminho: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(caminho, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=SQLITE_CACHED_STATEMENTS)
+    if SQLITE_WAL:
+        # WAL: leitores não bloqueiam o escritor (e vice-versa) entre os workers do gunicorn
+        conn.execute("PRAGMA journal_mode=WAL")
+    if SQLITE_SYNCHRONOUS in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size={-abs(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={max(0, SQLITE_MMAP_SIZE)}")
+    return conn
+
+def obter_conexao(caminho: Optional[str] = None) -> sqlite3.Connection:
+    """Conexão da thread atual para o banco (padrão: DB_NAME), aberta na primeira vez."""
+    caminho = caminho or DB_NAME
+    pid = os.getpid()
+    if getattr(_conexoes, "pid", None) != pid:
+        # Processo novo (fork do gunicorn): conexões herdadas do pai não podem ser usadas
+        _conexoes.pid = pid
+        _conexoes.por_caminho = {}
+    conn = _conexoes.por_caminho.get(caminho)
+    if conn is None:
+        conn = _conexoes.por_caminho[caminho] = _abrir_conexao(caminho)
+    elif conn.in_transaction:
+        conn.rollback()  # transação deixada aberta por uma chamada anterior que falhou
+    return conn
+
+def devolver_conexao(conn: sqlite3.Connection) -> None:
+    """Devolve a conexão ao pool da thread, descartando qualquer transação não confirmada."""
+    if conn.in_transaction:
+        conn.rollback()
+
+def fechar_conexoes() -> None:
+    """Fecha as conexões da thread atual (ex.: ao final de um script)."""
+    for conn in getattr(_conexoes, "por_caminho", {}).values():
+        conn.close()
+    _conexoes.por_caminho = {}
+
 def init_db():
     """Inicializa o banco de dados e cria as tabelas se não existirem."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
     # Tabela de usuários
     cursor.execute('''
@@ -40,18 +87,26 @@ def init_db():
             password_hash TEXT NOT NULL
         )
     ''')
-    # Tabela de dados mensais da pegada de carbono
-    cursor.execute('''
+    # Consolidação mensal (total, dias registrados e soma por categoria), mantida por
+    # save_user_daily_data. Versões antigas criavam monthly_data com outro formato, sem uso
+    # pela aplicação: a tabela antiga é preservada como monthly_data_legado.
+    colunas_mensais = {row[1] for row in cursor.execute("PRAGMA table_info(monthly_data)")}
+    if colunas_mensais and "dias_registrados" not in colunas_mensais:
+        cursor.execute("ALTER TABLE monthly_data RENAME TO monthly_data_legado")
+    consolidar = "dias_registrados" not in colunas_mensais
+    cursor.execute(f'''
         CREATE TABLE IF NOT EXISTS monthly_data (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
-            data TEXT,
-            pegada_total REAL,
-            input_data TEXT,
+            month_year TEXT NOT NULL,
+            pegada_total REAL NOT NULL DEFAULT 0,
+            dias_registrados INTEGER NOT NULL DEFAULT 0,
+            {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in CATEGORIAS)},
             FOREIGN KEY (user_id) REFERENCES users (id),
-            UNIQUE(user_id, data)
+            UNIQUE(user_id, month_year)
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_monthly_data_mes_pegada ON monthly_data (month_year, pegada_total, user_id)")
     # Tabela de dados diários da pegada de carbono
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS daily_data (
@@ -60,36 +115,59 @@ def init_db():
             date TEXT NOT NULL,
             pegada_total REAL,
             input_data TEXT,
+            fatores_versao TEXT,
+            day INTEGER,
             FOREIGN KEY (user_id) REFERENCES users (id),
             UNIQUE(user_id, date)
         )
     ''')
-    conn.commit()
-    conn.close()
-
-def register_user(username, password):
-    """Registra um novo usuário com senha devidamente criptografada."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    try:
-        hashed_password = hash_password(password)
-        cursor.execute(
-            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-            (username, hashed_password)
+    # Migração: bancos antigos não registram a versão dos fatores usada em cada dia
+    colunas = {row[1] for row in cursor.execute("PRAGMA table_info(daily_data)")}
+    if "fatores_versao" not in colunas:
+        cursor.execute("ALTER TABLE daily_data ADD COLUMN fatores_versao TEXT")
+    # Migração: dia como inteiro YYYYMMDD, para consultas por intervalo usarem índice
+    # (date LIKE 'YYYY-MM%' não usa índice e varre a tabela)
+    if "day" not in colunas:
+        cursor.execute("ALTER TABLE daily_data ADD COLUMN day INTEGER")
+        cursor.execute('''
+            UPDATE daily_data SET day = CAST(replace(substr(date, 1, 10), '-', '') AS INTEGER)
+            WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+        ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_data_fatores_versao ON daily_data (fatores_versao)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_data_user_day ON daily_data (user_id, day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_data_day_user ON daily_data (day, user_id, pegada_total)")
+    # Conjuntos versionados de fatores de emissão (apenas um ativo por vez)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS emission_factor_sets (
+            versao TEXT PRIMARY KEY,
+            fatores TEXT NOT NULL,
+            rendimentos TEXT,
+            ativo INTEGER NOT NULL DEFAULT 0,
+            criado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
         )
-        conn.commit()
-        if st:
-            st.success("Usuário registrado com sucesso! Agora você pode fazer o login.")
-    except sqlite3.IntegrityError:
-        if st:
-            st.error("Este nome de usuário já existe. Por favor, escolha outro.")
-    finally:
-        conn.close()
+    ''')
+    # Estado incremental das conquistas (JSON por usuário, ver util/conquistas_util.py)
+    criar_estado_conquistas = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'achievement_state'"
+    ).fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS achievement_state (
+            user_id INTEGER PRIMARY KEY,
+            estado TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.commit()
+    devolver_conexao(conn)
+    if consolidar:
+        # Tabela recém-criada: consolida os dias já existentes
+        rebuild_monthly_rollups()
+    if criar_estado_conquistas:
+        rebuild_achievement_states()
 
-# --- Funções sem dependência de Streamlit (para API) ---
 def register_user_api(username: str, password: str) -> Tuple[bool, str]:
     """Registra um novo usuário (uso pela API). Retorna (sucesso, mensagem)."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
     try:
         hashed_password = hash_password(password)
@@ -102,40 +180,44 @@ def register_user_api(username: str, password: str) -> Tuple[bool, str]:
     except sqlite3.IntegrityError:
         return False, "Este nome de usuário já existe. Por favor, escolha outro."
     finally:
-        conn.close()
-
-def login_user(username, password):
-    """Faz o login do usuário, buscando no banco e verificando a senha criptografada."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ?", (username,))
-    user_record = cursor.fetchone()
-    conn.close()
-
-    if user_record and verify_password(password, user_record[2]): # user_record[2] é o password_hash
-        return {'id': user_record[0], 'username': user_record[1]}
-    else:
-        if st:
-            st.error("Usuário ou senha inválidos.")
-        return None
+        devolver_conexao(conn)
 
 def login_user_api(username: str, password: str) -> Optional[Dict[str, Any]]:
-    """Login sem dependência de Streamlit (uso pela API)."""
-    conn = sqlite3.connect(DB_NAME)
+    """Faz o login do usuário. Retorna {"id", "username"} ou None se as credenciais forem inválidas."""
+    conn = obter_conexao()
     cursor = conn.cursor()
     cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ?", (username,))
     user_record = cursor.fetchone()
-    conn.close()
+    devolver_conexao(conn)
     if user_record and verify_password(password, user_record[2]):
         return {"id": user_record[0], "username": user_record[1]}
     return None
 
+def load_user_credentials(username: str) -> Optional[Tuple[int, str, str]]:
+    """(id, username, password_hash) do usuário, para verificar a senha fora desta função (rotas async)."""
+    conn = obter_conexao()
+    try:
+        return conn.execute("SELECT id, username, password_hash FROM users WHERE username = ?", (username,)).fetchone()
+    finally:
+        devolver_conexao(conn)
+
+def ping() -> bool:
+    try:
+        conn = obter_conexao()
+        try:
+            conn.execute("SELECT 1").fetchone()
+        finally:
+            devolver_conexao(conn)
+        return True
+    except sqlite3.Error:
+        return False
+
 def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
     cursor.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
     row = cursor.fetchone()
-    conn.close()
+    devolver_conexao(conn)
     if row:
         return {"id": row[0], "username": row[1]}
     return None
@@ -144,7 +226,7 @@ def update_user(user_id: int, new_username: Optional[str] = None, new_password:
     """Atualiza username e/ou password; retorna (sucesso, mensagem)."""
     if new_username is None and new_password is None:
         return False, "Nada para atualizar."
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
     try:
         if new_username is not None:
@@ -157,129 +239,442 @@ def update_user(user_id: int, new_username: Optional[str] = None, new_password:
     except sqlite3.IntegrityError:
         return False, "Este nome de usuário já está em uso."
     finally:
-        conn.close()
+        devolver_conexao(conn)
+
+def dia_numero(date: str) -> Optional[int]:
+    """'YYYY-MM-DD' -> YYYYMMDD (inteiro); None se a data não estiver nesse formato."""
+    texto = str(date)[:10]
+    if len(texto) != 10 or texto[4] != "-" or texto[7] != "-":
+        return None
+    try:
+        return int(texto[:4] + texto[5:7] + texto[8:10])
+    except ValueError:
+        return None
+
+def intervalo_mes(month_year: str) -> Tuple[int, int]:
+    """'YYYY-MM' -> intervalo semiaberto [YYYYMM01, primeiro dia do mês seguinte) da coluna day."""
+    try:
+        ano, mes = int(month_year[:4]), int(month_year[5:7])
+        if month_year[4] != "-" or not 1 <= mes <= 12:
+            raise ValueError
+    except (ValueError, IndexError):
+        return 0, 0  # mês inválido: intervalo vazio
+    proximo = (ano + 1) * 100 + 1 if mes == 12 else ano * 100 + mes + 1
+    return (ano * 100 + mes) * 100 + 1, proximo * 100 + 1
+
+# Aplica a variação de um dia na consolidação do mês (cria a linha do mês se preciso)
+_SQL_DELTA_MENSAL = f'''
+    INSERT INTO monthly_data (user_id, month_year, pegada_total, dias_registrados, {", ".join(CATEGORIAS)})
+    VALUES (?, ?, ?, ?, {", ".join("?" for _ in CATEGORIAS)})
+    ON CONFLICT(user_id, month_year) DO UPDATE SET
+    pegada_total = pegada_total + excluded.pegada_total,
+    dias_registrados = dias_registrados + excluded.dias_registrados,
+    {", ".join(f"{c} = {c} + excluded.{c}" for c in CATEGORIAS)}
+'''
 
-def save_user_daily_data(user_id, date, pegada_total, input_data):
-    """Salva ou atualiza os dados mensais de um usuário."""
-    conn = sqlite3.connect(DB_NAME)
+# Usa ON CONFLICT para atualizar o registro se ele já existir (INSERT or UPDATE)
+_SQL_UPSERT_DIA = '''
+    INSERT INTO daily_data (user_id, date, pegada_total, input_data, fatores_versao, day)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, date) DO UPDATE SET
+    pegada_total=excluded.pegada_total,
+    input_data=excluded.input_data,
+    fatores_versao=excluded.fatores_versao,
+    day=excluded.day
+'''
+
+def save_user_daily_data(user_id, date, pegada_total, input_data, fatores_versao=None):
+    """Salva ou atualiza os dados diários de um usuário e atualiza a consolidação do mês.
+    `fatores_versao` registra qual conjunto de fatores gerou a pegada; None (NULL) quando a pegada
+    não foi calculada com uma tabela conhecida, e o dia conta como defasado até ser recalculado.
+    """
+    save_user_daily_data_many([(user_id, date, pegada_total, input_data, fatores_versao)])
+
+def save_user_daily_data_many(registros):
+    """
+    Salva vários dias (user_id, date, pegada_total, input_data, fatores_versao) em uma única
+    transação, com um único commit, aplicando na consolidação mensal a diferença de cada dia
+    em relação ao valor anterior. Tudo ou nada: se algo falhar, nada é gravado.
+    """
+    linhas, novos = [], []
+    for user_id, date, pegada_total, input_data, fatores_versao in registros:
+        pegada_total = float(pegada_total or 0.0)
+        linhas.append((user_id, date, pegada_total, json.dumps(input_data), fatores_versao, dia_numero(date)))
+        novos.append((user_id, date, pegada_total, input_data))
+    if not linhas:
+        return
+    conn = obter_conexao()
     cursor = conn.cursor()
-    input_data_json = json.dumps(input_data)
     try:
-        # Usa ON CONFLICT para atualizar o registro se ele já existir (INSERT or UPDATE)
-        cursor.execute('''
-            INSERT INTO daily_data (user_id, date, pegada_total, input_data)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id, date) DO UPDATE SET
-            pegada_total=excluded.pegada_total,
-            input_data=excluded.input_data
-        ''', (user_id, date, pegada_total, input_data_json))
+        # BEGIN IMMEDIATE: lê os valores anteriores e grava dias + meses sem outro escritor no meio
+        cursor.execute("BEGIN IMMEDIATE")
+        anteriores, consultados = {}, set()
+        for user_id, date, *_ in linhas:
+            if (user_id, date) in consultados:
+                continue
+            consultados.add((user_id, date))
+            cursor.execute("SELECT pegada_total, input_data FROM daily_data WHERE user_id = ? AND date = ?", (user_id, date))
+            row = cursor.fetchone()
+            if row is not None:
+                anteriores[(user_id, date)] = (row[0], _ler_input_data(row[1]))
+        cursor.executemany(_SQL_UPSERT_DIA, linhas)
+        variacoes = acumular_deltas_mensais(novos, anteriores)
+        cursor.executemany(_SQL_DELTA_MENSAL, [(user_id, mes, *v) for (user_id, mes), v in variacoes.items()])
+        # Estado das conquistas dos usuários do lote, na mesma transação
+        estados = {}
+        for user_id in {n[0] for n in novos}:
+            cursor.execute("SELECT estado FROM achievement_state WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            estados[user_id] = json.loads(row[0]) if row else novo_estado()
+        aplicar_lote(estados, novos, anteriores)
+        cursor.executemany(
+            "INSERT OR REPLACE INTO achievement_state (user_id, estado) VALUES (?, ?)",
+            [(user_id, json.dumps(estado, separators=(",", ":"))) for user_id, estado in estados.items()]
+        )
         conn.commit()
-        if st:
-            st.success(f"Dados de {date} salvos com sucesso!")
     finally:
-        conn.close()
+        devolver_conexao(conn)
+
+def _ler_input_data(input_json):
+    try:
+        return json.loads(input_json) if isinstance(input_json, str) else input_json
+    except ValueError:
+        return None
 
 def load_user_daily_data(user_id, date):
     """Carrega os dados mensais de um usuário a partir do banco de dados."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
     cursor.execute("SELECT pegada_total, input_data FROM daily_data WHERE user_id = ? AND date = ?", (user_id, date))
     data_record = cursor.fetchone()
-    conn.close()
+    devolver_conexao(conn)
     if data_record:
-        return {'pegada_total': data_record[0], 'input_data': json.loads(data_record[1])}
+        with trecho("json.input_data"):
+            return {'pegada_total': data_record[0], 'input_data': json.loads(data_record[1])}
     return None
 
+# Página do histórico por intervalo: keyset em (user_id, day), sem OFFSET
+_SQL_HISTORICO_INTERVALO = '''
+    SELECT date, day, pegada_total, input_data, fatores_versao FROM daily_data
+    WHERE user_id = ? AND day > ? AND day <= ?
+    ORDER BY day
+    LIMIT ?
+'''
+
+def iter_user_daily_data_range(user_id, inicio: str, fim: str, apos: Optional[str] = None,
+                               limite: Optional[int] = None, tamanho_pagina: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre os dias salvos de `inicio` a `fim` (inclusive, 'YYYY-MM-DD'), em ordem, a partir
+    do dia seguinte a `apos` (cursor), com no máximo `limite` dias. Lê páginas de
+    `tamanho_pagina` linhas, uma consulta por página: a memória fica constante e nenhuma
+    conexão fica presa entre páginas (o StreamingResponse pode chamar cada passo em uma
+    thread diferente).
+    """
+    ultimo = (dia_numero(apos) or 0) if apos else (dia_numero(inicio) or 0) - 1
+    dia_final = dia_numero(fim) or 0
+    restantes = limite if limite is not None else float("inf")
+    while restantes > 0:
+        conn = obter_conexao()
+        try:
+            rows = conn.execute(
+                _SQL_HISTORICO_INTERVALO, (user_id, ultimo, dia_final, int(min(tamanho_pagina, restantes)))
+            ).fetchall()
+        finally:
+            devolver_conexao(conn)
+        for date, _, pegada_total, input_data, fatores_versao in rows:
+            yield {"date": date, "pegada_total": pegada_total, "input_data": _ler_input_data(input_data), "fatores_versao": fatores_versao}
+        if len(rows) < tamanho_pagina:
+            return
+        ultimo = rows[-1][1]
+        restantes -= len(rows)
+
 def load_user_monthly_data(user_id, month_year):
-    """Carrega e soma os dados diários de um mês específico."""
-    conn = sqlite3.connect(DB_NAME)
+    """Pegada total de um mês específico (lida da consolidação mensal)."""
+    conn = obter_conexao()
     cursor = conn.cursor()
-    cursor.execute("SELECT pegada_total FROM daily_data WHERE user_id = ? AND date LIKE ?", (user_id, f"{month_year}%"))
+    cursor.execute("SELECT pegada_total FROM monthly_data WHERE user_id = ? AND month_year = ?", (user_id, month_year))
+    row = cursor.fetchone()
+    devolver_conexao(conn)
+    return row[0] if row else 0.0
 
-    pegadas_diarias = cursor.fetchall()
-    conn.close()
+def load_user_monthly_rollup(user_id, month_year) -> Optional[Dict[str, Any]]:
+    """Consolidação completa do mês: total, dias registrados e soma por categoria."""
+    conn = obter_conexao()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT pegada_total, dias_registrados, {', '.join(CATEGORIAS)} FROM monthly_data WHERE user_id = ? AND month_year = ?",
+        (user_id, month_year)
+    )
+    row = cursor.fetchone()
+    devolver_conexao(conn)
+    if not row:
+        return None
+    return {
+        "month_year": month_year,
+        "pegada_total": row[0],
+        "dias_registrados": row[1],
+        "pegadas_por_categoria": dict(zip(CATEGORIAS, row[2:])),
+    }
+
+def rebuild_monthly_rollups(tamanho_bloco: int = 5000, caminho: Optional[str] = None) -> int:
+    """
+    Reconstrói monthly_data a partir de daily_data (backfill único ou depois de um recálculo).
+    Roda em uma transação BEGIN IMMEDIATE, bloqueando gravações concorrentes para que nenhum
+    delta se perca. Retorna a quantidade de meses consolidados.
+    """
+    conn = obter_conexao(caminho)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        meses: Dict[Tuple[int, str], list] = {}
+        ultimo_id = -1
+        while True:
+            cursor.execute(
+                "SELECT id, user_id, date, pegada_total, input_data FROM daily_data WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo_id, tamanho_bloco)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            ultimo_id = rows[-1][0]
+            categorias = calcular_categorias_lote([_ler_input_data(r[4]) for r in rows])
+            for (_, user_id, date, pegada_total, _), por_categoria in zip(rows, categorias):
+                mes = meses.setdefault((user_id, date[:7]), [0.0, 0] + [0.0] * len(CATEGORIAS))
+                mes[0] += float(pegada_total or 0.0)
+                mes[1] += 1
+                for j, c in enumerate(CATEGORIAS, start=2):
+                    mes[j] += por_categoria[c]
+        cursor.execute("DELETE FROM monthly_data")
+        cursor.executemany(
+            f"INSERT INTO monthly_data (user_id, month_year, pegada_total, dias_registrados, {', '.join(CATEGORIAS)}) "
+            f"VALUES (?, ?, ?, ?, {', '.join('?' for _ in CATEGORIAS)})",
+            [(user_id, mes_ano, *valores) for (user_id, mes_ano), valores in meses.items()]
+        )
+        conn.commit()
+        return len(meses)
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        devolver_conexao(conn)
+
+def rebuild_achievement_states(caminho: Optional[str] = None) -> int:
+    """
+    Reconstrói o estado das conquistas de todos os usuários a partir de daily_data
+    (backfill único ou depois de um recálculo), em uma transação BEGIN IMMEDIATE.
+    Retorna a quantidade de usuários processados.
+    """
+    conn = obter_conexao(caminho)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM achievement_state")
+        leitura = conn.execute("SELECT user_id, date, pegada_total, input_data FROM daily_data ORDER BY user_id, day")
+        usuarios = 0
+        for user_id, dias in groupby(leitura, key=lambda r: r[0]):
+            estado = construir_estado((date, pegada_total, _ler_input_data(input_data)) for _, date, pegada_total, input_data in dias)
+            cursor.execute(
+                "INSERT INTO achievement_state (user_id, estado) VALUES (?, ?)",
+                (user_id, json.dumps(estado, separators=(",", ":")))
+            )
+            usuarios += 1
+        conn.commit()
+        return usuarios
+    finally:
+        devolver_conexao(conn)
+
+def count_daily_data_by_factor_version() -> Dict[Optional[str], int]:
+    """Quantidade de dias salvos por versão de fatores (versões diferentes da ativa estão defasadas)."""
+    conn = obter_conexao()
+    cursor = conn.cursor()
+    cursor.execute("SELECT fatores_versao, COUNT(*) FROM daily_data GROUP BY fatores_versao")
+    rows = cursor.fetchall()
+    devolver_conexao(conn)
+    return {r[0]: r[1] for r in rows}
+
+# --- Conjuntos versionados de fatores de emissão ---
+def save_factor_set(versao: str, fatores: Dict[str, Any], rendimentos: Optional[Dict[str, Any]] = None, ativar: bool = True):
+    """Grava um conjunto de fatores; se `ativar`, ele passa a ser o único ativo."""
+    conn = obter_conexao()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO emission_factor_sets (versao, fatores, rendimentos, ativo) VALUES (?, ?, ?, 0)",
+            (versao, json.dumps(fatores), json.dumps(rendimentos) if rendimentos else None)
+        )
+        if ativar:
+            cursor.execute("UPDATE emission_factor_sets SET ativo = (versao = ?)", (versao,))
+        conn.commit()
+    finally:
+        devolver_conexao(conn)
+
+def get_active_factor_version(caminho: Optional[str] = None) -> Optional[str]:
+    conn = obter_conexao(caminho)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT versao FROM emission_factor_sets WHERE ativo = 1")
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None  # tabela ainda não criada
+    devolver_conexao(conn)
+    return row[0] if row else None
 
-    if pegadas_diarias:
-        pegada_total_mensal = sum(p[0] for p in pegadas_diarias)
-        return pegada_total_mensal
-    return 0.0
+def load_active_factor_set(caminho: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    conn = obter_conexao(caminho)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT versao, fatores, rendimentos FROM emission_factor_sets WHERE ativo = 1")
+        row = cursor.fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    devolver_conexao(conn)
+    if not row:
+        return None
+    return {"versao": row[0], "fatores": json.loads(row[1]), "rendimentos": json.loads(row[2]) if row[2] else None}
 
 # --- Gamificação: Ranking e Conquistas ---
+# Percorre o índice (month_year, pegada_total, user_id) do fim para o início: lê só as
+# `limit` primeiras linhas do mês, sem agregar todos os usuários
+_SQL_RANKING_MES = '''
+    SELECT m.user_id, u.username, m.pegada_total
+    FROM monthly_data m
+    JOIN users u ON u.id = m.user_id
+    WHERE m.month_year = ?
+    ORDER BY m.pegada_total DESC
+    LIMIT ?
+'''
+
+# Todos os usuários cadastrados, com 0 quando não há consolidação no mês (como no ranking original)
+_SQL_TOTAIS_MES = '''
+    SELECT u.id, u.username, COALESCE(m.pegada_total, 0)
+    FROM users u
+    LEFT JOIN monthly_data m ON m.user_id = u.id AND m.month_year = ?
+    ORDER BY 3 DESC, u.id
+'''
+
+def load_monthly_totals(month_year: str):
+    """(user_id, username, pegada_total) de todos os usuários (0 sem registro no mês), em ordem de ranking."""
+    conn = obter_conexao()
+    try:
+        return conn.execute(_SQL_TOTAIS_MES, (month_year,)).fetchall()
+    finally:
+        devolver_conexao(conn)
+
+def load_usernames():
+    """(id, username) de todos os usuários cadastrados, em ordem de id."""
+    conn = obter_conexao()
+    try:
+        return conn.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+    finally:
+        devolver_conexao(conn)
+
+def load_daily_totals(inicio: Optional[str] = None, fim: Optional[str] = None):
+    """
+    (user_id, username, date, pegada_total) dos dias salvos de `inicio` a `fim` ('YYYY-MM-DD',
+    inclusive; sem eles, todos), em ordem de usuário e dia. Lança ValueError se um limite
+    informado não for uma data válida.
+    """
+    sql = "SELECT d.user_id, u.username, d.date, d.pegada_total FROM daily_data d JOIN users u ON u.id = d.user_id"
+    # Intervalo em day (índice (day, user_id, pegada_total)), só com os limites informados
+    condicoes, parametros = [], []
+    for operador, limite in ((">=", inicio), ("<=", fim)):
+        if limite is None:
+            continue
+        try:
+            datetime.strptime(limite, "%Y-%m-%d")
+            dia = dia_numero(limite)
+        except (TypeError, ValueError):
+            dia = None
+        if dia is None:
+            raise ValueError(f"Data inválida: {limite!r}; use o formato YYYY-MM-DD")
+        condicoes.append(f"d.day {operador} ?")
+        parametros.append(dia)
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    conn = obter_conexao()
+    try:
+        return conn.execute(sql + " ORDER BY d.user_id, d.day", parametros).fetchall()
+    finally:
+        devolver_conexao(conn)
+
 def get_monthly_ranking(month_year: str, limit: int = 10):
-    """Retorna ranking dos usuários pela soma de pegada_total no mês (maior para menor)."""
-    conn = sqlite3.connect(DB_NAME)
+    """Retorna ranking dos usuários pela pegada total do mês (maior para menor), lida da consolidação mensal."""
+    conn = obter_conexao()
     cursor = conn.cursor()
-    cursor.execute(
-        '''
-        SELECT u.id, u.username, COALESCE(SUM(d.pegada_total), 0) as total
-        FROM users u
-        LEFT JOIN daily_data d ON u.id = d.user_id AND d.date LIKE ?
-        GROUP BY u.id, u.username
-        ORDER BY total DESC
-        LIMIT ?
-        ''', (f"{month_year}%", limit)
-    )
+    cursor.execute(_SQL_RANKING_MES, (month_year, limit))
     rows = cursor.fetchall()
-    conn.close()
+    # Usuários sem registro no mês entram com total 0, pelo valor (como no LEFT JOIN do ranking
+    # original): depois dos totais positivos ou zero e antes dos negativos
+    nao_negativos = [r for r in rows if r[2] >= 0]
+    if len(nao_negativos) < limit:
+        cursor.execute(
+            "SELECT id, username, 0 FROM users u WHERE NOT EXISTS "
+            "(SELECT 1 FROM monthly_data m WHERE m.user_id = u.id AND m.month_year = ?) ORDER BY id LIMIT ?",
+            (month_year, limit - len(nao_negativos))
+        )
+        zerados = cursor.fetchall()
+        rows = (nao_negativos + zerados + rows[len(nao_negativos):])[:limit]
+    devolver_conexao(conn)
     return [
         {"user_id": r[0], "username": r[1], "total_pegada": r[2]}
         for r in rows
     ]
 
 def get_user_achievements(user_id: int, month_year: str):
-    """Gera conquistas simples com base nos dados diários do mês.
+    """Conquistas do mês (e de sequências entre meses), avaliadas sobre o estado incremental do usuário.
     Exemplos: consistência (n dias logados), uso de transporte coletivo/elétrico, ações sustentáveis.
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = obter_conexao()
     cursor = conn.cursor()
-    cursor.execute(
-        "SELECT date, pegada_total, input_data FROM daily_data WHERE user_id = ? AND date LIKE ?",
-        (user_id, f"{month_year}%")
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    cursor.execute("SELECT estado FROM achievement_state WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    devolver_conexao(conn)
+    with trecho("json.estado_conquistas"):
+        estado = json.loads(row[0]) if row else None
+    return avaliar_conquistas(estado, month_year)
 
-    days_logged = len(rows)
-    sum_bus_metro = 0.0
-    sum_car_fuel_km = 0.0
-    used_electric = False
-    planted_trees = False
 
-    for _, _, input_json in rows:
-        try:
-            data = json.loads(input_json) if isinstance(input_json, str) else (input_json or {})
-        except Exception:
-            data = {}
-        sum_bus_metro += float(data.get("km_onibus", 0.0)) + float(data.get("km_metro", 0.0))
-        sum_car_fuel_km += float(data.get("distancia_carro_moto_combustivel", 0.0))
-        if bool(data.get("usa_veiculo_eletrico", False)) and float(data.get("distancia_veiculo_eletrico", 0.0)) > 0:
-            used_electric = True
-        if float(data.get("num_arvores_plantadas_mensal", 0.0)) > 0 or float(data.get("kg_creditos_carbono", 0.0)) > 0:
-            planted_trees = True
-
-    achievements = []
-    # Registro iniciado
-    achievements.append({"key": "registro_iniciado", "title": "Registro Iniciado", "achieved": days_logged >= 1, "details": f"{days_logged} dia(s) registrado(s)"})
-    # Consistência níveis
-    achievements.append({"key": "consistencia_bronze", "title": "Consistência Bronze", "achieved": days_logged >= 5})
-    achievements.append({"key": "consistencia_prata", "title": "Consistência Prata", "achieved": days_logged >= 10})
-    achievements.append({"key": "consistencia_ouro", "title": "Consistência Ouro", "achieved": days_logged >= 20})
-    # Preferência por coletivo
-    achievements.append({"key": "transporte_coletivo", "title": "Transporte Coletivo Adepto", "achieved": sum_bus_metro > sum_car_fuel_km})
-    # Uso de elétrico
-    achievements.append({"key": "eletrificado", "title": "Eletrificado", "achieved": used_electric})
-    # Ações sustentáveis
-    achievements.append({"key": "plantador", "title": "Plantador/Compensador", "achieved": planted_trees})
-
-    return {
-        "month_year": month_year,
-        "days_logged": days_logged,
-        "achievements": achievements
+# --- Verificação dos planos de consulta ---
+def explain_query_plans() -> Dict[str, list]:
+    """EXPLAIN QUERY PLAN das consultas por mês/usuário (detalhes de cada passo do plano)."""
+    inicio, fim = intervalo_mes("2025-01")
+    consultas = {
+        "conquistas_estado": ("SELECT estado FROM achievement_state WHERE user_id = ?", (1,)),
+        "ranking_mes": (_SQL_RANKING_MES, ("2025-01", 10)),
+        "total_mes": ("SELECT pegada_total FROM monthly_data WHERE user_id = ? AND month_year = ?", (1, "2025-01")),
+        "historico_intervalo": (_SQL_HISTORICO_INTERVALO, (1, inicio - 1, fim, 500)),
+        "dias_intervalo": ("SELECT user_id, pegada_total FROM daily_data WHERE day >= ? AND day < ?", (inicio, fim)),
     }
+    conn = obter_conexao()
+    try:
+        return {
+            nome: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+            for nome, (sql, parametros) in consultas.items()
+        }
+    finally:
+        devolver_conexao(conn)
 
 
-    
-
-
-    
-
+# --- Repositório (protocolo de services/repositorio.py) ---
+class RepositorioSQLite:
+    """As funções deste módulo no formato do protocolo Repositorio, para a API."""
+    normalizar_id = staticmethod(int)
+    ping = staticmethod(ping)
+    register_user_api = staticmethod(register_user_api)
+    login_user_api = staticmethod(login_user_api)
+    load_user_credentials = staticmethod(load_user_credentials)
+    get_user_by_id = staticmethod(get_user_by_id)
+    update_user = staticmethod(update_user)
+    save_user_daily_data = staticmethod(save_user_daily_data)
+    save_user_daily_data_many = staticmethod(save_user_daily_data_many)
+    load_user_daily_data = staticmethod(load_user_daily_data)
+    iter_user_daily_data_range = staticmethod(iter_user_daily_data_range)
+    load_user_monthly_data = staticmethod(load_user_monthly_data)
+    load_user_monthly_rollup = staticmethod(load_user_monthly_rollup)
+    load_usernames = staticmethod(load_usernames)
+    load_monthly_totals = staticmethod(load_monthly_totals)
+    load_daily_totals = staticmethod(load_daily_totals)
+    get_user_achievements = staticmethod(get_user_achievements)
+    count_daily_data_by_factor_version = staticmethod(count_daily_data_by_factor_version)
+    get_active_factor_version = staticmethod(get_active_factor_version)
+    load_active_factor_set = staticmethod(load_active_factor_set)
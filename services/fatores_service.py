@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config.fatores_emissao import RENDIMENTO_COMBUSTIVEL_KM_LITRO
+from util.cache_util import AUSENTE
+from util.fatores_util import TabelaFatores, obter_tabela_fatores, ativar_tabela_fatores
+
+logger = logging.getLogger(__name__)
+
+
+def compilar_conjunto_fatores(conjunto: Dict[str, Any]) -> TabelaFatores:
+    """
+    Valida e compila um conjunto versionado de fatores:
+    {"versao": "2025-01", "fatores": {...}, "rendimentos": {...}}.
+    "rendimentos" é opcional (usa os valores embutidos). Lança ValueError se for inválido.
+    """
+    if not isinstance(conjunto, dict) or not isinstance(conjunto.get("fatores"), dict):
+        raise ValueError("Conjunto de fatores inválido: campo 'fatores' ausente")
+    rendimentos = conjunto.get("rendimentos") or RENDIMENTO_COMBUSTIVEL_KM_LITRO
+    versao = conjunto.get("versao")
+    if versao is not None and (not isinstance(versao, str) or not versao.strip()):
+        raise ValueError("Conjunto de fatores inválido: 'versao' deve ser um texto não vazio")
+    return TabelaFatores(conjunto["fatores"], rendimentos, versao=versao)
+
+
+class FonteFatoresArquivo:
+    """Conjunto de fatores em um arquivo JSON; a marca de mudança é (mtime, tamanho)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    def marca(self) -> Any:
+        st = os.stat(self.caminho)
+        return (st.st_mtime_ns, st.st_size)
+
+    def carregar(self) -> Dict[str, Any]:
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+class FonteFatoresBanco:
+    """Conjunto ativo em uma tabela/coleção do banco; a marca de mudança é a versão ativa."""
+
+    def __init__(self, versao_ativa: Callable[[], Optional[str]], carregar_ativo: Callable[[], Optional[Dict[str, Any]]]):
+        self._versao_ativa = versao_ativa
+        self._carregar_ativo = carregar_ativo
+
+    def marca(self) -> Any:
+        return self._versao_ativa()
+
+    def carregar(self) -> Optional[Dict[str, Any]]:
+        return self._carregar_ativo()
+
+
+class RecarregadorFatores:
+    """
+    Verifica periodicamente a fonte de fatores e, quando ela muda, valida e compila o novo
+    conjunto uma única vez e o ativa em todos os caminhos (cálculo, /fatores-emissao e caches,
+    que usam a versão da tabela na chave). Conjuntos inválidos são rejeitados e a tabela atual
+    continua em uso.
+
+    Com `compartilhado` (CacheCompartilhado), o conjunto validado é publicado para os outros
+    workers do host: quem encontra a fonte com a mesma marca o compila sem reler a fonte, e a cada
+    segundo cada worker confere o quadro de versões para adotar na hora uma tabela ativada em
+    outro worker, sem esperar a própria verificação da fonte.
+    """
+
+    def __init__(self, fonte, intervalo_segundos: float = 30.0, compartilhado=None):
+        self.fonte = fonte
+        self.intervalo_segundos = max(1.0, float(intervalo_segundos))
+        self.compartilhado = compartilhado
+        self._versao_vista: Optional[int] = None
+        self._marca: Any = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ultimo_erro: Optional[str] = None
+
+    def verificar(self) -> bool:
+        """Recarrega se a fonte mudou. Retorna True se uma nova tabela foi ativada."""
+        with self._lock:
+            try:
+                marca = self.fonte.marca()
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                logger.warning("Fonte de fatores de emissão indisponível: %s", e)
+                return False
+            if marca is None or marca == self._marca:
+                return False
+            # Registra a marca antes de compilar: um conjunto inválido só é relido quando mudar de novo
+            self._marca = marca
+            tabela = self._publicada(marca)
+            publicar = tabela is None
+            try:
+                if tabela is None:
+                    conjunto = self.fonte.carregar()
+                    if conjunto is None:
+                        return False
+                    tabela = compilar_conjunto_fatores(conjunto)
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                logger.error("Conjunto de fatores rejeitado (%s); mantendo a versão %s", e, obter_tabela_fatores().versao)
+                return False
+            atual = obter_tabela_fatores()
+            if tabela.versao == atual.versao:
+                if tabela.hash_conteudo != atual.hash_conteudo:
+                    # Mesma versão com outro conteúdo deixaria caches e dias salvos ambíguos
+                    self.ultimo_erro = f"Versão {tabela.versao} já ativa com outro conteúdo; altere o campo 'versao'"
+                    logger.error(self.ultimo_erro)
+                else:
+                    self.ultimo_erro = None
+                return False
+            self.ultimo_erro = None
+            ativar_tabela_fatores(tabela)
+            logger.info("Fatores de emissão ativados: versão %s", tabela.versao)
+            if publicar and self.compartilhado is not None:
+                versao = self.compartilhado.incrementar(("fatores",))
+                self.compartilhado.guardar(("fatores",), versao, (marca, conjunto))
+                self._versao_vista = versao
+            return True
+
+    def _compilar_publicada(self, publicada: Any) -> Optional[TabelaFatores]:
+        try:
+            return compilar_conjunto_fatores(publicada[1])
+        except (ValueError, TypeError, IndexError):
+            return None
+
+    def _publicada(self, marca: Any = AUSENTE) -> Optional[TabelaFatores]:
+        """Tabela do conjunto publicado por outro worker (com a mesma `marca` da fonte, se informada)."""
+        if self.compartilhado is None:
+            return None
+        versao = self.compartilhado.versao(("fatores",))
+        self._versao_vista = versao
+        publicada = self.compartilhado.obter(("fatores",), versao)
+        if publicada is AUSENTE or (marca is not AUSENTE and publicada[0] != marca):
+            return None
+        return self._compilar_publicada(publicada)
+
+    def sincronizar(self) -> bool:
+        """Adota a tabela ativada em outro worker, se houver uma nova. Retorna True se trocou."""
+        if self.compartilhado is None or self.compartilhado.versao(("fatores",)) == self._versao_vista:
+            return False
+        with self._lock:
+            versao = self.compartilhado.versao(("fatores",))
+            publicada = self.compartilhado.obter(("fatores",), versao)
+            self._versao_vista = versao
+            tabela = None if publicada is AUSENTE else self._compilar_publicada(publicada)
+            if tabela is None or tabela.versao == obter_tabela_fatores().versao:
+                return False
+            self._marca = publicada[0]
+            ativar_tabela_fatores(tabela)
+            logger.info("Fatores de emissão ativados por outro worker: versão %s", tabela.versao)
+            return True
+
+    def _executar(self):
+        passo = min(1.0, self.intervalo_segundos) if self.compartilhado is not None else self.intervalo_segundos
+        proxima = time.monotonic() + self.intervalo_segundos
+        while not self._parar.wait(passo):
+            self.sincronizar()
+            if time.monotonic() >= proxima:
+                proxima = time.monotonic() + self.intervalo_segundos
+                self.verificar()
+
+    def iniciar(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._executar, name="recarregador-fatores", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
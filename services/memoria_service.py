@@ -0,0 +1,197 @@
+import bisect
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from util.calculos_util import CATEGORIAS
+from util.conquistas_util import aplicar_lote, avaliar_conquistas, novo_estado
+from util.consolidacao_util import acumular_deltas_mensais
+from util.rastreio_util import trecho
+from util.senhas_util import executor_senhas
+
+
+class MemoriaService:
+    """
+    Repositório em memória (DB_BACKEND=MEMORIA), para testes e benchmarks: mesmas operações e
+    formatos de retorno de db_service, sem persistência. Os dados somem quando o processo
+    termina e não são compartilhados entre workers.
+    """
+
+    normalizar_id = staticmethod(int)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._usuarios: Dict[int, Dict[str, Any]] = {}
+        self._ids_por_nome: Dict[str, int] = {}
+        self._dias: Dict[int, Dict[str, Tuple[float, str, str]]] = {}  # user_id -> date -> (pegada, input json, versão)
+        self._datas: Dict[int, List[str]] = {}  # datas de cada usuário, ordenadas
+        self._meses: Dict[Tuple[int, str], List[float]] = {}  # [pegada_total, dias, *categorias]
+        self._conquistas: Dict[int, Dict[str, Any]] = {}
+        self._fatores: Dict[str, Dict[str, Any]] = {}
+        self._versao_ativa: Optional[str] = None
+
+    def ping(self) -> bool:
+        return True
+
+    # --- Usuários ---
+    def register_user_api(self, username: str, password: str) -> Tuple[bool, str]:
+        hashed = executor_senhas.gerar_hash(password)
+        with self._lock:
+            if username in self._ids_por_nome:
+                return False, "Este nome de usuário já existe. Por favor, escolha outro."
+            user_id = len(self._usuarios) + 1
+            self._usuarios[user_id] = {"username": username, "password_hash": hashed}
+            self._ids_por_nome[username] = user_id
+        return True, "Usuário cadastrado com sucesso!"
+
+    def load_user_credentials(self, username: str) -> Optional[Tuple[int, str, str]]:
+        with self._lock:
+            user_id = self._ids_por_nome.get(username)
+            return (user_id, username, self._usuarios[user_id]["password_hash"]) if user_id else None
+
+    def login_user_api(self, username: str, password: str) -> Optional[Dict[str, Any]]:
+        registro = self.load_user_credentials(username)
+        if registro and executor_senhas.verificar(password, registro[2]):
+            return {"id": registro[0], "username": registro[1]}
+        return None
+
+    def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            user = self._usuarios.get(user_id)
+            return {"id": user_id, "username": user["username"]} if user else None
+
+    def update_user(self, user_id: int, new_username: Optional[str] = None, new_password: Optional[str] = None) -> Tuple[bool, str]:
+        if new_username is None and new_password is None:
+            return False, "Nada para atualizar."
+        hashed = executor_senhas.gerar_hash(new_password) if new_password is not None else None
+        with self._lock:
+            user = self._usuarios.get(user_id)
+            if user is None:
+                return True, "Usuário atualizado com sucesso!"  # como o UPDATE sem linhas do SQLite
+            if new_username is not None and new_username != user["username"]:
+                if new_username in self._ids_por_nome:
+                    return False, "Este nome de usuário já está em uso."
+                del self._ids_por_nome[user["username"]]
+                self._ids_por_nome[new_username] = user_id
+                user["username"] = new_username
+            if hashed is not None:
+                user["password_hash"] = hashed
+        return True, "Usuário atualizado com sucesso!"
+
+    # --- Histórico diário/mensal ---
+    def save_user_daily_data(self, user_id: int, date: str, pegada_total: float, input_data: Dict[str, Any],
+                             fatores_versao: Optional[str] = None) -> None:
+        self.save_user_daily_data_many([(user_id, date, pegada_total, input_data, fatores_versao)])
+
+    def save_user_daily_data_many(self, registros: List[Tuple[int, str, float, Dict[str, Any], Optional[str]]]) -> None:
+        # Cópia via JSON, como ao gravar no banco: alterações posteriores do chamador não vazam
+        linhas = [(u, d, float(p or 0.0), json.dumps(i), v) for u, d, p, i, v in registros]
+        if not linhas:
+            return
+        with self._lock:
+            anteriores = {}
+            for user_id, date, *_ in linhas:
+                salvo = self._dias.get(user_id, {}).get(date)
+                if salvo is not None:
+                    anteriores[(user_id, date)] = (salvo[0], json.loads(salvo[1]))
+            novos = [(u, d, p, json.loads(i)) for u, d, p, i, _ in linhas]
+            for user_id, date, pegada_total, input_json, versao in linhas:
+                dias = self._dias.setdefault(user_id, {})
+                if date not in dias:
+                    bisect.insort(self._datas.setdefault(user_id, []), date)
+                dias[date] = (pegada_total, input_json, versao)
+            for (user_id, mes), variacao in acumular_deltas_mensais(novos, anteriores).items():
+                atual = self._meses.setdefault((user_id, mes), [0.0] * len(variacao))
+                for j, valor in enumerate(variacao):
+                    atual[j] += valor
+            estados = {user_id: self._conquistas.setdefault(user_id, novo_estado()) for user_id in {n[0] for n in novos}}
+            aplicar_lote(estados, novos, anteriores)
+
+    def load_user_daily_data(self, user_id: int, date: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            salvo = self._dias.get(user_id, {}).get(date)
+        if not salvo:
+            return None
+        with trecho("json.input_data"):
+            return {"pegada_total": salvo[0], "input_data": json.loads(salvo[1])}
+
+    def iter_user_daily_data_range(self, user_id: int, inicio: str, fim: str, apos: Optional[str] = None,
+                                   limite: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            datas = self._datas.get(user_id, [])
+            primeiro = bisect.bisect_right(datas, apos) if apos else bisect.bisect_left(datas, inicio)
+            selecionadas = datas[primeiro:bisect.bisect_right(datas, fim)]
+            if limite is not None:
+                selecionadas = selecionadas[:int(limite)]
+            dias = [(date, self._dias[user_id][date]) for date in selecionadas]
+        for date, (pegada_total, input_json, versao) in dias:
+            yield {"date": date, "pegada_total": pegada_total, "input_data": json.loads(input_json), "fatores_versao": versao}
+
+    def load_user_monthly_data(self, user_id: int, month_year: str) -> float:
+        with self._lock:
+            mes = self._meses.get((user_id, month_year))
+        return mes[0] if mes else 0.0
+
+    def load_user_monthly_rollup(self, user_id: int, month_year: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            mes = self._meses.get((user_id, month_year))
+            mes = list(mes) if mes else None
+        if not mes:
+            return None
+        return {
+            "month_year": month_year,
+            "pegada_total": mes[0],
+            "dias_registrados": int(mes[1]),
+            "pegadas_por_categoria": dict(zip(CATEGORIAS, mes[2:])),
+        }
+
+    # --- Gamificação ---
+    def load_usernames(self) -> List[Tuple[int, str]]:
+        with self._lock:
+            return [(user_id, usuario["username"]) for user_id, usuario in self._usuarios.items()]
+
+    def load_monthly_totals(self, month_year: str) -> List[Tuple[int, Optional[str], float]]:
+        with self._lock:
+            linhas = [
+                (user_id, usuario["username"], self._meses.get((user_id, month_year), [0.0])[0])
+                for user_id, usuario in self._usuarios.items()  # sem registro no mês: 0
+            ]
+        return sorted(linhas, key=lambda linha: linha[2], reverse=True)
+
+    def load_daily_totals(self, inicio: Optional[str] = None, fim: Optional[str] = None) -> List[Tuple[int, Optional[str], str, float]]:
+        with self._lock:
+            return [
+                (user_id, self._usuarios.get(user_id, {}).get("username"), date, self._dias[user_id][date][0])
+                for user_id in sorted(self._datas)
+                for date in self._datas[user_id][
+                    bisect.bisect_left(self._datas[user_id], inicio) if inicio else 0:
+                    bisect.bisect_right(self._datas[user_id], fim) if fim else None
+                ]
+            ]
+
+    def get_user_achievements(self, user_id: int, month_year: str) -> Dict[str, Any]:
+        with self._lock:
+            estado = json.loads(json.dumps(self._conquistas[user_id])) if user_id in self._conquistas else None
+        return avaliar_conquistas(estado, month_year)
+
+    # --- Conjuntos versionados de fatores de emissão ---
+    def count_daily_data_by_factor_version(self) -> Dict[Optional[str], int]:
+        contagem: Dict[Optional[str], int] = {}
+        with self._lock:
+            for dias in self._dias.values():
+                for _, _, versao in dias.values():
+                    contagem[versao] = contagem.get(versao, 0) + 1
+        return contagem
+
+    def save_factor_set(self, versao: str, fatores: Dict[str, Any], rendimentos: Optional[Dict[str, Any]] = None, ativar: bool = True):
+        with self._lock:
+            self._fatores[versao] = {"versao": versao, "fatores": fatores, "rendimentos": rendimentos}
+            if ativar:
+                self._versao_ativa = versao
+
+    def get_active_factor_version(self) -> Optional[str]:
+        return self._versao_ativa
+
+    def load_active_factor_set(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._fatores.get(self._versao_ativa) if self._versao_ativa else None
@@ -1,63 +1,158 @@
 import os
 import json
-from typing import Optional, Dict, Any, Tuple, List
+import threading
+from itertools import groupby
+from typing import Optional, Dict, Any, Tuple, List, Iterator
 from datetime import datetime
+from urllib.parse import quote_plus
 
-from passlib.context import CryptContext
-from pymongo import ASCENDING, DESCENDING
+from bson import ObjectId
+from util.calculos_util import CATEGORIAS, calcular_categorias_lote
+from util.conquistas_util import aplicar_lote, avaliar_conquistas, construir_estado, novo_estado
+from util.consolidacao_util import acumular_deltas_mensais
+from util.senhas_util import executor_senhas
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from pymongo.collection import Collection
 import certifi
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return executor_senhas.gerar_hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception:
-        return False
+    return executor_senhas.verificar(plain_password, hashed_password)
 
 
-class MongoService:
-    def __init__(self, uri: str, dbname: str):
-        # Configurações TLS
-        tls_insecure = str(os.getenv("MONGODB_TLS_INSECURE", "")).lower() in ("1", "true", "yes")
-        tls_allow_invalid_hostnames = str(os.getenv("MONGODB_TLS_ALLOW_INVALID_HOSTNAMES", "")).lower() in ("1", "true", "yes")
-        ca_bundle = str(os.getenv("MONGODB_TLS_CA_BUNDLE", "")).strip()
-
-        # Usa cadeia de certificados do certifi por padrão; permite override via MONGODB_TLS_CA_BUNDLE
-        ca_file = ca_bundle if ca_bundle else certifi.where()
-
-        # Torna TLS explícito e aplica opções de diagnóstico quando necessário
-        self.client = MongoClient(
-            uri,
-            server_api=ServerApi('1'),
-            tls=True,
-            tlsCAFile=ca_file,
-            tlsAllowInvalidCertificates=tls_insecure,
-            tlsAllowInvalidHostnames=tls_allow_invalid_hostnames,
+def uri_do_ambiente() -> str:
+    """
+    MONGODB_URI ou, sem ela, a URI montada a partir de MONGODB_USER, MONGODB_PASSWORD e
+    MONGODB_HOST (mais MONGODB_APPNAME, MONGODB_AUTH_SOURCE e MONGODB_AUTH_MECH). Usada pela
+    API e pelos scripts; lança RuntimeError se nenhuma das duas formas estiver configurada.
+    """
+    uri = os.getenv("MONGODB_URI", "").strip()
+    if not uri:
+        usuario = os.getenv("MONGODB_USER", "").strip()
+        senha = os.getenv("MONGODB_PASSWORD", "").strip()
+        host = os.getenv("MONGODB_HOST", "").strip()  # ex.: cluster0.xxxxx.mongodb.net
+        appname = os.getenv("MONGODB_APPNAME", "EcoEchos").strip()
+        auth_source = os.getenv("MONGODB_AUTH_SOURCE", "admin").strip()
+        auth_mech = os.getenv("MONGODB_AUTH_MECH", "").strip()  # opcional, ex.: SCRAM-SHA-256
+        if usuario and senha and host:
+            mech_q = f"&authMechanism={auth_mech}" if auth_mech else ""
+            uri = (
+                f"mongodb+srv://{quote_plus(usuario)}:{quote_plus(senha)}@{host}/"
+                f"?retryWrites=true&w=majority&appName={appname}&authSource={auth_source}{mech_q}"
+            )
+    if not uri:
+        raise RuntimeError("MONGODB_URI não definido e variáveis (MONGODB_USER, MONGODB_PASSWORD, MONGODB_HOST) ausentes")
+    return uri
+
+
+def opcoes_cliente() -> Dict[str, Any]:
+    """Opções de conexão (TLS) comuns aos clientes síncrono e async."""
+    # Configurações TLS
+    tls_insecure = str(os.getenv("MONGODB_TLS_INSECURE", "")).lower() in ("1", "true", "yes")
+    tls_allow_invalid_hostnames = str(os.getenv("MONGODB_TLS_ALLOW_INVALID_HOSTNAMES", "")).lower() in ("1", "true", "yes")
+    ca_bundle = str(os.getenv("MONGODB_TLS_CA_BUNDLE", "")).strip()
+
+    # Usa cadeia de certificados do certifi por padrão; permite override via MONGODB_TLS_CA_BUNDLE
+    ca_file = ca_bundle if ca_bundle else certifi.where()
+
+    # Torna TLS explícito e aplica opções de diagnóstico quando necessário
+    return {
+        "server_api": ServerApi('1'),
+        "tls": True,
+        "tlsCAFile": ca_file,
+        "tlsAllowInvalidCertificates": tls_insecure,
+        "tlsAllowInvalidHostnames": tls_allow_invalid_hostnames,
+    }
+
+
+# Consultas e conversões comuns ao MongoService e ao AsyncMongoService (services/mongo_service_async.py)
+def cursor_dias_intervalo(daily, user_id: str, inicio: str, fim: str, apos: Optional[str] = None,
+                          limite: Optional[int] = None, tamanho_pagina: int = 500):
+    """Cursor (síncrono ou async, conforme a coleção) dos dias de `inicio` a `fim` após `apos`, pelo índice (user_id, date)."""
+    filtro_data: Dict[str, Any] = {"$gte": inicio, "$lte": fim}
+    if apos:
+        filtro_data["$gt"] = apos
+    cur = (
+        daily.find(
+            {"user_id": user_id, "date": filtro_data},
+            {"_id": 0, "date": 1, "pegada_total": 1, "input_data": 1, "fatores_versao": 1},
         )
+        .sort("date", ASCENDING)
+        .batch_size(tamanho_pagina)  # cursor no servidor: busca um lote por vez
+    )
+    if limite is not None:
+        cur = cur.limit(int(limite))
+    return cur
+
+
+def filtro_mes(user_id: str, month_year: str) -> Dict[str, Any]:
+    return {"user_id": user_id, "month_year": month_year}
+
+
+def consolidacao_mensal(doc: Optional[Dict[str, Any]], month_year: str) -> Optional[Dict[str, Any]]:
+    """Documento de monthly_data no formato de load_user_monthly_rollup (None sem documento)."""
+    if not doc:
+        return None
+    categorias = doc.get("categorias") or {}
+    return {
+        "month_year": month_year,
+        "pegada_total": float(doc.get("pegada_total", 0.0)),
+        "dias_registrados": int(doc.get("dias_registrados", 0)),
+        "pegadas_por_categoria": {c: float(categorias.get(c, 0.0)) for c in CATEGORIAS},
+    }
+
+
+class MongoService:
+    def __init__(self, uri: str, dbname: str, aquecer_em_segundo_plano: bool = False):
+        self.client = MongoClient(uri, **opcoes_cliente())
         self.db = self.client[dbname]
         self.users: Collection = self.db["users"]
         self.daily: Collection = self.db["daily_data"]
         self.monthly: Collection = self.db["monthly_data"]
+        self.factor_sets: Collection = self.db["emission_factor_sets"]
+        self.achievement_state: Collection = self.db["achievement_state"]
+        # Transações multi-documento exigem replica set/mongos (o Atlas sempre é);
+        # em um servidor standalone o salvamento cai para dia + $inc no mês, sem transação.
+        self._usar_transacoes = True
+        # Aquecimento (conexão + índices): com `aquecer_em_segundo_plano`, roda em uma thread e o
+        # construtor não espera o servidor (na API, o worker sobe sem depender da latência do Mongo)
+        self.aquecido = threading.Event()
+        self.erro_aquecimento: Optional[str] = None
+        if aquecer_em_segundo_plano:
+            threading.Thread(target=self.aquecer, name="aquecimento-mongo", daemon=True).start()
+        else:
+            self.aquecer()
+
+    def aquecer(self) -> None:
+        """Abre a conexão e cria os índices (idempotente). Erros ficam em `erro_aquecimento`."""
         try:
             self._ensure_indexes()
-        except Exception:
-            pass
+            self.erro_aquecimento = None
+        except Exception as e:
+            self.erro_aquecimento = str(e)
+        finally:
+            self.aquecido.set()
 
     def _ensure_indexes(self):
         self.users.create_index([("username", ASCENDING)], unique=True)
         self.daily.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
         self.daily.create_index([("date", ASCENDING)])
         self.monthly.create_index([("user_id", ASCENDING), ("month_year", ASCENDING)], unique=True)
+        self.monthly.create_index([("month_year", ASCENDING), ("pegada_total", DESCENDING)])
+        self.daily.create_index([("fatores_versao", ASCENDING)])
+        self.factor_sets.create_index([("versao", ASCENDING)], unique=True)
+        self.factor_sets.create_index([("ativo", ASCENDING)])
+        self.achievement_state.create_index([("user_id", ASCENDING)], unique=True)
+
+    # Ids de usuário são o ObjectId em texto (protocolo Repositorio)
+    normalizar_id = staticmethod(str)
 
     def ping(self) -> bool:
         try:
@@ -68,8 +163,8 @@ class MongoService:
 
     # --- Usuários ---
     def register_user_api(self, username: str, password: str) -> Tuple[bool, str]:
+        hashed = hash_password(password)  # fora do try: FilaSenhasCheia/TempoSenhasEsgotado devem chegar à API
         try:
-            hashed = hash_password(password)
             self.users.insert_one({"username": username, "password_hash": hashed})
             return True, "Usuário cadastrado com sucesso!"
         except Exception as e:
@@ -83,8 +178,11 @@ class MongoService:
             return {"id": str(user["_id"]), "username": user["username"]}
         return None
 
+    def load_user_credentials(self, username: str) -> Optional[Tuple[str, str, str]]:
+        user = self.users.find_one({"username": username}, {"username": 1, "password_hash": 1})
+        return (str(user["_id"]), user["username"], user.get("password_hash", "")) if user else None
+
     def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
-        from bson import ObjectId
         try:
             _id = ObjectId(user_id)
         except Exception:
@@ -95,7 +193,6 @@ class MongoService:
         return {"id": str(user["_id"]), "username": user["username"]}
 
     def update_user(self, user_id: str, new_username: Optional[str] = None, new_password: Optional[str] = None) -> Tuple[bool, str]:
-        from bson import ObjectId
         try:
             _id = ObjectId(user_id)
         except Exception:
@@ -104,7 +201,7 @@ class MongoService:
         if new_username is not None:
             update["username"] = new_username
         if new_password is not None:
-            update["password_hash"] = hash_password(new_password)
+            update["password_hash"] = hash_password(new_password)  # FilaSenhasCheia/TempoSenhasEsgotado chegam à API
         if not update:
             return False, "Nada para atualizar."
         try:
@@ -116,75 +213,239 @@ class MongoService:
             return False, f"Erro ao atualizar: {e}"
 
     # --- Histórico diário/mensal ---
-    def save_user_daily_data(self, user_id: str, date: str, pegada_total: float, input_data: Dict[str, Any]):
-        doc = {
-            "user_id": user_id,
-            "date": date,
-            "pegada_total": float(pegada_total),
-            "input_data": input_data,
-            "updated_at": datetime.utcnow(),
+    def save_user_daily_data(self, user_id: str, date: str, pegada_total: float, input_data: Dict[str, Any], fatores_versao: Optional[str] = None):
+        self.save_user_daily_data_many([(user_id, date, pegada_total, input_data, fatores_versao)])
+
+    def _em_transacao(self, operacao):
+        """Executa `operacao(session)` em uma transação; sem suporte a transações, executa sem sessão."""
+        if self._usar_transacoes:
+            try:
+                with self.client.start_session() as session:
+                    return session.with_transaction(operacao)
+            except OperationFailure as e:
+                if e.code != 20:  # IllegalOperation: servidor sem suporte a transações
+                    raise
+                self._usar_transacoes = False
+        return operacao(None)
+
+    def save_user_daily_data_many(self, registros: List[Tuple[str, str, float, Dict[str, Any], Optional[str]]]):
+        """
+        Salva vários dias (user_id, date, pegada_total, input_data, fatores_versao) com um
+        bulk_write não ordenado para os dias e outro para os meses, em uma transação quando
+        o servidor suporta.
+        """
+        agora = datetime.utcnow()
+        docs = [
+            {
+                "user_id": user_id,
+                "date": date,
+                "pegada_total": float(pegada_total),
+                "input_data": input_data,
+                "fatores_versao": fatores_versao,
+                "updated_at": agora,
+            }
+            for user_id, date, pegada_total, input_data, fatores_versao in registros
+        ]
+        if docs:
+            self._em_transacao(lambda session: self._salvar_dias_e_meses(docs, session))
+
+    def _salvar_dias_e_meses(self, docs: List[Dict[str, Any]], session=None):
+        chaves = {(d["user_id"], d["date"]) for d in docs}
+        anteriores = {
+            (d["user_id"], d["date"]): (d.get("pegada_total"), d.get("input_data"))
+            for d in self.daily.find(
+                {"$or": [{"user_id": u, "date": dt} for u, dt in chaves]},
+                {"user_id": 1, "date": 1, "pegada_total": 1, "input_data": 1, "_id": 0},
+                session=session,
+            )
         }
-        self.daily.update_one({"user_id": user_id, "date": date}, {"$set": doc}, upsert=True)
+        novos = [(d["user_id"], d["date"], d["pegada_total"], d["input_data"]) for d in docs]
+        variacoes = acumular_deltas_mensais(novos, anteriores)
+        # Em um bulk_write não ordenado a ordem não é garantida: fica só a última versão de cada dia
+        ultimos = {(d["user_id"], d["date"]): d for d in docs}
+        self.daily.bulk_write(
+            [UpdateOne({"user_id": u, "date": dt}, {"$set": d}, upsert=True) for (u, dt), d in ultimos.items()],
+            ordered=False,
+            session=session,
+        )
+        operacoes = []
+        for (user_id, mes), v in variacoes.items():
+            incrementos = {"pegada_total": v[0], "dias_registrados": v[1]}
+            incrementos.update({f"categorias.{c}": v[j] for j, c in enumerate(CATEGORIAS, start=2)})
+            operacoes.append(UpdateOne({"user_id": user_id, "month_year": mes}, {"$inc": incrementos}, upsert=True))
+        self.monthly.bulk_write(operacoes, ordered=False, session=session)
+        # Estado das conquistas dos usuários do lote (sem transação, salvamentos simultâneos
+        # do mesmo usuário podem se sobrepor; rebuild_achievement_states corrige)
+        user_ids = list({d["user_id"] for d in docs})
+        estados = {u: novo_estado() for u in user_ids}
+        for doc in self.achievement_state.find({"user_id": {"$in": user_ids}}, {"_id": 0}, session=session):
+            estados[doc["user_id"]] = doc["estado"]
+        aplicar_lote(estados, novos, anteriores)
+        self.achievement_state.bulk_write(
+            [ReplaceOne({"user_id": u}, {"user_id": u, "estado": e}, upsert=True) for u, e in estados.items()],
+            ordered=False,
+            session=session,
+        )
 
     def load_user_daily_data(self, user_id: str, date: str) -> Optional[Dict[str, Any]]:
         doc = self.daily.find_one({"user_id": user_id, "date": date}, {"_id": 0})
         return doc
 
+    def iter_user_daily_data_range(self, user_id: str, inicio: str, fim: str, apos: Optional[str] = None,
+                                   limite: Optional[int] = None, tamanho_pagina: int = 500) -> Iterator[Dict[str, Any]]:
+        """Dias salvos de `inicio` a `fim` (inclusive), em ordem, após o cursor `apos`; usa o índice (user_id, date)."""
+        cur = cursor_dias_intervalo(self.daily, user_id, inicio, fim, apos, limite, tamanho_pagina)
+        try:
+            for doc in cur:
+                yield doc
+        finally:
+            cur.close()
+
     def load_user_monthly_data(self, user_id: str, month_year: str) -> float:
-        # Soma pegadas cujo date começa com YYYY-MM
-        cur = self.daily.find({"user_id": user_id, "date": {"$regex": f"^{month_year}"}}, {"pegada_total": 1, "_id": 0})
-        total = 0.0
-        for d in cur:
-            try:
-                total += float(d.get("pegada_total", 0.0))
-            except Exception:
-                continue
-        return total
+        # Lida da consolidação mensal mantida por save_user_daily_data
+        doc = self.monthly.find_one(filtro_mes(user_id, month_year), {"pegada_total": 1, "_id": 0})
+        return float(doc.get("pegada_total", 0.0)) if doc else 0.0
+
+    def load_user_monthly_rollup(self, user_id: str, month_year: str) -> Optional[Dict[str, Any]]:
+        return consolidacao_mensal(self.monthly.find_one(filtro_mes(user_id, month_year), {"_id": 0}), month_year)
+
+    def rebuild_monthly_rollups(self, tamanho_bloco: int = 5000) -> int:
+        """
+        Reconstrói a coleção mensal a partir dos dias salvos (backfill único ou depois de um
+        recálculo). Salvamentos concorrentes durante a execução podem ser sobrescritos;
+        rode com pouco tráfego. Retorna a quantidade de meses consolidados.
+        """
+        meses: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        ultimo_id = None
+        while True:
+            filtro = {"_id": {"$gt": ultimo_id}} if ultimo_id is not None else {}
+            bloco = list(
+                self.daily.find(filtro, {"user_id": 1, "date": 1, "pegada_total": 1, "input_data": 1})
+                .sort("_id", 1).limit(tamanho_bloco)
+            )
+            if not bloco:
+                break
+            ultimo_id = bloco[-1]["_id"]
+            categorias = calcular_categorias_lote([d.get("input_data") for d in bloco])
+            for d, por_categoria in zip(bloco, categorias):
+                mes = meses.setdefault(
+                    (d["user_id"], str(d["date"])[:7]),
+                    {"pegada_total": 0.0, "dias_registrados": 0, "categorias": dict.fromkeys(CATEGORIAS, 0.0)},
+                )
+                mes["pegada_total"] += float(d.get("pegada_total") or 0.0)
+                mes["dias_registrados"] += 1
+                for c in CATEGORIAS:
+                    mes["categorias"][c] += por_categoria[c]
+        operacoes = [
+            ReplaceOne({"user_id": user_id, "month_year": mes_ano}, {"user_id": user_id, "month_year": mes_ano, **valores}, upsert=True)
+            for (user_id, mes_ano), valores in meses.items()
+        ]
+        if operacoes:
+            self.monthly.bulk_write(operacoes, ordered=False)
+        # Meses que não têm mais nenhum dia salvo
+        self.monthly.delete_many({"dias_registrados": {"$lte": 0}})
+        return len(meses)
+
+    def rebuild_achievement_states(self) -> int:
+        """
+        Reconstrói o estado das conquistas de todos os usuários a partir dos dias salvos
+        (backfill único ou depois de um recálculo). Retorna a quantidade de usuários processados.
+        """
+        cur = self.daily.find({}, {"_id": 0, "user_id": 1, "date": 1, "pegada_total": 1, "input_data": 1}).sort(
+            [("user_id", ASCENDING), ("date", ASCENDING)]
+        )
+        self.achievement_state.delete_many({})
+        usuarios = 0
+        operacoes = []
+        for user_id, dias in groupby(cur, key=lambda d: d["user_id"]):
+            estado = construir_estado((d["date"], d.get("pegada_total"), d.get("input_data")) for d in dias)
+            operacoes.append(ReplaceOne({"user_id": user_id}, {"user_id": user_id, "estado": estado}, upsert=True))
+            usuarios += 1
+            if len(operacoes) >= 1000:
+                self.achievement_state.bulk_write(operacoes, ordered=False)
+                operacoes = []
+        if operacoes:
+            self.achievement_state.bulk_write(operacoes, ordered=False)
+        return usuarios
+
+    def count_daily_data_by_factor_version(self) -> Dict[Optional[str], int]:
+        agg = self.daily.aggregate([{"$group": {"_id": "$fatores_versao", "count": {"$sum": 1}}}])
+        return {r["_id"]: int(r["count"]) for r in agg}
+
+    # --- Conjuntos versionados de fatores de emissão ---
+    def save_factor_set(self, versao: str, fatores: Dict[str, Any], rendimentos: Optional[Dict[str, Any]] = None, ativar: bool = True):
+        self.factor_sets.update_one(
+            {"versao": versao},
+            {"$set": {"fatores": fatores, "rendimentos": rendimentos, "ativo": False, "criado_em": datetime.utcnow()}},
+            upsert=True,
+        )
+        if ativar:
+            self.factor_sets.update_many({"versao": {"$ne": versao}}, {"$set": {"ativo": False}})
+            self.factor_sets.update_one({"versao": versao}, {"$set": {"ativo": True}})
+
+    def get_active_factor_version(self) -> Optional[str]:
+        doc = self.factor_sets.find_one({"ativo": True}, {"versao": 1, "_id": 0})
+        return doc["versao"] if doc else None
+
+    def load_active_factor_set(self) -> Optional[Dict[str, Any]]:
+        return self.factor_sets.find_one({"ativo": True}, {"_id": 0, "versao": 1, "fatores": 1, "rendimentos": 1})
 
     # --- Gamificação ---
     def get_monthly_ranking(self, month_year: str, limit: int = 10) -> List[Dict[str, Any]]:
-        pipeline = [
-            {"$match": {"date": {"$regex": f"^{month_year}"}}},
-            {"$group": {"_id": "$user_id", "total": {"$sum": "$pegada_total"}}},
-            {"$sort": {"total": -1}},
-            {"$limit": int(limit)},
+        return [
+            {"user_id": user_id, "username": username, "total_pegada": total}
+            for user_id, username, total in self.load_monthly_totals(month_year, limit)
         ]
-        agg = list(self.daily.aggregate(pipeline))
-        ranking = []
-        for r in agg:
-            u = self.users.find_one({"_id": r["_id"]}) if False else None  # opcional: join manual
-            ranking.append({
-                "user_id": r["_id"],
-                "username": None,  # para não encarecer a query; front pode resolver
-                "total_pegada": float(r.get("total", 0.0)),
-            })
-        return ranking
+
+    def load_usernames(self) -> List[Tuple[str, str]]:
+        return [(str(d["_id"]), d["username"]) for d in self.users.find({}, {"username": 1})]
+
+    def load_monthly_totals(self, month_year: str, limit: Optional[int] = None) -> List[Tuple[str, Optional[str], float]]:
+        """
+        (user_id, username, pegada_total) de todos os usuários (0 sem registro no mês), em ordem de
+        ranking, com o total do mês buscado no servidor (índice (user_id, month_year) de monthly).
+        """
+        pipeline: List[Dict[str, Any]] = [
+            {"$lookup": {
+                "from": self.monthly.name,
+                "let": {"uid": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"month_year": month_year, "$expr": {"$eq": ["$user_id", "$$uid"]}}},
+                    {"$project": {"_id": 0, "pegada_total": 1}},
+                ],
+                "as": "mes",
+            }},
+            {"$project": {
+                "_id": 0,
+                "user_id": {"$toString": "$_id"},
+                "username": 1,
+                "pegada_total": {"$ifNull": [{"$arrayElemAt": ["$mes.pegada_total", 0]}, 0]},
+            }},
+            {"$sort": {"pegada_total": DESCENDING, "user_id": ASCENDING}},
+        ]
+        if limit is not None:
+            pipeline.append({"$limit": int(limit)})
+        cur = self.users.aggregate(pipeline)
+        return [(d["user_id"], d.get("username"), float(d.get("pegada_total") or 0.0)) for d in cur]
+
+    def load_daily_totals(self, inicio: Optional[str] = None, fim: Optional[str] = None) -> List[Tuple[str, Optional[str], str, float]]:
+        """
+        (user_id, username, date, pegada_total) dos dias salvos de `inicio` a `fim` ('YYYY-MM-DD',
+        inclusive; sem eles, todos), em ordem de usuário e data. Só os nomes dos usuários lidos são buscados.
+        """
+        filtro: Dict[str, Any] = {}
+        if inicio or fim:
+            filtro["date"] = {**({"$gte": inicio} if inicio else {}), **({"$lte": fim} if fim else {})}
+        # Filtra pelo índice de date; a ordem por usuário é feita aqui
+        dias = sorted(
+            (d["user_id"], d["date"], float(d.get("pegada_total") or 0.0))
+            for d in self.daily.find(filtro, {"_id": 0, "user_id": 1, "date": 1, "pegada_total": 1})
+        )
+        ids = [ObjectId(u) for u in {d[0] for d in dias} if ObjectId.is_valid(u)]
+        nomes = {str(u["_id"]): u.get("username") for u in self.users.find({"_id": {"$in": ids}}, {"username": 1})} if ids else {}
+        return [(user_id, nomes.get(user_id), date, pegada_total) for user_id, date, pegada_total in dias]
 
     def get_user_achievements(self, user_id: str, month_year: str) -> Dict[str, Any]:
-        cur = self.daily.find({"user_id": user_id, "date": {"$regex": f"^{month_year}"}}, {"input_data": 1, "_id": 0})
-        days_logged = 0
-        sum_bus_metro = 0.0
-        sum_car_fuel_km = 0.0
-        used_electric = False
-        planted_trees = False
-        for d in cur:
-            days_logged += 1
-            data = d.get("input_data", {}) or {}
-            try:
-                sum_bus_metro += float(data.get("km_onibus", 0.0)) + float(data.get("km_metro", 0.0))
-                sum_car_fuel_km += float(data.get("distancia_carro_moto_combustivel", 0.0))
-                if bool(data.get("usa_veiculo_eletrico", False)) and float(data.get("distancia_veiculo_eletrico", 0.0)) > 0:
-                    used_electric = True
-                if float(data.get("num_arvores_plantadas_mensal", 0.0)) > 0 or float(data.get("kg_creditos_carbono", 0.0)) > 0:
-                    planted_trees = True
-            except Exception:
-                pass
-        achievements = []
-        achievements.append({"key": "registro_iniciado", "title": "Registro Iniciado", "achieved": days_logged >= 1, "details": f"{days_logged} dia(s) registrado(s)"})
-        achievements.append({"key": "consistencia_bronze", "title": "Consistência Bronze", "achieved": days_logged >= 5})
-        achievements.append({"key": "consistencia_prata", "title": "Consistência Prata", "achieved": days_logged >= 10})
-        achievements.append({"key": "consistencia_ouro", "title": "Consistência Ouro", "achieved": days_logged >= 20})
-        achievements.append({"key": "transporte_coletivo", "title": "Transporte Coletivo Adepto", "achieved": sum_bus_metro > sum_car_fuel_km})
-        achievements.append({"key": "eletrificado", "title": "Eletrificado", "achieved": used_electric})
-        achievements.append({"key": "plantador", "title": "Plantador/Compensador", "achieved": planted_trees})
-        return {"month_year": month_year, "days_logged": days_logged, "achievements": achievements}
+        # Avaliadas sobre o estado incremental do usuário, sem ler os dias salvos
+        doc = self.achievement_state.find_one({"user_id": user_id}, {"_id": 0, "estado": 1})
+        return avaliar_conquistas(doc["estado"] if doc else None, month_year)
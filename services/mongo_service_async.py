@@ -0,0 +1,61 @@
+from typing import Any, AsyncIterator, Dict, Optional
+
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+
+from services.mongo_service import consolidacao_mensal, cursor_dias_intervalo, filtro_mes, opcoes_cliente
+from util.conquistas_util import avaliar_conquistas
+from util.senhas_util import executor_senhas
+
+
+class AsyncMongoService:
+    """
+    Leituras do MongoService com o driver async do PyMongo (AsyncMongoClient, sucessor do
+    Motor), para as rotas async não ocuparem threads esperando o servidor. As gravações
+    (transações, bulk_write, estado das conquistas) continuam no MongoService síncrono,
+    chamado pelo executor de banco, para não duplicar essa lógica.
+    """
+
+    def __init__(self, uri: str, dbname: str):
+        self.client = AsyncMongoClient(uri, **opcoes_cliente())
+        self.db = self.client[dbname]
+        self.users = self.db["users"]
+        self.daily = self.db["daily_data"]
+        self.monthly = self.db["monthly_data"]
+        self.achievement_state = self.db["achievement_state"]
+
+    async def login_user_api(self, username: str, password: str) -> Optional[Dict[str, Any]]:
+        user = await self.users.find_one({"username": username})
+        if user and await executor_senhas.verificar_async(password, user.get("password_hash", "")):
+            return {"id": str(user["_id"]), "username": user["username"]}
+        return None
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            _id = ObjectId(user_id)
+        except Exception:
+            return None
+        user = await self.users.find_one({"_id": _id}, {"username": 1})
+        if not user:
+            return None
+        return {"id": str(user["_id"]), "username": user["username"]}
+
+    async def load_user_daily_data(self, user_id: str, date: str) -> Optional[Dict[str, Any]]:
+        return await self.daily.find_one({"user_id": user_id, "date": date}, {"_id": 0})
+
+    async def iter_user_daily_data_range(self, user_id: str, inicio: str, fim: str, apos: Optional[str] = None,
+                                         limite: Optional[int] = None, tamanho_pagina: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Dias salvos de `inicio` a `fim` (inclusive), em ordem, após o cursor `apos`; usa o índice (user_id, date)."""
+        cur = cursor_dias_intervalo(self.daily, user_id, inicio, fim, apos, limite, tamanho_pagina)
+        try:
+            async for doc in cur:
+                yield doc
+        finally:
+            await cur.close()
+
+    async def load_user_monthly_rollup(self, user_id: str, month_year: str) -> Optional[Dict[str, Any]]:
+        return consolidacao_mensal(await self.monthly.find_one(filtro_mes(user_id, month_year), {"_id": 0}), month_year)
+
+    async def get_user_achievements(self, user_id: str, month_year: str) -> Dict[str, Any]:
+        doc = await self.achievement_state.find_one({"user_id": user_id}, {"_id": 0, "estado": 1})
+        return avaliar_conquistas(doc["estado"] if doc else None, month_year)
@@ -0,0 +1,151 @@
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from util.cache_util import AUSENTE, CacheLRU, UnicoVoo
+from util.compartilhado_util import CacheCompartilhado
+from util.rastreio_util import trecho
+
+
+class Repositorio(Protocol):
+    """
+    Operações de dados usadas pela API, implementadas por db_service (RepositorioSQLite),
+    MongoService e MemoriaService. Os ids de usuário chegam já normalizados por `normalizar_id`
+    (SQLite e memória: int; Mongo: str).
+    """
+
+    def normalizar_id(self, user_id: Any) -> Any: ...
+    def ping(self) -> bool: ...
+
+    def register_user_api(self, username: str, password: str) -> Tuple[bool, str]: ...
+    def login_user_api(self, username: str, password: str) -> Optional[Dict[str, Any]]: ...
+    def load_user_credentials(self, username: str) -> Optional[Tuple[Any, str, str]]: ...
+    def get_user_by_id(self, user_id: Any) -> Optional[Dict[str, Any]]: ...
+    def update_user(self, user_id: Any, new_username: Optional[str] = None, new_password: Optional[str] = None) -> Tuple[bool, str]: ...
+
+    def save_user_daily_data(self, user_id: Any, date: str, pegada_total: float, input_data: Dict[str, Any],
+                             fatores_versao: Optional[str] = None) -> None: ...
+    def save_user_daily_data_many(self, registros: List[Tuple[Any, str, float, Dict[str, Any], Optional[str]]]) -> None: ...
+    def load_user_daily_data(self, user_id: Any, date: str) -> Optional[Dict[str, Any]]: ...
+    def iter_user_daily_data_range(self, user_id: Any, inicio: str, fim: str, apos: Optional[str] = None,
+                                   limite: Optional[int] = None) -> Iterator[Dict[str, Any]]: ...
+    def load_user_monthly_data(self, user_id: Any, month_year: str) -> float: ...
+    def load_user_monthly_rollup(self, user_id: Any, month_year: str) -> Optional[Dict[str, Any]]: ...
+
+    def load_usernames(self) -> Iterable[Tuple[Any, str]]: ...
+    def load_monthly_totals(self, month_year: str) -> Iterable[Tuple[Any, Optional[str], float]]: ...
+    def load_daily_totals(self, inicio: Optional[str] = None, fim: Optional[str] = None) -> Iterable[Tuple[Any, Optional[str], str, float]]: ...
+    def get_user_achievements(self, user_id: Any, month_year: str) -> Dict[str, Any]: ...
+
+    def count_daily_data_by_factor_version(self) -> Dict[Optional[str], int]: ...
+    def get_active_factor_version(self) -> Optional[str]: ...
+    def load_active_factor_set(self) -> Optional[Dict[str, Any]]: ...
+
+
+class RepositorioEmCache:
+    """
+    Decorador de um Repositorio com cache read-through (LRU, TTL) de usuários, dias, totais e
+    consolidações do mês e conquistas. Leituras simultâneas da mesma chave compartilham uma
+    única ida ao banco. Gravações e atualizações feitas por aqui invalidam na hora tudo o que
+    está guardado do usuário (a geração do usuário faz parte da chave, então uma leitura que
+    começou antes da gravação não guarda valor antigo). Com `compartilhado`, a geração de cada
+    usuário fica no quadro de versões do host, e uma gravação em qualquer worker invalida o
+    usuário em todos; sem ele, gravações de outros processos aparecem quando a entrada expira.
+    Os valores devolvidos são compartilhados: não os altere. As demais operações passam direto
+    para o repositório de base.
+    """
+
+    def __init__(self, base: Repositorio, tamanho_maximo: int = 10000, ttl: float = 30.0,
+                 compartilhado: Optional[CacheCompartilhado] = None):
+        self.base = base
+        self.compartilhado = compartilhado
+        self._cache = CacheLRU(tamanho_maximo, ttl=ttl, nome="repositorio") if tamanho_maximo > 0 else None
+        self._voos = UnicoVoo(nome="repositorio")
+        self._lock = threading.Lock()
+        self._geracoes: Dict[Hashable, int] = {}
+        self.invalidacoes = 0
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self.base, nome)
+
+    def _chave(self, tipo: str, user_id: Hashable, args: Tuple) -> Hashable:
+        if self.compartilhado is not None:
+            return (tipo, user_id, self.compartilhado.versao(("usuario", user_id)), *args)
+        return (tipo, user_id, self._geracoes.get(user_id, 0), *args)
+
+    def invalidar(self, user_id: Hashable) -> None:
+        if self.compartilhado is not None:
+            self.compartilhado.incrementar(("usuario", user_id))
+        with self._lock:
+            if self.compartilhado is None:
+                self._geracoes[user_id] = self._geracoes.get(user_id, 0) + 1
+            self.invalidacoes += 1
+
+    def _guardar(self, chave: Hashable, valor: Any) -> Any:
+        if self._cache is not None:
+            self._cache.definir(chave, valor)
+        return valor
+
+    def obter(self, tipo: str, user_id: Hashable, args: Tuple, carregar: Callable[[], Any]) -> Any:
+        # Trecho sem filhos no rastreio: acerto do cache (ou carga feita por outra requisição)
+        with trecho("repositorio", tipo=tipo):
+            chave = self._chave(tipo, user_id, args)
+            if self._cache is not None:
+                valor = self._cache.obter(chave)
+                if valor is not AUSENTE:
+                    return valor
+            return self._voos.executar(chave, lambda: self._guardar(chave, carregar()))
+
+    async def obter_async(self, tipo: str, user_id: Hashable, args: Tuple, carregar: Callable[[], Awaitable[Any]]) -> Any:
+        """Como `obter`, para rotas async: acertos não saem do event loop; `carregar` é a leitura async."""
+        with trecho("repositorio", tipo=tipo):
+            chave = self._chave(tipo, user_id, args)
+            if self._cache is not None:
+                valor = self._cache.obter(chave)
+                if valor is not AUSENTE:
+                    return valor
+
+            async def carregar_e_guardar():
+                return self._guardar(chave, await carregar())
+
+            return await self._voos.executar_async(chave, carregar_e_guardar)
+
+    # --- Leituras em cache ---
+    def get_user_by_id(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        return self.obter("usuario", user_id, (), lambda: self.base.get_user_by_id(user_id))
+
+    def load_user_daily_data(self, user_id: Any, date: str) -> Optional[Dict[str, Any]]:
+        return self.obter("dia", user_id, (date,), lambda: self.base.load_user_daily_data(user_id, date))
+
+    def load_user_monthly_data(self, user_id: Any, month_year: str) -> float:
+        return self.obter("total_mes", user_id, (month_year,), lambda: self.base.load_user_monthly_data(user_id, month_year))
+
+    def load_user_monthly_rollup(self, user_id: Any, month_year: str) -> Optional[Dict[str, Any]]:
+        return self.obter("consolidacao", user_id, (month_year,), lambda: self.base.load_user_monthly_rollup(user_id, month_year))
+
+    def get_user_achievements(self, user_id: Any, month_year: str) -> Dict[str, Any]:
+        return self.obter("conquistas", user_id, (month_year,), lambda: self.base.get_user_achievements(user_id, month_year))
+
+    # --- Gravações (invalidam o usuário) ---
+    def update_user(self, user_id: Any, new_username: Optional[str] = None, new_password: Optional[str] = None) -> Tuple[bool, str]:
+        try:
+            return self.base.update_user(user_id, new_username, new_password)
+        finally:
+            self.invalidar(user_id)
+
+    def save_user_daily_data(self, user_id: Any, date: str, pegada_total: float, input_data: Dict[str, Any],
+                             fatores_versao: Optional[str] = None) -> None:
+        try:
+            self.base.save_user_daily_data(user_id, date, pegada_total, input_data, fatores_versao)
+        finally:
+            self.invalidar(user_id)
+
+    def save_user_daily_data_many(self, registros: List[Tuple[Any, str, float, Dict[str, Any], Optional[str]]]) -> None:
+        try:
+            self.base.save_user_daily_data_many(registros)
+        finally:
+            for user_id in {r[0] for r in registros}:
+                self.invalidar(user_id)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        info = self._cache.estatisticas() if self._cache is not None else {"nome": "repositorio", "tamanho_maximo": 0}
+        return {**info, "invalidacoes": self.invalidacoes, "leituras": self._voos.estatisticas()}
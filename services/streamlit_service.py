@@ -0,0 +1,38 @@
+"""
+Operações de banco da interface Streamlit (app.py): as mesmas de services/db_service.py,
+com as mensagens exibidas na tela. Fica fora de db_service para a API não importar o Streamlit.
+"""
+import streamlit as st
+
+from services import db_service
+from util.calculos_util import calcular_pegada_completa
+from util.fatores_util import obter_tabela_fatores
+
+
+def register_user(username, password):
+    """Registra um novo usuário com senha devidamente criptografada."""
+    ok, mensagem = db_service.register_user_api(username, password)
+    if ok:
+        st.success("Usuário registrado com sucesso! Agora você pode fazer o login.")
+    else:
+        st.error(mensagem)
+
+
+def login_user(username, password):
+    """Faz o login do usuário, buscando no banco e verificando a senha criptografada."""
+    user = db_service.login_user_api(username, password)
+    if user is None:
+        st.error("Usuário ou senha inválidos.")
+    return user
+
+
+def save_user_daily_data(user_id, date, pegada_total, input_data):
+    """
+    Salva ou atualiza os dados diários de um usuário e avisa na tela. A pegada é recalculada de
+    `input_data` com a tabela ativa, cuja versão fica registrada no dia; `pegada_total` da tela
+    (que pode ser o total de um mês carregado) não é gravado.
+    """
+    tabela = obter_tabela_fatores()
+    pegada_total = calcular_pegada_completa(input_data, tabela)["pegada_total"]
+    db_service.save_user_daily_data(user_id, date, pegada_total, input_data, tabela.versao)
+    st.success(f"Dados de {date} salvos com sucesso!")
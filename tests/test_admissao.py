@@ -0,0 +1,120 @@
+"""ClasseAdmissao: limite, fila cheia, prazo na fila e cancelamento de quem espera."""
+import asyncio
+
+import pytest
+
+from util.admissao_util import ClasseAdmissao, ControleAdmissao
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+async def _esperar_fila(classe, tamanho):
+    while len(classe._fila) < tamanho:
+        await asyncio.sleep(0)
+
+
+def test_admite_ate_o_limite_e_rejeita_com_fila_cheia():
+    async def cenario():
+        classe = ClasseAdmissao("leitura", limite=2, prazo=1.0, fila_max=1)
+        assert await classe.entrar() and await classe.entrar()
+        esperando = asyncio.ensure_future(classe.entrar())
+        await _esperar_fila(classe, 1)
+        assert await classe.entrar() is False  # fila cheia
+        classe.sair()  # a vaga passa direto para quem esperava
+        assert await esperando is True
+        return classe
+
+    classe = _rodar(cenario())
+    assert classe.em_execucao == 2
+    assert (classe.admitidas, classe.rejeitadas_fila, classe.rejeitadas_prazo) == (3, 1, 0)
+
+
+def test_prazo_na_fila_rejeita_e_libera_a_posicao():
+    async def cenario():
+        classe = ClasseAdmissao("escrita", limite=1, prazo=0.02)
+        assert await classe.entrar()
+        assert await classe.entrar() is False
+        return classe
+
+    classe = _rodar(cenario())
+    assert classe.rejeitadas_prazo == 1
+    assert len(classe._fila) == 0
+    assert classe.em_execucao == 1
+    classe.sair()
+    assert classe.em_execucao == 0
+
+
+def test_cancelamento_na_fila_nao_ocupa_vaga():
+    async def cenario():
+        classe = ClasseAdmissao("escrita", limite=1, prazo=5.0)
+        assert await classe.entrar()
+        esperando = asyncio.ensure_future(classe.entrar())
+        await _esperar_fila(classe, 1)
+        esperando.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await esperando
+        assert len(classe._fila) == 0
+        classe.sair()
+        return classe
+
+    classe = _rodar(cenario())
+    assert classe.em_execucao == 0
+    assert classe.admitidas == 1
+
+
+def test_cancelamento_depois_de_receber_a_vaga_a_devolve():
+    async def cenario():
+        classe = ClasseAdmissao("escrita", limite=1, prazo=5.0)
+        assert await classe.entrar()
+        cancelado = asyncio.ensure_future(classe.entrar())
+        seguinte = asyncio.ensure_future(classe.entrar())
+        await _esperar_fila(classe, 2)
+        # A vaga vai para `cancelado`, que é cancelado antes de voltar a executar
+        classe.sair()
+        cancelado.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelado
+        # A vaga devolvida segue para o próximo da fila
+        assert await asyncio.wait_for(seguinte, 1) is True
+        assert classe.em_execucao == 1
+        classe.sair()
+        return classe
+
+    classe = _rodar(cenario())
+    assert classe.em_execucao == 0
+    assert len(classe._fila) == 0
+
+
+def test_ordem_de_chegada():
+    async def cenario():
+        classe = ClasseAdmissao("leitura", limite=1, prazo=5.0)
+        assert await classe.entrar()
+        ordem = []
+
+        async def requisicao(nome):
+            assert await classe.entrar()
+            ordem.append(nome)
+            classe.sair()
+
+        tarefas = [asyncio.ensure_future(requisicao(nome)) for nome in ("a", "b", "c")]
+        await _esperar_fila(classe, 3)
+        classe.sair()
+        await asyncio.gather(*tarefas)
+        return classe, ordem
+
+    classe, ordem = _rodar(cenario())
+    assert ordem == ["a", "b", "c"]
+    assert classe.em_execucao == 0
+
+
+def test_classificacao_pela_primeira_regra():
+    leitura, escrita = ClasseAdmissao("leitura", 4, 1.0), ClasseAdmissao("escrita", 2, 1.0)
+    controle = ControleAdmissao(
+        [leitura, escrita],
+        [("/historico", ("POST",), "escrita"), ("/historico", None, "leitura"), ("/ranking", None, "leitura")],
+    )
+    assert controle.classificar("POST", "/historico/diario/salvar") is escrita
+    assert controle.classificar("GET", "/historico/diario/1") is leitura
+    assert controle.classificar("GET", "/dicas") is None
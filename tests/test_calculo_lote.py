@@ -0,0 +1,68 @@
+"""Motor de cálculo: o lote (NumPy) devolve exatamente o mesmo que o cálculo escalar."""
+import random
+
+import pytest
+
+from util.calculos_util import (
+    CATEGORIAS, calcular_categorias_dia, calcular_categorias_lote, calcular_pegada_completa, calcular_pegada_lote,
+)
+from util.fatores_util import CAMPOS_ENTRADA, obter_tabela_fatores
+
+
+def _entradas(quantidade, semente=7):
+    """Entradas variadas: completas (como o PegadaRequest), parciais, com inteiros e combustíveis."""
+    aleatorio = random.Random(semente)
+    tabela = obter_tabela_fatores()
+    entradas = []
+    for i in range(quantidade):
+        if i % 3 == 0:
+            dados = {campo: padrao for campo, padrao in CAMPOS_ENTRADA}
+        else:
+            dados = {}
+        for campo, padrao in CAMPOS_ENTRADA:
+            if aleatorio.random() < 0.6:
+                valor = aleatorio.uniform(0, 300)
+                dados[campo] = int(valor) if isinstance(padrao, int) else valor
+        if aleatorio.random() < 0.5:
+            dados["usa_carro_moto_combustivel"] = True
+            dados["tipo_combustivel"] = aleatorio.choice(list(tabela.combustivel) + ["desconhecido"])
+            dados["distancia_carro_moto_combustivel"] = aleatorio.uniform(0, 500)
+        if aleatorio.random() < 0.5:
+            dados["usa_veiculo_eletrico"] = True
+            dados["tipo_veiculo_eletrico"] = aleatorio.choice(list(tabela.eletrico))
+            dados["distancia_veiculo_eletrico"] = aleatorio.uniform(0, 500)
+        entradas.append(dados)
+    return entradas
+
+
+def test_lote_igual_ao_escalar_bit_a_bit():
+    entradas = _entradas(300)
+    lote = calcular_pegada_lote(entradas)
+    assert len(lote) == len(entradas)
+    for dados, resultado in zip(entradas, lote):
+        # Igualdade exata, não aproximada: o recálculo depende disso para não regravar dias
+        assert resultado == calcular_pegada_completa(dados)
+
+
+def test_lote_vazio_e_entrada_vazia():
+    assert calcular_pegada_lote([]) == []
+    assert calcular_pegada_lote([{}]) == [calcular_pegada_completa({})]
+
+
+def test_tabela_explicita():
+    tabela = obter_tabela_fatores()
+    entradas = _entradas(20, semente=11)
+    assert calcular_pegada_lote(entradas, tabela) == [calcular_pegada_completa(d, tabela) for d in entradas]
+
+
+def test_categorias_em_lote_isolam_dias_invalidos():
+    entradas = _entradas(5, semente=3) + [None, {"consumo_energia_kwh": "muito"}]
+    categorias = calcular_categorias_lote(entradas)
+    assert categorias[:5] == [calcular_pegada_completa(d)["pegadas_por_categoria"] for d in entradas[:5]]
+    assert categorias[5] == categorias[6] == dict.fromkeys(CATEGORIAS, 0.0)
+    assert calcular_categorias_dia(entradas[6]) == dict.fromkeys(CATEGORIAS, 0.0)
+
+
+def test_valor_nao_numerico_no_lote_e_erro():
+    with pytest.raises((TypeError, ValueError)):
+        calcular_pegada_lote([{"consumo_energia_kwh": "muito"}])
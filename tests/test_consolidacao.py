@@ -0,0 +1,116 @@
+"""Consolidação mensal: totais e somas por categoria mantidos a cada salvamento (MemoriaService)."""
+import pytest
+
+from services import db_service
+from services.memoria_service import MemoriaService
+from util.calculos_util import CATEGORIAS, calcular_creditos_sustentaveis, calcular_pegada_completa
+from util.consolidacao_util import acumular_deltas_mensais
+from util.fatores_util import obter_tabela_fatores
+
+DIAS = {
+    "2025-03-01": {"consumo_energia_kwh": 120.0, "km_onibus": 30.0, "kg_carne_bovina": 1.5},
+    "2025-03-02": {"num_botijoes_gas_13kg": 1.0, "num_arvores_plantadas_mensal": 2.0},
+    "2025-03-03": {"horas_streaming_dia": 3.0, "kg_creditos_carbono": 10.0, "num_sacos_lixo_100l": 4.0},
+}
+
+
+def _salvar(repositorio, user_id, date, input_data):
+    """Como a API: a pegada é calculada no servidor e a versão da tabela fica registrada."""
+    tabela = obter_tabela_fatores()
+    total = calcular_pegada_completa(input_data, tabela)["pegada_total"]
+    repositorio.save_user_daily_data(user_id, date, total, input_data, tabela.versao)
+    return total
+
+
+@pytest.fixture(params=["MEMORIA", "SQLITE"])
+def repositorio(request, tmp_path, monkeypatch):
+    if request.param == "SQLITE":
+        monkeypatch.setattr(db_service, "DB_NAME", str(tmp_path / "users.db"))
+        db_service.init_db()
+        repositorio = db_service.RepositorioSQLite()
+        request.addfinalizer(db_service.fechar_conexoes)
+    else:
+        repositorio = MemoriaService()
+    assert repositorio.register_user_api("ana", "senha-123")[0]
+    return repositorio
+
+
+def test_total_do_mes_e_soma_das_categorias_mais_creditos(repositorio):
+    totais = [_salvar(repositorio, 1, date, dados) for date, dados in DIAS.items()]
+    mes = repositorio.load_user_monthly_rollup(1, "2025-03")
+    creditos = sum(
+        calcular_creditos_sustentaveis(d.get("num_arvores_plantadas_mensal", 0.0), d.get("kg_creditos_carbono", 0.0))
+        for d in DIAS.values()
+    )
+    assert mes["dias_registrados"] == 3
+    assert mes["pegada_total"] == pytest.approx(sum(totais))
+    assert mes["pegada_total"] == pytest.approx(sum(mes["pegadas_por_categoria"].values()) + creditos)
+
+
+def test_categorias_do_mes_somam_as_dos_dias(repositorio):
+    for date, dados in DIAS.items():
+        _salvar(repositorio, 1, date, dados)
+    mes = repositorio.load_user_monthly_rollup(1, "2025-03")
+    for categoria in CATEGORIAS:
+        esperado = sum(calcular_pegada_completa(d)["pegadas_por_categoria"][categoria] for d in DIAS.values())
+        assert mes["pegadas_por_categoria"][categoria] == pytest.approx(esperado)
+
+
+def test_pegada_do_cliente_diverge_das_categorias(repositorio):
+    """Documentado: com a pegada enviada pelo cliente, as categorias continuam vindo de input_data."""
+    dados = DIAS["2025-03-01"]
+    repositorio.save_user_daily_data(1, "2025-03-01", 999.0, dados)
+    mes = repositorio.load_user_monthly_rollup(1, "2025-03")
+    assert mes["pegada_total"] == 999.0
+    assert mes["pegadas_por_categoria"] == pytest.approx(calcular_pegada_completa(dados)["pegadas_por_categoria"])
+    assert repositorio.count_daily_data_by_factor_version() == {None: 1}
+
+
+def _esperado(dias):
+    """Consolidação de um mês recalculada do zero a partir dos dias finais."""
+    categorias = [calcular_pegada_completa(d)["pegadas_por_categoria"] for d in dias.values()]
+    return (
+        sum(calcular_pegada_completa(d)["pegada_total"] for d in dias.values()),
+        {c: sum(cat[c] for cat in categorias) for c in CATEGORIAS},
+    )
+
+
+def test_dia_regravado_aplica_so_a_diferenca(repositorio):
+    for date, dados in DIAS.items():
+        _salvar(repositorio, 1, date, dados)
+    # Regrava um dia com outro conteúdo e outro dia com o mesmo conteúdo
+    novo = {"consumo_energia_kwh": 40.0, "kg_frango": 2.0}
+    _salvar(repositorio, 1, "2025-03-01", novo)
+    _salvar(repositorio, 1, "2025-03-02", DIAS["2025-03-02"])
+    finais = {**DIAS, "2025-03-01": novo}
+    total, categorias = _esperado(finais)
+    mes = repositorio.load_user_monthly_rollup(1, "2025-03")
+    assert mes["dias_registrados"] == 3
+    assert mes["pegada_total"] == pytest.approx(total)
+    assert mes["pegadas_por_categoria"] == pytest.approx(categorias)
+
+
+def test_dia_repetido_no_lote_conta_uma_vez(repositorio):
+    tabela = obter_tabela_fatores()
+    sequencia = [("2025-03-01", DIAS["2025-03-01"]), ("2025-03-01", DIAS["2025-03-03"]), ("2025-04-01", DIAS["2025-03-02"])]
+    repositorio.save_user_daily_data_many([
+        (1, date, calcular_pegada_completa(dados, tabela)["pegada_total"], dados, tabela.versao) for date, dados in sequencia
+    ])
+    marco = repositorio.load_user_monthly_rollup(1, "2025-03")
+    total, categorias = _esperado({"2025-03-01": DIAS["2025-03-03"]})
+    assert marco["dias_registrados"] == 1
+    assert marco["pegada_total"] == pytest.approx(total)
+    assert marco["pegadas_por_categoria"] == pytest.approx(categorias)
+    assert repositorio.load_user_monthly_rollup(1, "2025-04")["dias_registrados"] == 1
+
+
+def test_deltas_de_dia_regravado():
+    antes, depois = DIAS["2025-03-01"], DIAS["2025-03-03"]
+    total_antes, total_depois = (calcular_pegada_completa(d)["pegada_total"] for d in (antes, depois))
+    variacoes = acumular_deltas_mensais([(1, "2025-03-01", total_depois, depois)], {(1, "2025-03-01"): (total_antes, antes)})
+    total, dias, *categorias = variacoes[(1, "2025-03")]
+    assert dias == 0  # o dia já existia
+    assert total == pytest.approx(total_depois - total_antes)
+    categorias_antes = calcular_pegada_completa(antes)["pegadas_por_categoria"]
+    categorias_depois = calcular_pegada_completa(depois)["pegadas_por_categoria"]
+    assert categorias == pytest.approx([categorias_depois[c] - categorias_antes[c] for c in CATEGORIAS])
@@ -0,0 +1,161 @@
+"""GravadorEmGrupo: lotes, regravação item a item quando o lote falha e durabilidade no SQLite."""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from services import db_service
+from util.escrita_util import GravadorEmGrupo
+
+
+class Destino:
+    """Gravação tudo ou nada; o primeiro lote fica retido até `liberar` para a fila acumular."""
+
+    def __init__(self):
+        self.gravados = []
+        self.lotes = []
+        self.liberar = threading.Event()
+        self.primeiro = threading.Event()
+
+    def gravar_lote(self, itens):
+        if not self.primeiro.is_set():
+            self.primeiro.set()
+            assert self.liberar.wait(5)
+        self.lotes.append(list(itens))
+        if "ruim" in itens:
+            raise ValueError("item inválido")
+        self.gravados.extend(itens)
+
+
+def _enviar_em_threads(gravador, itens):
+    """Envia cada item em uma thread; devolve as threads e {posição: exceção}."""
+    erros = {}
+
+    def enviar(i):
+        try:
+            gravador.enviar(itens[i], timeout=5)
+        except Exception as e:
+            erros[i] = e
+
+    threads = [threading.Thread(target=enviar, args=(i,)) for i in range(len(itens))]
+    for t in threads:
+        t.start()
+    return threads, erros
+
+
+def _esperar_pendentes(gravador, quantidade):
+    limite = time.monotonic() + 5
+    while gravador.estatisticas()["pendentes"] < quantidade:
+        assert time.monotonic() < limite, "itens não chegaram à fila"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def destino():
+    return Destino()
+
+
+@pytest.fixture
+def gravador(destino):
+    gravador = GravadorEmGrupo(destino.gravar_lote, max_itens=16, intervalo=0.05, nome="teste")
+    yield gravador
+    destino.liberar.set()
+    gravador.parar()
+
+
+def test_enviar_retorna_depois_da_gravacao(gravador, destino):
+    destino.liberar.set()
+    gravador.enviar("a", timeout=5)
+    assert destino.gravados == ["a"]
+    assert gravador.estatisticas()["itens"] == 1
+
+
+def test_itens_concorrentes_saem_em_um_lote(gravador, destino):
+    retido, _ = _enviar_em_threads(gravador, ["a"])
+    assert destino.primeiro.wait(5)
+    threads, erros = _enviar_em_threads(gravador, ["b", "c", "d"])
+    _esperar_pendentes(gravador, 3)
+    destino.liberar.set()
+    for t in retido + threads:
+        t.join(5)
+    assert not erros
+    assert sorted(destino.lotes[1]) == ["b", "c", "d"]
+    assert gravador.estatisticas()["maior_lote"] == 3
+
+
+def test_lote_com_falha_regrava_item_a_item(gravador, destino):
+    retido, _ = _enviar_em_threads(gravador, ["a"])
+    assert destino.primeiro.wait(5)
+    threads, erros = _enviar_em_threads(gravador, ["b", "ruim", "c"])
+    _esperar_pendentes(gravador, 3)
+    destino.liberar.set()
+    for t in retido + threads:
+        t.join(5)
+    # O lote [b, ruim, c] falhou inteiro; cada item foi regravado sozinho
+    assert sorted(destino.lotes[1]) == ["b", "c", "ruim"]
+    assert sorted(map(tuple, destino.lotes[2:])) == [("b",), ("c",), ("ruim",)]
+    assert sorted(destino.gravados) == ["a", "b", "c"]
+    assert list(erros) == [1] and isinstance(erros[1], ValueError)
+
+
+def test_item_sozinho_com_falha_recebe_a_excecao(gravador, destino):
+    destino.liberar.set()
+    with pytest.raises(ValueError):
+        gravador.enviar("ruim", timeout=5)
+    assert destino.lotes == [["ruim"]]
+
+
+def test_prazo_sem_confirmacao(gravador, destino):
+    with pytest.raises(TimeoutError):
+        gravador.enviar("a", timeout=0.05)
+    destino.liberar.set()
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "users.db")
+    monkeypatch.setattr(db_service, "DB_NAME", caminho)
+    db_service.init_db()
+    assert db_service.register_user_api("ana", "senha-123")[0]
+    yield caminho
+    db_service.fechar_conexoes()
+
+
+def test_sqlite_grava_os_validos_quando_o_lote_falha(banco):
+    retido = threading.Event()
+    liberar = threading.Event()
+
+    def gravar_lote(registros):
+        if not retido.is_set():
+            retido.set()
+            assert liberar.wait(5)
+        db_service.save_user_daily_data_many(registros)
+
+    gravador = GravadorEmGrupo(gravar_lote, nome="sqlite")
+    registros = [
+        (1, "2025-03-02", 2.0, {}, "v1"),
+        (1, "2025-03-03", 3.0, {"valor": object()}, "v1"),  # input_data não serializável: falha
+        (1, "2025-03-04", 4.0, {}, "v1"),
+    ]
+    try:
+        primeiro, _ = _enviar_em_threads(gravador, [(1, "2025-03-01", 1.0, {}, "v1")])
+        assert retido.wait(5)
+        threads, erros = _enviar_em_threads(gravador, registros)
+        _esperar_pendentes(gravador, 3)
+        liberar.set()
+        for t in primeiro + threads:
+            t.join(5)
+    finally:
+        liberar.set()
+        gravador.parar()
+    assert list(erros) == [1] and isinstance(erros[1], TypeError)
+    # Lido por outra conexão: o que foi confirmado está no arquivo
+    conn = sqlite3.connect(banco)
+    try:
+        dias = conn.execute("SELECT date, pegada_total FROM daily_data ORDER BY date").fetchall()
+        mes = conn.execute("SELECT pegada_total, dias_registrados FROM monthly_data WHERE month_year = '2025-03'").fetchone()
+    finally:
+        conn.close()
+    assert dias == [("2025-03-01", 1.0), ("2025-03-02", 2.0), ("2025-03-04", 4.0)]
+    assert mes == (7.0, 3)
@@ -0,0 +1,34 @@
+"""Planos (EXPLAIN QUERY PLAN) das consultas por mês/usuário do SQLite: índices, sem varredura nem ordenação temporária."""
+import pytest
+
+from scripts.verificar_planos import problemas_do_plano
+from services import db_service
+
+
+@pytest.fixture(scope="module")
+def planos(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp("planos") / "users.db")
+    anterior, db_service.DB_NAME = db_service.DB_NAME, caminho
+    try:
+        db_service.init_db()
+        yield db_service.explain_query_plans()
+    finally:
+        db_service.fechar_conexoes()
+        db_service.DB_NAME = anterior
+
+
+def test_historico_usa_indice_usuario_dia(planos):
+    assert any("idx_daily_data_user_day" in passo for passo in planos["historico_intervalo"])
+
+
+def test_dias_do_intervalo_usam_indice_dia_usuario_pegada(planos):
+    assert any("COVERING INDEX idx_daily_data_day_user" in passo for passo in planos["dias_intervalo"])
+
+
+def test_ranking_mes_percorre_indice_mes_pegada(planos):
+    assert any("idx_monthly_data_mes_pegada" in passo for passo in planos["ranking_mes"])
+
+
+@pytest.mark.parametrize("consulta", ["conquistas_estado", "ranking_mes", "total_mes", "historico_intervalo", "dias_intervalo"])
+def test_sem_varredura_nem_ordenacao_temporaria(planos, consulta):
+    assert planos[consulta] and problemas_do_plano(planos[consulta]) == []
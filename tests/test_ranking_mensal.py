@@ -0,0 +1,37 @@
+"""Ranking mensal do SQLite (get_monthly_ranking e load_monthly_totals) com usuários sem registro no mês."""
+import pytest
+
+from services import db_service
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "DB_NAME", str(tmp_path / "users.db"))
+    db_service.init_db()
+    for nome in ("positivo", "negativo", "sem_registro", "zerado"):
+        assert db_service.register_user_api(nome, "senha-123")[0]
+    db_service.save_user_daily_data(1, "2025-01-10", 12.0, {})
+    db_service.save_user_daily_data(2, "2025-01-10", -5.0, {})
+    db_service.save_user_daily_data(4, "2025-01-10", 0.0, {})
+    yield
+    db_service.fechar_conexoes()
+
+
+def _nomes(ranking):
+    return [linha["username"] for linha in ranking]
+
+
+def test_usuario_sem_registro_fica_entre_positivos_e_negativos(banco):
+    assert _nomes(db_service.get_monthly_ranking("2025-01", 10)) == ["positivo", "zerado", "sem_registro", "negativo"]
+
+
+def test_limite_corta_pelo_valor(banco):
+    assert _nomes(db_service.get_monthly_ranking("2025-01", 3)) == ["positivo", "zerado", "sem_registro"]
+    # Mês sem nenhum registro: todos com 0, em ordem de id
+    assert _nomes(db_service.get_monthly_ranking("2025-02", 2)) == ["positivo", "negativo"]
+
+
+def test_totais_do_mes_listam_todos_pelo_valor(banco):
+    totais = db_service.load_monthly_totals("2025-01")
+    assert [linha[2] for linha in totais] == [12.0, 0.0, 0.0, -5.0]
+    assert [linha[2] for linha in totais] == [linha["total_pegada"] for linha in db_service.get_monthly_ranking("2025-01", 10)]
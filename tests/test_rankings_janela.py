@@ -0,0 +1,73 @@
+"""RankingsPorJanela: usuários sem dias na janela com 0 e limite de meses em memória."""
+from datetime import date as Data
+
+import pytest
+
+from util.ranking_util import RankingsPorJanela
+
+USUARIOS = [(1, "ana"), (2, "bia"), (3, "caio")]
+DIAS = [
+    (1, "ana", "2025-01-05", 3.0), (1, "ana", "2025-02-05", 4.0), (1, "ana", "2025-03-05", 5.0),
+    (2, "bia", "2025-01-20", 10.0), (2, "bia", "2025-03-01", -1.0),
+]
+
+
+class Banco:
+    def __init__(self):
+        self.dias = list(DIAS)
+        self.leituras = []
+
+    def carregar(self, inicio, fim):
+        self.leituras.append((inicio, fim))
+        return sorted((d for d in self.dias if inicio <= d[2] <= fim), key=lambda d: (d[0], d[2]))
+
+
+@pytest.fixture
+def banco():
+    return Banco()
+
+
+def _totais(rankings, inicio, fim):
+    return {linha["username"]: linha["total_pegada"] for linha in rankings.obter(inicio, fim).pagina(10)}
+
+
+def test_usuarios_sem_dias_na_janela_entram_com_zero(banco):
+    rankings = RankingsPorJanela(banco.carregar, recarga=None, carregar_usuarios=lambda: USUARIOS)
+    assert _totais(rankings, Data(2025, 2, 1), Data(2025, 2, 28)) == {"ana": 4.0, "bia": 0.0, "caio": 0.0}
+    posicoes = [linha["username"] for linha in rankings.obter(Data(2025, 3, 1), Data(2025, 3, 31)).pagina(10)]
+    assert posicoes == ["ana", "caio", "bia"]  # 0 fica entre os positivos e os negativos
+
+
+def test_sem_carregar_usuarios_lista_so_quem_tem_dias(banco):
+    rankings = RankingsPorJanela(banco.carregar, recarga=None)
+    assert _totais(rankings, Data(2025, 2, 1), Data(2025, 2, 28)) == {"ana": 4.0}
+
+
+def test_cadastro_entra_nas_janelas_em_memoria(banco):
+    rankings = RankingsPorJanela(banco.carregar, recarga=None, carregar_usuarios=lambda: USUARIOS)
+    rankings.obter(Data(2025, 1, 1), Data(2025, 1, 31))
+    rankings.registrar_cadastro(4, "duda")
+    assert _totais(rankings, Data(2025, 1, 1), Data(2025, 1, 31))["duda"] == 0.0
+
+
+def test_meses_alem_do_limite_saem_da_memoria(banco):
+    rankings = RankingsPorJanela(banco.carregar, recarga=None, meses_maximo=2, carregar_usuarios=lambda: USUARIOS)
+    for mes in (1, 2, 3):
+        rankings.obter(Data(2025, mes, 1), Data(2025, mes, 28))
+    estatisticas = rankings.estatisticas()
+    assert estatisticas["meses_carregados"] == 2 and estatisticas["meses_descartados"] == 1
+    # Os dias de janeiro saíram das somas; a próxima consulta relê o mês e acerta os totais
+    leituras = len(banco.leituras)
+    assert _totais(rankings, Data(2025, 1, 1), Data(2025, 3, 31)) == {"ana": 12.0, "bia": 9.0, "caio": 0.0}
+    assert len(banco.leituras) == leituras + 1
+
+
+def test_janela_maior_que_o_limite_mantem_os_proprios_meses(banco):
+    rankings = RankingsPorJanela(banco.carregar, recarga=None, meses_maximo=1)
+    assert _totais(rankings, Data(2025, 1, 1), Data(2025, 3, 31)) == {"ana": 12.0, "bia": 9.0}
+    assert rankings.estatisticas()["meses_carregados"] == 3
+    # Um dia salvo em um mês descartado não é aplicado; a consulta seguinte relê o mês
+    rankings.obter(Data(2025, 2, 1), Data(2025, 2, 28))
+    banco.dias.append((2, "bia", "2025-01-21", 1.0))
+    rankings.registrar_dia(2, "2025-01-21", 1.0)
+    assert _totais(rankings, Data(2025, 1, 1), Data(2025, 1, 31)) == {"ana": 3.0, "bia": 11.0}
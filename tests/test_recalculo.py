@@ -0,0 +1,67 @@
+"""scripts.recalcular_pegadas: dias calculados no servidor conferem bit a bit e não são regravados."""
+import json
+import sqlite3
+
+import pytest
+
+from scripts import recalcular_pegadas
+from services import db_service
+from util.calculos_util import calcular_pegada_completa
+from util.fatores_util import obter_tabela_fatores
+
+DIAS = {
+    "2025-03-01": {"consumo_energia_kwh": 120.0, "km_onibus": 30.0, "kg_carne_bovina": 1.5},
+    "2025-03-02": {"usa_carro_moto_combustivel": True, "tipo_combustivel": "diesel", "distancia_carro_moto_combustivel": 42.5},
+    "2025-03-03": {"horas_streaming_dia": 3.0, "kg_creditos_carbono": 10.0, "duzias_ovo": 2},
+}
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "users.db")
+    monkeypatch.setattr(db_service, "DB_NAME", caminho)
+    monkeypatch.delenv("FATORES_ARQUIVO", raising=False)
+    db_service.init_db()
+    assert db_service.register_user_api("ana", "senha-123")[0]
+    tabela = obter_tabela_fatores()
+    for date, dados in DIAS.items():
+        db_service.save_user_daily_data(1, date, calcular_pegada_completa(dados, tabela)["pegada_total"], dados, tabela.versao)
+    yield caminho
+    db_service.fechar_conexoes()
+
+
+def _recalcular(caminho, tmp_path, *extras):
+    argv = ["--backend", "SQLITE", "--db", caminho, "--processos", "1", "--fatores-fonte", "",
+            "--checkpoint", str(tmp_path / "recalculo.json"), "--reiniciar", *extras]
+    recalcular_pegadas.main(argv)
+    with open(tmp_path / "recalculo.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_dias_do_servidor_conferem(banco, tmp_path):
+    estado = _recalcular(banco, tmp_path)
+    assert (estado["lidas"], estado["divergentes"], estado["gravadas"], estado["erros"]) == (3, 0, 0, 0)
+
+
+def test_regrava_divergentes_e_versao_antiga(banco, tmp_path):
+    conn = sqlite3.connect(banco)
+    with conn:
+        conn.execute("UPDATE daily_data SET pegada_total = 999 WHERE date = '2025-03-01'")
+        conn.execute("UPDATE daily_data SET fatores_versao = NULL WHERE date = '2025-03-02'")
+    conn.close()
+
+    assert _recalcular(banco, tmp_path, "--dry-run")["gravadas"] == 0
+    estado = _recalcular(banco, tmp_path)
+    assert (estado["divergentes"], estado["gravadas"]) == (1, 2)
+
+    conn = sqlite3.connect(banco)
+    try:
+        linhas = conn.execute("SELECT date, pegada_total, fatores_versao FROM daily_data ORDER BY date").fetchall()
+        total_mes = conn.execute("SELECT pegada_total FROM monthly_data WHERE month_year = '2025-03'").fetchone()[0]
+    finally:
+        conn.close()
+    tabela = obter_tabela_fatores()
+    assert linhas == [(date, calcular_pegada_completa(dados, tabela)["pegada_total"], tabela.versao) for date, dados in DIAS.items()]
+    assert total_mes == pytest.approx(sum(total for _, total, _ in linhas))
+    # Depois do recálculo, uma nova execução não encontra mais nada
+    assert _recalcular(banco, tmp_path)["gravadas"] == 0
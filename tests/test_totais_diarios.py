@@ -0,0 +1,35 @@
+"""load_daily_totals do SQLite: intervalo só com os limites informados e datas validadas."""
+import pytest
+
+from services import db_service
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_service, "DB_NAME", str(tmp_path / "users.db"))
+    db_service.init_db()
+    assert db_service.register_user_api("ana", "senha-123")[0]
+    for date, total in (("2024-12-31", 1.0), ("2025-01-01", 2.0), ("2025-01-15", 3.0), ("2025-02-01", 4.0)):
+        db_service.save_user_daily_data(1, date, total, {})
+    yield
+    db_service.fechar_conexoes()
+
+
+def _datas(linhas):
+    return [linha[2] for linha in linhas]
+
+
+def test_intervalo_inclusivo(banco):
+    assert _datas(db_service.load_daily_totals("2025-01-01", "2025-01-31")) == ["2025-01-01", "2025-01-15"]
+
+
+def test_limites_opcionais(banco):
+    assert _datas(db_service.load_daily_totals()) == ["2024-12-31", "2025-01-01", "2025-01-15", "2025-02-01"]
+    assert _datas(db_service.load_daily_totals(inicio="2025-01-15")) == ["2025-01-15", "2025-02-01"]
+    assert _datas(db_service.load_daily_totals(fim="2025-01-01")) == ["2024-12-31", "2025-01-01"]
+
+
+@pytest.mark.parametrize("inicio, fim", [("2025-01-01", "2025-13-01"), ("2025-1-1", None), (None, "amanhã"), ("", None)])
+def test_data_invalida_e_erro(banco, inicio, fim):
+    with pytest.raises(ValueError):
+        db_service.load_daily_totals(inicio, fim)
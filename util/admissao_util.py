@@ -0,0 +1,106 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class ClasseAdmissao:
+    """
+    Limite de requisições simultâneas de uma classe de rotas (por worker, no event loop).
+    Acima de `limite`, a requisição espera na fila (ordem de chegada) por no máximo `prazo`
+    segundos; com `fila_max` requisições já esperando, ou passado o prazo, é rejeitada.
+    """
+
+    def __init__(self, nome: str, limite: int, prazo: float, fila_max: Optional[int] = None):
+        self.nome = nome
+        self.limite = max(1, int(limite))
+        self.prazo = max(0.0, float(prazo))
+        self.fila_max = max(0, int(fila_max if fila_max is not None else 4 * self.limite))
+        self._fila: "deque[asyncio.Future]" = deque()
+        self._esperas: "deque[float]" = deque(maxlen=1000)
+        self.em_execucao = 0
+        self.admitidas = 0
+        self.rejeitadas_fila = 0
+        self.rejeitadas_prazo = 0
+
+    async def entrar(self) -> bool:
+        """True se a requisição pode executar (chame `sair` ao terminar); False se foi rejeitada."""
+        if self.em_execucao < self.limite and not self._fila:
+            self.em_execucao += 1
+            self.admitidas += 1
+            self._esperas.append(0.0)
+            return True
+        if len(self._fila) >= self.fila_max:
+            self.rejeitadas_fila += 1
+            return False
+        vaga = asyncio.get_running_loop().create_future()
+        self._fila.append(vaga)
+        inicio = time.monotonic()
+        try:
+            # asyncio.wait não cancela `vaga` no timeout: dá para saber se a vaga chegou junto com o prazo
+            await asyncio.wait((vaga,), timeout=self.prazo)
+        except BaseException:
+            # Requisição cancelada (cliente desconectou) enquanto esperava
+            if not vaga.cancel():
+                self.sair()  # a vaga já tinha sido passada para ela
+            else:
+                self._fila.remove(vaga)
+            raise
+        if not vaga.done():
+            vaga.cancel()
+            self._fila.remove(vaga)
+            self.rejeitadas_prazo += 1
+            return False
+        self.admitidas += 1
+        self._esperas.append(time.monotonic() - inicio)
+        return True
+
+    def sair(self) -> None:
+        # Passa a vaga direto para o primeiro da fila (em_execucao não muda)
+        while self._fila:
+            vaga = self._fila.popleft()
+            if not vaga.done():
+                vaga.set_result(None)
+                return
+        self.em_execucao -= 1
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.prazo))
+
+    def estatisticas(self) -> Dict[str, Any]:
+        esperas = sorted(self._esperas)
+        return {
+            "classe": self.nome,
+            "limite": self.limite,
+            "prazo_ms": round(1000 * self.prazo),
+            "fila_max": self.fila_max,
+            "em_execucao": self.em_execucao,
+            "na_fila": len(self._fila),
+            "admitidas": self.admitidas,
+            "rejeitadas_fila": self.rejeitadas_fila,
+            "rejeitadas_prazo": self.rejeitadas_prazo,
+            "espera_p95_ms": round(1000 * esperas[int(0.95 * (len(esperas) - 1))], 2) if esperas else 0.0,
+            "espera_max_ms": round(1000 * esperas[-1], 2) if esperas else 0.0,
+        }
+
+
+class ControleAdmissao:
+    """
+    Classifica cada requisição (método, caminho) pela primeira regra que casar e aplica o
+    limite da classe. Regras: (prefixo do caminho, métodos ou None para todos, nome da classe).
+    Rotas sem regra (ex.: /dicas, /health) não passam pelo controle.
+    """
+
+    def __init__(self, classes: Iterable[ClasseAdmissao], regras: List[Tuple[str, Optional[Iterable[str]], str]]):
+        self.classes = {c.nome: c for c in classes}
+        self.regras = [(prefixo, frozenset(metodos) if metodos else None, self.classes[nome]) for prefixo, metodos, nome in regras]
+
+    def classificar(self, metodo: str, caminho: str) -> Optional[ClasseAdmissao]:
+        for prefixo, metodos, classe in self.regras:
+            if caminho.startswith(prefixo) and (metodos is None or metodo in metodos):
+                return classe
+        return None
+
+    def estatisticas(self) -> List[Dict[str, Any]]:
+        return [c.estatisticas() for c in self.classes.values()]
@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+
+class ExecutorBanco:
+    """
+    Executor dedicado às chamadas bloqueantes de banco feitas pelas rotas async (mesma ideia
+    do aiosqlite: a chamada roda em uma thread própria e a rota só espera o resultado, sem
+    ocupar o threadpool do FastAPI). Cada thread reaproveita sua conexão SQLite do pool de
+    db_service. O tamanho é independente do threadpool das rotas síncronas.
+    """
+
+    def __init__(self, threads: int = 32, nome: str = "banco"):
+        self.threads = max(1, int(threads))
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self.em_voo = 0
+        self.maior_em_voo = 0
+        self.concluidas = 0
+
+    def _obter_pool(self) -> ThreadPoolExecutor:
+        # Um pool por processo (criado após o fork dos workers do gunicorn)
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix=self.nome)
+                    self._pid = os.getpid()
+        return self._pool
+
+    async def executar(self, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.em_voo += 1
+            self.maior_em_voo = max(self.maior_em_voo, self.em_voo)
+        try:
+            loop = asyncio.get_running_loop()
+            # Como asyncio.to_thread: a chamada enxerga o contexto de quem pediu (ex.: rastreio da requisição)
+            contexto = contextvars.copy_context()
+            return await loop.run_in_executor(self._obter_pool(), partial(contexto.run, funcao, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.em_voo -= 1
+                self.concluidas += 1
+
+    async def iterar(self, iteravel: Iterable[Any], tamanho_lote: int = 500) -> AsyncIterator[Any]:
+        """Percorre um iterador bloqueante (ex.: páginas do banco) lendo `tamanho_lote` itens por vez no executor."""
+        iterador = iter(iteravel)
+        while True:
+            lote = await self.executar(lambda: list(islice(iterador, tamanho_lote)))
+            for item in lote:
+                yield item
+            if len(lote) < tamanho_lote:
+                return
+
+    def parar(self) -> None:
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "nome": self.nome,
+                "threads": self.threads,
+                "em_voo": self.em_voo,
+                "maior_em_voo": self.maior_em_voo,
+                "concluidas": self.concluidas,
+            }
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Sentinela para distinguir "não encontrado" de um valor None guardado no cache
+AUSENTE = object()
+
+
+class CacheLRU:
+    """
+    Cache em memória com política LRU, TTL opcional e contadores de uso.
+    Seguro para uso entre threads (endpoints síncronos rodam no threadpool do FastAPI).
+    """
+
+    def __init__(self, tamanho_maximo: int = 1024, ttl: Optional[float] = None, nome: str = ""):
+        self.nome = nome
+        self.tamanho_maximo = max(1, int(tamanho_maximo))
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._dados: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0  # saídas por falta de espaço (LRU)
+        self.expiracoes = 0
+
+    def obter(self, chave: Hashable, padrao: Any = AUSENTE) -> Any:
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                self.falhas += 1
+                return padrao
+            valor, expira_em = item
+            if expira_em is not None and expira_em <= time.monotonic():
+                del self._dados[chave]
+                self.expiracoes += 1
+                self.falhas += 1
+                return padrao
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def definir(self, chave: Hashable, valor: Any) -> None:
+        expira_em = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._dados[chave] = (valor, expira_em)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_maximo:
+                self._dados.popitem(last=False)
+                self.remocoes += 1
+
+    def remover(self, chave: Hashable) -> None:
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def valores(self) -> List[Any]:
+        """Valores guardados que ainda não expiraram (sem alterar a ordem LRU nem os contadores)."""
+        agora = time.monotonic()
+        with self._lock:
+            return [valor for valor, expira_em in self._dados.values() if expira_em is None or expira_em > agora]
+
+    def itens(self) -> List[tuple]:
+        """Pares (chave, valor) que ainda não expiraram (sem alterar a ordem LRU nem os contadores)."""
+        agora = time.monotonic()
+        with self._lock:
+            return [(chave, valor) for chave, (valor, expira_em) in self._dados.items() if expira_em is None or expira_em > agora]
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._dados.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "nome": self.nome,
+                "tamanho": len(self._dados),
+                "tamanho_maximo": self.tamanho_maximo,
+                "ttl_segundos": self.ttl,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "expiracoes": self.expiracoes,
+                "taxa_acerto": (self.acertos / consultas) if consultas else 0.0,
+            }
+
+
+class _Voo:
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro: Optional[BaseException] = None
+
+
+class UnicoVoo:
+    """
+    Single-flight: chamadas simultâneas com a mesma chave compartilham uma única execução e
+    recebem o mesmo resultado (não o altere). Com `ttl` > 0, o resultado ainda é reaproveitado
+    por `ttl` segundos (micro-cache). `invalidar(grupo)` faz as chamadas seguintes do grupo
+    (ex.: um usuário que acabou de gravar) ignorarem execuções em andamento e resultados
+    guardados. `executar` serve às threads; `executar_async`, às rotas async.
+    """
+
+    def __init__(self, ttl: float = 0.0, tamanho_maximo: int = 10000, nome: str = ""):
+        self.nome = nome
+        self._cache = CacheLRU(tamanho_maximo, ttl=ttl, nome=nome) if ttl and ttl > 0 else None
+        self._lock = threading.Lock()
+        self._voos: Dict[Hashable, _Voo] = {}
+        self._voos_async: Dict[Hashable, "asyncio.Future"] = {}
+        self._geracoes: Dict[Hashable, int] = {}
+        self.chamadas = 0
+        self.executadas = 0
+        self.agrupadas = 0  # chamadas atendidas por uma execução de outra chamada
+        self.acertos_cache = 0
+
+    def _chave(self, chave: Hashable, grupo: Hashable) -> Hashable:
+        return (grupo, self._geracoes.get(grupo, 0), chave)
+
+    def invalidar(self, grupo: Hashable) -> None:
+        with self._lock:
+            self._geracoes[grupo] = self._geracoes.get(grupo, 0) + 1
+
+    def _do_cache(self, chave: Hashable) -> Any:
+        if self._cache is None:
+            return AUSENTE
+        valor = self._cache.obter(chave)
+        if valor is not AUSENTE:
+            self.acertos_cache += 1
+        return valor
+
+    def executar(self, chave: Hashable, funcao: Callable[..., Any], *args, grupo: Hashable = None) -> Any:
+        with self._lock:
+            self.chamadas += 1
+            chave = self._chave(chave, grupo)
+            valor = self._do_cache(chave)
+            if valor is not AUSENTE:
+                return valor
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+                self.executadas += 1
+            else:
+                self.agrupadas += 1
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+        try:
+            voo.resultado = funcao(*args)
+            if self._cache is not None:
+                self._cache.definir(chave, voo.resultado)
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._voos.pop(chave, None)
+            voo.evento.set()
+
+    async def executar_async(self, chave: Hashable, fabrica: Callable[[], Awaitable[Any]], grupo: Hashable = None) -> Any:
+        with self._lock:
+            self.chamadas += 1
+            chave = self._chave(chave, grupo)
+            valor = self._do_cache(chave)
+            if valor is not AUSENTE:
+                return valor
+            tarefa = self._voos_async.get(chave)
+            if tarefa is None:
+                tarefa = self._voos_async[chave] = asyncio.ensure_future(self._voar(chave, fabrica))
+                self.executadas += 1
+            else:
+                self.agrupadas += 1
+        # shield: se uma requisição for cancelada, a execução continua para as demais
+        return await asyncio.shield(tarefa)
+
+    async def _voar(self, chave: Hashable, fabrica: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            resultado = await fabrica()
+            if self._cache is not None:
+                self._cache.definir(chave, resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._voos_async.pop(chave, None)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "nome": self.nome,
+                "ttl_segundos": self._cache.ttl if self._cache is not None else 0.0,
+                "em_voo": len(self._voos) + len(self._voos_async),
+                "chamadas": self.chamadas,
+                "executadas": self.executadas,
+                "agrupadas": self.agrupadas,
+                "acertos_cache": self.acertos_cache,
+            }
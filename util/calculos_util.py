@@ -1,69 +1,64 @@
-from config.fatores_emissao import FATORES_EMISSAO # Importa os fatores
+import os
+import time
+from itertools import chain
+from typing import Dict, List
+
+import numpy as np
+
+from util.fatores_util import (
+    obter_tabela_fatores, COLUNAS, INDICE, FAIXAS, CAMPOS_ENTRADA, INDICES_ENTRADA,
+    LER_CAMPOS_ENTRADA, MULTIPLICADORES_MENSAIS, DIVISORES_MENSAIS,
+)
+from util.metricas_util import metricas
+from util.rastreio_util import rastreado
+
+# Categorias de `pegadas_por_categoria`, na ordem em que são devolvidas
+CATEGORIAS = ("energia_combustivel", "transporte", "alimentacao", "habitacao", "consumo", "residuos", "estilo_vida")
 
 # ... (Todas as suas funções de cálculo: calcular_pegada_energia, etc.) ...
+# Os fatores vêm da tabela pré-compilada (vetor plano de coeficientes), sem consultas
+# aninhadas ao dicionário FATORES_EMISSAO a cada chamada.
 def calcular_pegada_energia(consumo_kwh, num_botijoes_gas_13kg):
+    fator = obter_tabela_fatores().fator
     pegada = 0
-    pegada += consumo_kwh * FATORES_EMISSAO["energia_combustivel"]["eletricidade_kWh"]
-    pegada += num_botijoes_gas_13kg * FATORES_EMISSAO["energia_combustivel"]["gas_cozinha_13kg"]
+    pegada += consumo_kwh * fator("consumo_energia_kwh")
+    pegada += num_botijoes_gas_13kg * fator("num_botijoes_gas_13kg")
     return pegada
 
 def calcular_pegada_transporte_individual_combustivel(distancia_km, tipo_combustivel):
-    litros_consumidos = 0
-    if tipo_combustivel == "gasolina":
-        litros_consumidos = distancia_km / 10.0 # Assumindo 10 km/litro para gasolina
-        return litros_consumidos * FATORES_EMISSAO["energia_combustivel"]["gasolina_litro"]
-    elif tipo_combustivel == "etanol":
-        litros_consumidos = distancia_km / 7.0 # Assumindo 7 km/litro para etanol
-        return litros_consumidos * FATORES_EMISSAO["energia_combustivel"]["etanol_litro"]
-    elif tipo_combustivel == "diesel":
-        litros_consumidos = distancia_km / 12.0 # Assumindo 12 km/litro para diesel
-        return litros_consumidos * FATORES_EMISSAO["energia_combustivel"]["diesel_litro"]
-    else:
+    combustivel = obter_tabela_fatores().combustivel.get(tipo_combustivel)
+    if combustivel is None:
         return 0
+    _, km_por_litro, fator_litro = combustivel
+    litros_consumidos = distancia_km / km_por_litro
+    return litros_consumidos * fator_litro
 
 def calcular_pegada_transporte_eletrico(distancia_km, tipo_veiculo):
-    if tipo_veiculo == "carro_eletrico":
-        return distancia_km * FATORES_EMISSAO["transporte"]["carro_eletrico_km"]
-    elif tipo_veiculo == "moto_eletrica":
-        return distancia_km * FATORES_EMISSAO["transporte"]["moto_km"]
-    else:
+    eletrico = obter_tabela_fatores().eletrico.get(tipo_veiculo)
+    if eletrico is None:
         return 0
+    return distancia_km * eletrico[1]
 
 def calcular_pegada_transporte_coletivo(distancia_km, tipo_transporte):
-    if tipo_transporte == "onibus":
-        return distancia_km * FATORES_EMISSAO["transporte"]["onibus_km"]
-    elif tipo_transporte == "metro":
-        return distancia_km * FATORES_EMISSAO["transporte"]["metro_km"]
-    elif tipo_transporte == "aviao_domestico":
-        return distancia_km * FATORES_EMISSAO["transporte"]["aviao_domestico_km"]
-    elif tipo_transporte == "aviao_internacional":
-        return distancia_km * FATORES_EMISSAO["transporte"]["aviao_internacional_km"]
-    else:
+    fator_km = obter_tabela_fatores().coletivo.get(tipo_transporte)
+    if fator_km is None:
         return 0
+    return distancia_km * fator_km
 
 def calcular_pegada_alimentacao(
     kg_carne_bovina, kg_carne_suina, kg_frango, kg_peixe,
     litros_leite, kg_queijo, duzias_ovo, kg_arroz, kg_feijao, kg_vegetais
 ):
-    total = 0
-    total += kg_carne_bovina * FATORES_EMISSAO["alimentacao"]["carne_bovina_kg"]
-    total += kg_carne_suina * FATORES_EMISSAO["alimentacao"]["carne_suina_kg"]
-    total += kg_frango * FATORES_EMISSAO["alimentacao"]["frango_kg"]
-    total += kg_peixe * FATORES_EMISSAO["alimentacao"]["peixe_kg"]
-    total += litros_leite * FATORES_EMISSAO["alimentacao"]["leite_litro"]
-    total += kg_queijo * FATORES_EMISSAO["alimentacao"]["queijo_kg"]
-    total += duzias_ovo * FATORES_EMISSAO["alimentacao"]["ovo_duzia"]
-    total += kg_arroz * FATORES_EMISSAO["alimentacao"]["arroz_kg"]
-    total += kg_feijao * FATORES_EMISSAO["alimentacao"]["feijao_kg"]
-    total += kg_vegetais * FATORES_EMISSAO["alimentacao"]["vegetais_kg"]
-    return total
+    return _somar_parcelas(
+        (kg_carne_bovina, kg_carne_suina, kg_frango, kg_peixe, litros_leite, kg_queijo, duzias_ovo, kg_arroz, kg_feijao, kg_vegetais),
+        obter_tabela_fatores().coeficientes[FAIXAS["alimentacao"]]
+    )
 
 def calcular_pegada_habitacao(num_comodos, horas_ar_condicionado_mensal, horas_aquecedor_mensal):
-    total = 0
-    total += num_comodos * FATORES_EMISSAO["habitacao"]["residencia_comodo"]
-    total += horas_ar_condicionado_mensal * FATORES_EMISSAO["habitacao"]["ar_condicionado_hora"]
-    total += horas_aquecedor_mensal * FATORES_EMISSAO["habitacao"]["aquecedor_hora"]
-    return total
+    return _somar_parcelas(
+        (num_comodos, horas_ar_condicionado_mensal, horas_aquecedor_mensal),
+        obter_tabela_fatores().coeficientes[FAIXAS["habitacao"]]
+    )
 
 def calcular_pegada_consumo(
     num_celulares,
@@ -73,109 +68,104 @@ def calcular_pegada_consumo(
     num_veiculos_eletricos,
     num_roupas_peca
 ):
-    total = 0
-    total += num_celulares * FATORES_EMISSAO["consumo"]["celular"]
-    total += num_laptops * FATORES_EMISSAO["consumo"]["laptop"]
-    total += num_geladeiras * FATORES_EMISSAO["consumo"]["geladeira"]
-    total += num_televisoes * FATORES_EMISSAO["consumo"]["televisao"]
-    total += num_veiculos_eletricos * FATORES_EMISSAO["consumo"]["veiculo_eletrico"]
-    total += num_roupas_peca * FATORES_EMISSAO["consumo"]["roupas_peca"]
-    return total
+    return _somar_parcelas(
+        (num_celulares, num_laptops, num_geladeiras, num_televisoes, num_veiculos_eletricos, num_roupas_peca),
+        obter_tabela_fatores().coeficientes[FAIXAS["consumo"]]
+    )
 
 def calcular_pegada_residuos(num_sacos_lixo_100l, kg_lixo_reciclavel, kg_eletronico, kg_compostagem):
-    total = 0
-    total += num_sacos_lixo_100l * FATORES_EMISSAO["residuos"]["lixo_comum_saco_100l"]
-    total += kg_lixo_reciclavel * FATORES_EMISSAO["residuos"]["lixo_reciclavel_kg"]
-    total += kg_eletronico * FATORES_EMISSAO["residuos"]["eletronico_kg"]
-    total += kg_compostagem * FATORES_EMISSAO["residuos"]["compostagem_kg"]
-    return total
+    return _somar_parcelas(
+        (num_sacos_lixo_100l, kg_lixo_reciclavel, kg_eletronico, kg_compostagem),
+        obter_tabela_fatores().coeficientes[FAIXAS["residuos"]]
+    )
 
 def calcular_pegada_estilo_vida(num_voos_eventos_ano, horas_streaming_mensal, num_compras_online_mes):
-    total = 0
     # Dividindo por 12 para estimativa mensal da emissão anual de voos
-    total += (num_voos_eventos_ano / 12) * FATORES_EMISSAO["estilo_vida"]["voos_eventos_ano"]
-    total += horas_streaming_mensal * FATORES_EMISSAO["estilo_vida"]["streaming_hora"]
-    total += num_compras_online_mes * FATORES_EMISSAO["estilo_vida"]["compras_online_mes"]
-    return total
+    return _somar_parcelas(
+        (num_voos_eventos_ano / 12, horas_streaming_mensal, num_compras_online_mes),
+        obter_tabela_fatores().coeficientes[FAIXAS["estilo_vida"]]
+    )
 
 def calcular_creditos_sustentaveis(num_arvores_plantadas_mensal, kg_creditos_carbono):
+    return _somar_parcelas(
+        (num_arvores_plantadas_mensal, kg_creditos_carbono),
+        obter_tabela_fatores().coeficientes[FAIXAS["sustentavel"]]
+    )
+
+def _somar_parcelas(valores, coeficientes):
+    """Soma valor * fator na ordem dada, partindo de 0 (mesma ordem de arredondamento de sempre)."""
     total = 0
-    total += num_arvores_plantadas_mensal * FATORES_EMISSAO["sustentavel"]["arvores_plantadas"]
-    total += kg_creditos_carbono * FATORES_EMISSAO["sustentavel"]["creditos_carbono_kg"]
+    for valor, fator in zip(valores, coeficientes):
+        total += valor * fator
     return total
 
+def _ler_registro(inputs):
+    """Registro compacto: tupla com os campos de entrada na ordem de CAMPOS_ENTRADA."""
+    try:
+        # Caminho rápido: entradas vindas do PegadaRequest têm todos os campos
+        return LER_CAMPOS_ENTRADA(inputs)
+    except KeyError:
+        return tuple(inputs.get(campo, padrao) for campo, padrao in CAMPOS_ENTRADA)
+
 # Função agregadora: calcula a pegada total
-def calcular_pegada_completa(inputs):
+def calcular_pegada_completa(inputs, tabela=None):
     """
     Recebe um dicionário de dados e retorna a pegada total e por categoria.
+    Faz uma única passada sobre o registro compacto, com os coeficientes da tabela de fatores
+    (por padrão, a tabela ativa).
     """
-    # Energia
-    pegada_energia = calcular_pegada_energia(
-        inputs.get("consumo_energia_kwh", 0.0),
-        inputs.get("num_botijoes_gas_13kg", 0.0)
-    )
+    tabela = tabela or obter_tabela_fatores()
+    (
+        consumo_kwh, botijoes, km_onibus, km_metro, km_aviao_domestico, km_aviao_internacional,
+        carne_bovina, carne_suina, frango, peixe, leite, queijo, ovo, arroz, feijao, vegetais,
+        comodos, horas_ar_dia, horas_aquecedor_dia,
+        celulares, laptops, geladeiras, televisoes, veiculos_eletricos, roupas,
+        sacos_lixo, reciclavel, eletronico, compostagem,
+        voos_ano, horas_streaming_dia, compras_online,
+        arvores, creditos_carbono,
+    ) = _ler_registro(inputs)
+    (
+        f_kwh, f_botijao, _, _, _, _, _, f_onibus, f_metro, f_aviao_domestico, f_aviao_internacional,
+        f_carne_bovina, f_carne_suina, f_frango, f_peixe, f_leite, f_queijo, f_ovo, f_arroz, f_feijao, f_vegetais,
+        f_comodo, f_ar, f_aquecedor,
+        f_celular, f_laptop, f_geladeira, f_televisao, f_veiculo_eletrico, f_roupa,
+        f_saco_lixo, f_reciclavel, f_eletronico, f_compostagem,
+        f_voos, f_streaming, f_compras,
+        f_arvores, f_creditos,
+    ) = tabela.coeficientes
+
+    pegada_energia = 0 + consumo_kwh * f_kwh + botijoes * f_botijao
 
-    # Transporte individual combustivel
+    # Transporte individual: consulta por tipo em vez de cadeias if/elif
     total_transporte_combustivel = 0
     if inputs.get("usa_carro_moto_combustivel", False):
-        total_transporte_combustivel = calcular_pegada_transporte_individual_combustivel(
-            inputs.get("distancia_carro_moto_combustivel", 0.0),
-            inputs.get("tipo_combustivel", "gasolina")
-        )
-
-    # Transporte elétrico
+        combustivel = tabela.combustivel.get(inputs.get("tipo_combustivel", "gasolina"))
+        if combustivel is not None:
+            total_transporte_combustivel = inputs.get("distancia_carro_moto_combustivel", 0.0) / combustivel[1] * combustivel[2]
     total_transporte_eletrico = 0
     if inputs.get("usa_veiculo_eletrico", False):
-        total_transporte_eletrico = calcular_pegada_transporte_eletrico(
-            inputs.get("distancia_veiculo_eletrico", 0.0),
-            inputs.get("tipo_veiculo_eletrico", "carro_eletrico")
-        )
-
-    # Transporte coletivo
+        eletrico = tabela.eletrico.get(inputs.get("tipo_veiculo_eletrico", "carro_eletrico"))
+        if eletrico is not None:
+            total_transporte_eletrico = inputs.get("distancia_veiculo_eletrico", 0.0) * eletrico[1]
     total_transporte_coletivo = (
-        calcular_pegada_transporte_coletivo(inputs.get("km_onibus", 0.0), "onibus") +
-        calcular_pegada_transporte_coletivo(inputs.get("km_metro", 0.0), "metro") +
-        calcular_pegada_transporte_coletivo(inputs.get("km_aviao_domestico", 0.0), "aviao_domestico") +
-        calcular_pegada_transporte_coletivo(inputs.get("km_aviao_internacional", 0.0), "aviao_internacional")
+        km_onibus * f_onibus + km_metro * f_metro +
+        km_aviao_domestico * f_aviao_domestico + km_aviao_internacional * f_aviao_internacional
     )
     pegada_transporte = total_transporte_combustivel + total_transporte_eletrico + total_transporte_coletivo
 
-    # Alimentação
-    pegada_alimentacao = calcular_pegada_alimentacao(
-        inputs.get("kg_carne_bovina", 0.0), inputs.get("kg_carne_suina", 0.0), inputs.get("kg_frango", 0.0), inputs.get("kg_peixe", 0.0),
-        inputs.get("litros_leite", 0.0), inputs.get("kg_queijo", 0.0), inputs.get("duzias_ovo", 0.0), inputs.get("kg_arroz", 0.0), inputs.get("kg_feijao", 0.0), inputs.get("kg_vegetais", 0.0)
-    )
-
-    # Habitação
-    horas_ar_condicionado_mensal = inputs.get("horas_ar_condicionado_dia", 0.0) * 30
-    horas_aquecedor_mensal = inputs.get("horas_aquecedor_dia", 0.0) * 30
-    pegada_habitacao = calcular_pegada_habitacao(
-        inputs.get("num_comodos", 1),
-        horas_ar_condicionado_mensal,
-        horas_aquecedor_mensal
+    pegada_alimentacao = (
+        0 + carne_bovina * f_carne_bovina + carne_suina * f_carne_suina + frango * f_frango + peixe * f_peixe +
+        leite * f_leite + queijo * f_queijo + ovo * f_ovo + arroz * f_arroz + feijao * f_feijao + vegetais * f_vegetais
     )
-
-    # Consumo
-    pegada_consumo = calcular_pegada_consumo(
-        inputs.get("num_celulares", 0.0), inputs.get("num_laptops", 0.0), inputs.get("num_geladeiras", 0.0),
-        inputs.get("num_televisoes", 0.0), inputs.get("num_veiculos_eletricos_consumo", 0.0), inputs.get("num_roupas_peca", 0.0)
-    )
-
-    # Resíduos
-    pegada_residuos = calcular_pegada_residuos(
-        inputs.get("num_sacos_lixo_100l", 0.0), inputs.get("kg_lixo_reciclavel", 0.0), inputs.get("kg_eletronico", 0.0), inputs.get("kg_compostagem", 0.0)
-    )
-
-    # Estilo de vida
-    horas_streaming_mensal = inputs.get("horas_streaming_dia", 0.0) * 30
-    pegada_estilo_vida = calcular_pegada_estilo_vida(
-        inputs.get("num_voos_eventos_ano", 0), horas_streaming_mensal, inputs.get("num_compras_online_mes", 0)
-    )
-
-    # Créditos sustentáveis
-    creditos_sustentaveis = calcular_creditos_sustentaveis(
-        inputs.get("num_arvores_plantadas_mensal", 0.0), inputs.get("kg_creditos_carbono", 0.0)
+    pegada_habitacao = 0 + comodos * f_comodo + horas_ar_dia * 30 * f_ar + horas_aquecedor_dia * 30 * f_aquecedor
+    pegada_consumo = (
+        0 + celulares * f_celular + laptops * f_laptop + geladeiras * f_geladeira +
+        televisoes * f_televisao + veiculos_eletricos * f_veiculo_eletrico + roupas * f_roupa
     )
+    pegada_residuos = 0 + sacos_lixo * f_saco_lixo + reciclavel * f_reciclavel + eletronico * f_eletronico + compostagem * f_compostagem
+    # Dividindo por 12 para estimativa mensal da emissão anual de voos
+    pegada_estilo_vida = 0 + voos_ano / 12 * f_voos + horas_streaming_dia * 30 * f_streaming + compras_online * f_compras
+    creditos_sustentaveis = 0 + arvores * f_arvores + creditos_carbono * f_creditos
 
     pegada_total = (
         pegada_energia +
@@ -201,4 +191,144 @@ def calcular_pegada_completa(inputs):
     return {
         "pegada_total": pegada_total,
         "pegadas_por_categoria": pegadas_por_categoria
-    }
\ No newline at end of file
+    }
+
+
+# Tempo do motor de cálculo (unitário ou lote), medido uma vez por chamada da API
+DURACAO_CALCULO = metricas.histograma("calculo_duracao_segundos", "Tempo do motor de cálculo da pegada", ("modo",))
+_SERIE_UNITARIO, _SERIE_LOTE = (DURACAO_CALCULO.serie((modo,)) for modo in ("unitario", "lote"))
+
+
+@rastreado("calculo")
+def calcular_pegada_unitaria(inputs):
+    """`calcular_pegada_completa` com a tabela de fatores ativa, medido para as métricas."""
+    inicio = time.perf_counter()
+    resultado = calcular_pegada_completa(inputs, obter_tabela_fatores())
+    DURACAO_CALCULO.observar_serie(_SERIE_UNITARIO, time.perf_counter() - inicio)
+    return resultado
+
+
+# --- Cálculo em lote (NumPy) ---
+# A matriz de entrada (uma linha por registro compacto) é multiplicada pelo vetor de
+# coeficientes da tabela de fatores. As parcelas são depois somadas na mesma ordem do
+# cálculo escalar, garantindo resultados idênticos bit a bit.
+def _montar_matriz_lote(lista_inputs, tabela):
+    """Empacota os dicionários de entrada em uma matriz (linhas x colunas) de float64."""
+    n = len(lista_inputs)
+    try:
+        # Caminho rápido: entradas vindas do PegadaRequest têm todos os campos
+        valores = np.fromiter(
+            chain.from_iterable(map(LER_CAMPOS_ENTRADA, lista_inputs)),
+            dtype=np.float64, count=n * len(CAMPOS_ENTRADA)
+        ).reshape(n, len(CAMPOS_ENTRADA))
+    except KeyError:
+        valores = np.array([_ler_registro(inputs) for inputs in lista_inputs], dtype=np.float64)
+    matriz = np.zeros((n, len(COLUNAS)), dtype=np.float64)
+    matriz[:, INDICES_ENTRADA] = valores
+
+    # Mesmas conversões para base mensal do cálculo escalar
+    for coluna, multiplicador in MULTIPLICADORES_MENSAIS.items():
+        matriz[:, INDICE[coluna]] *= multiplicador
+    for coluna, divisor in DIVISORES_MENSAIS.items():
+        matriz[:, INDICE[coluna]] /= divisor
+
+    # Transporte individual: cada tipo tem sua coluna, com no máximo uma preenchida por linha
+    linhas, colunas, valores_transporte = [], [], []
+    for i, inputs in enumerate(lista_inputs):
+        if inputs.get("usa_carro_moto_combustivel", False):
+            combustivel = tabela.combustivel.get(inputs.get("tipo_combustivel", "gasolina"))
+            if combustivel is not None:
+                linhas.append(i)
+                colunas.append(combustivel[0])
+                valores_transporte.append(inputs.get("distancia_carro_moto_combustivel", 0.0) / combustivel[1])
+        if inputs.get("usa_veiculo_eletrico", False):
+            eletrico = tabela.eletrico.get(inputs.get("tipo_veiculo_eletrico", "carro_eletrico"))
+            if eletrico is not None:
+                linhas.append(i)
+                colunas.append(eletrico[0])
+                valores_transporte.append(inputs.get("distancia_veiculo_eletrico", 0.0))
+    if linhas:
+        matriz[linhas, colunas] = valores_transporte
+    return matriz
+
+
+@rastreado("calculo.lote")
+def calcular_pegada_lote(lista_inputs, tabela=None):
+    """
+    Calcula a pegada de N conjuntos de entrada de uma só vez.
+    Retorna uma lista com o mesmo formato de `calcular_pegada_completa` para cada linha.
+    """
+    inicio = time.perf_counter()
+    resultado = _calcular_pegada_lote(lista_inputs, tabela)
+    DURACAO_CALCULO.observar_serie(_SERIE_LOTE, time.perf_counter() - inicio)
+    return resultado
+
+
+def _calcular_pegada_lote(lista_inputs, tabela=None):
+    n = len(lista_inputs)
+    if n == 0:
+        return []
+    tabela = tabela or obter_tabela_fatores()
+    parcelas = _montar_matriz_lote(lista_inputs, tabela) * np.array(tabela.coeficientes, dtype=np.float64)
+
+    def somar(faixa):
+        total = np.zeros(n, dtype=np.float64)
+        for j in range(faixa.start, faixa.stop):
+            total += parcelas[:, j]
+        return total
+
+    pegada_energia = somar(FAIXAS["energia_combustivel"])
+    coletivo = FAIXAS["transporte_coletivo"].start
+    total_transporte_coletivo = (
+        parcelas[:, coletivo] + parcelas[:, coletivo + 1] + parcelas[:, coletivo + 2] + parcelas[:, coletivo + 3]
+    )
+    pegada_transporte = somar(FAIXAS["transporte_combustivel"]) + somar(FAIXAS["transporte_eletrico"]) + total_transporte_coletivo
+    pegada_alimentacao = somar(FAIXAS["alimentacao"])
+    pegada_habitacao = somar(FAIXAS["habitacao"])
+    pegada_consumo = somar(FAIXAS["consumo"])
+    pegada_residuos = somar(FAIXAS["residuos"])
+    pegada_estilo_vida = somar(FAIXAS["estilo_vida"])
+    creditos_sustentaveis = somar(FAIXAS["sustentavel"])
+
+    pegada_total = (
+        pegada_energia +
+        pegada_transporte +
+        pegada_alimentacao +
+        pegada_habitacao +
+        pegada_consumo +
+        pegada_residuos +
+        pegada_estilo_vida +
+        creditos_sustentaveis
+    )
+
+    colunas = (
+        pegada_energia, pegada_transporte, pegada_alimentacao, pegada_habitacao,
+        pegada_consumo, pegada_residuos, pegada_estilo_vida
+    )
+    return [
+        {"pegada_total": total, "pegadas_por_categoria": dict(zip(CATEGORIAS, valores))}
+        for total, *valores in zip(pegada_total.tolist(), *(c.tolist() for c in colunas))
+    ]
+
+
+# --- Categorias de dias salvos (consolidação mensal) ---
+def calcular_categorias_dia(input_data) -> Dict[str, float]:
+    """pegadas_por_categoria de um dia salvo; entradas inválidas contam como zero em todas as categorias."""
+    try:
+        return calcular_pegada_completa(input_data)["pegadas_por_categoria"]
+    except (AttributeError, TypeError, ValueError, ZeroDivisionError):
+        return dict.fromkeys(CATEGORIAS, 0.0)
+
+
+def calcular_categorias_lote(lista_input_data) -> List[Dict[str, float]]:
+    """Versão em lote de `calcular_categorias_dia` (um dicionário por dia, na mesma ordem)."""
+    validos = [i for i, dados in enumerate(lista_input_data) if isinstance(dados, dict)]
+    resultado = [dict.fromkeys(CATEGORIAS, 0.0) for _ in lista_input_data]
+    try:
+        calculados = calcular_pegada_lote([lista_input_data[i] for i in validos])
+    except (TypeError, ValueError):
+        # Algum valor não numérico: calcula dia a dia para isolar os inválidos
+        calculados = [{"pegadas_por_categoria": calcular_categorias_dia(lista_input_data[i])} for i in validos]
+    for i, calculado in zip(validos, calculados):
+        resultado[i] = calculado["pegadas_por_categoria"]
+    return resultado
@@ -0,0 +1,176 @@
+import hashlib
+import marshal
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, Hashable, Optional
+
+from util.cache_util import AUSENTE
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o cache compartilhado fica indisponível
+    fcntl = None
+
+_CONTADOR = struct.Struct("<Q")
+
+
+def instancia() -> str:
+    """
+    Identificador desta instância da API: ECOECHOS_INSTANCIA (gerado pelo gunicorn.conf.py no
+    master, antes do fork), senão o pid do master do gunicorn (só quando roda sob o gunicorn),
+    senão o pid do próprio processo (uvicorn, --reload, shell: cada processo é uma instância).
+    """
+    definida = os.getenv("ECOECHOS_INSTANCIA", "").strip()
+    if definida:
+        return definida
+    if "gunicorn" in sys.modules:
+        return f"gunicorn-{os.getppid()}"
+    return f"pid-{os.getpid()}"
+
+
+def pasta_padrao() -> str:
+    """Pasta do cache compartilhado da instância (em /dev/shm, se existir)."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"ecoechos-{instancia()}")
+
+
+def preparar_pasta(pasta: str) -> None:
+    """
+    Cria a pasta (modo 0o700) ou aceita uma existente só se for um diretório de verdade, do
+    usuário do processo e sem escrita para grupo/outros. O que está nela é lido por todos os
+    workers; uma pasta criada antes por outro usuário levanta PermissionError.
+    """
+    os.makedirs(pasta, mode=0o700, exist_ok=True)
+    st = os.lstat(pasta)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"pasta compartilhada insegura (dono, tipo ou permissões): {pasta}")
+
+
+class CacheCompartilhado:
+    """
+    Cache entre os processos (workers) de um mesmo host, sem serviço externo, em uma pasta
+    local (de preferência em /dev/shm):
+
+    - quadro de versões: arquivo mapeado em memória (mmap) com `slots` contadores de 64 bits.
+      Cada chave cai em um contador (crc32 da chave); quem grava chama `incrementar(chave)` e
+      todos os workers enxergam a nova versão na próxima leitura de `versao(chave)`, que não
+      usa lock nem chamada de sistema. Chaves que colidem no mesmo contador só causam
+      invalidações a mais.
+    - fotografias: valores serializados (marshal) gravados com a versão em que foram lidos,
+      trocados de forma atômica (arquivo temporário + rename). `obter` só devolve a
+      fotografia se ela ainda estiver na versão atual (e, opcionalmente, se não for velha demais).
+
+    Os valores devem ser dados simples (None, bool, int, float, str, listas, tuplas e
+    dicionários deles); outro tipo faz `guardar` não gravar nada. A pasta é conferida por
+    `preparar_pasta`.
+    """
+
+    def __init__(self, pasta: str, slots: int = 65536):
+        if fcntl is None:
+            raise RuntimeError("cache compartilhado requer fcntl (Linux/macOS)")
+        self.pasta = pasta
+        self.slots = max(1, int(slots))
+        preparar_pasta(pasta)
+        self._fd = os.open(os.path.join(pasta, "versoes"), os.O_RDWR | os.O_CREAT, 0o600)
+        tamanho = self.slots * _CONTADOR.size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Vários workers podem criar o arquivo ao mesmo tempo; só quem chegar primeiro o aumenta
+            if os.fstat(self._fd).st_size < tamanho:
+                os.ftruncate(self._fd, tamanho)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._quadro = mmap.mmap(self._fd, tamanho)
+        # Fotografias já desserializadas por este processo: nome do arquivo -> (versão, gravada em, valor)
+        self._lidas: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.gravacoes = 0
+        self.incrementos = 0
+
+    def _posicao(self, chave: Hashable) -> int:
+        # crc32 e não hash(): o hash de str muda a cada processo
+        return (zlib.crc32(repr(chave).encode("utf-8")) % self.slots) * _CONTADOR.size
+
+    def versao(self, chave: Hashable) -> int:
+        return _CONTADOR.unpack_from(self._quadro, self._posicao(chave))[0]
+
+    def incrementar(self, chave: Hashable) -> int:
+        """Nova versão da chave (invalida as fotografias dela em todos os workers)."""
+        posicao = self._posicao(chave)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            versao = _CONTADOR.unpack_from(self._quadro, posicao)[0] + 1
+            _CONTADOR.pack_into(self._quadro, posicao, versao)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.incrementos += 1
+        return versao
+
+    def _arquivo(self, chave: Hashable) -> str:
+        return hashlib.sha1(repr(chave).encode("utf-8")).hexdigest()
+
+    def obter(self, chave: Hashable, versao: int, idade_maxima: Optional[float] = None) -> Any:
+        """Fotografia da chave gravada na `versao` (e há no máximo `idade_maxima` segundos), ou AUSENTE."""
+        nome = self._arquivo(chave)
+        lida = self._lidas.get(nome)
+        if lida is None or lida[0] != versao:
+            try:
+                with open(os.path.join(self.pasta, nome), "rb") as f:
+                    lida = marshal.load(f)
+            except (OSError, EOFError, ValueError, TypeError):
+                lida = None
+            if lida is not None and lida[0] == versao:
+                with self._lock:
+                    self._lidas[nome] = lida
+        if lida is None or lida[0] != versao or (idade_maxima and time.time() - lida[1] > idade_maxima):
+            self.falhas += 1
+            return AUSENTE
+        self.acertos += 1
+        return lida[2]
+
+    def guardar(self, chave: Hashable, versao: int, valor: Any) -> None:
+        """
+        Grava a fotografia de `valor`, lido na `versao` (em geral, a de uma chave do quadro lida
+        antes da leitura do valor; uma fotografia já velha só é recusada por `obter`).
+        """
+        nome = self._arquivo(chave)
+        lida = (versao, time.time(), valor)
+        try:
+            dados = marshal.dumps(lida)
+        except ValueError:
+            return  # valor com tipo que o marshal não serializa
+        temporario = os.path.join(self.pasta, f"{nome}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            with open(temporario, "wb") as f:
+                f.write(dados)
+            os.replace(temporario, os.path.join(self.pasta, nome))
+        except OSError:
+            try:
+                os.unlink(temporario)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._lidas[nome] = lida
+        self.gravacoes += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        consultas = self.acertos + self.falhas
+        return {
+            "pasta": self.pasta,
+            "slots": self.slots,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+            "gravacoes": self.gravacoes,
+            "incrementos": self.incrementos,
+        }
@@ -0,0 +1,191 @@
+import bisect
+import operator
+from datetime import date as Data, datetime
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from config.conquistas import CONQUISTAS, METRICAS_DIARIAS
+from util.rastreio_util import rastreado
+
+# --- MOTOR DE CONQUISTAS ---
+# Cada usuário tem um estado (contadores e somas por mês, sequências de dias seguidos e
+# maiores sequências de meses) atualizado a cada dia salvo. Ler as conquistas é só avaliar
+# as regras de config/conquistas.py sobre esse estado, sem reler os dias.
+OPERADORES = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+METRICAS_MES = ("dias", "pegada_total", *METRICAS_DIARIAS)
+
+
+def _validar_regras(regras):
+    for regra in regras:
+        escopo = regra.get("escopo")
+        if escopo not in ("mes", "sequencia_dias", "sequencia_meses"):
+            raise ValueError(f"Conquista {regra.get('key')}: escopo inválido {escopo!r}")
+        if regra.get("operador") not in OPERADORES or (escopo == "sequencia_meses" and regra.get("condicao") not in OPERADORES):
+            raise ValueError(f"Conquista {regra['key']}: operador inválido")
+        for campo in ("metrica", "comparar_com"):
+            if campo in regra and regra[campo] not in METRICAS_MES:
+                raise ValueError(f"Conquista {regra['key']}: métrica desconhecida {regra[campo]!r}")
+
+
+_validar_regras(CONQUISTAS)
+
+
+def _numero(valor) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _ativo(valor) -> bool:
+    return valor if isinstance(valor, bool) else _numero(valor) > 0
+
+
+def contribuicao_dia(input_data, pegada_total) -> Dict[str, float]:
+    """Quanto um dia salvo soma em cada métrica do mês."""
+    dados = input_data if isinstance(input_data, dict) else {}
+    contribuicao = {"dias": 1, "pegada_total": _numero(pegada_total)}
+    for nome, definicao in METRICAS_DIARIAS.items():
+        if "soma" in definicao:
+            contribuicao[nome] = sum(_numero(dados.get(campo, 0.0)) for campo in definicao["soma"])
+        elif "se_todos" in definicao:
+            contribuicao[nome] = int(all(_ativo(dados.get(campo)) for campo in definicao["se_todos"]))
+        else:
+            contribuicao[nome] = int(any(_ativo(dados.get(campo)) for campo in definicao["se_algum"]))
+    return contribuicao
+
+
+def novo_estado() -> Dict[str, Any]:
+    # sequencias: intervalos [início, fim] (ordinais de data) de dias seguidos com registro,
+    # ordenados e sem adjacência entre eles
+    return {"meses": {}, "sequencias": [], "maior_sequencia": 0, "sequencias_meses": {}}
+
+
+def _registrar_dia(estado: Dict[str, Any], date: str) -> None:
+    try:
+        dia = datetime.strptime(date[:10], "%Y-%m-%d").toordinal()
+    except ValueError:
+        return
+    sequencias = estado["sequencias"]
+    i = bisect.bisect_right(sequencias, [dia, float("inf")])
+    antes = sequencias[i - 1] if i > 0 else None
+    depois = sequencias[i] if i < len(sequencias) else None
+    if antes is not None and antes[1] >= dia:
+        return  # dia já registrado
+    junta_antes = antes is not None and antes[1] == dia - 1
+    junta_depois = depois is not None and depois[0] == dia + 1
+    if junta_antes and junta_depois:
+        antes[1] = depois[1]
+        del sequencias[i]
+        atual = antes
+    elif junta_antes:
+        antes[1] = dia
+        atual = antes
+    elif junta_depois:
+        depois[0] = dia
+        atual = depois
+    else:
+        atual = [dia, dia]
+        sequencias.insert(i, atual)
+    estado["maior_sequencia"] = max(estado["maior_sequencia"], atual[1] - atual[0] + 1)
+
+
+def aplicar_dia(estado: Dict[str, Any], date: str, nova: Dict[str, float], anterior: Optional[Dict[str, float]] = None) -> None:
+    """Aplica no estado um dia salvo; `anterior` é a contribuição do mesmo dia antes de ser sobrescrito."""
+    mes = estado["meses"].setdefault(date[:7], dict.fromkeys(METRICAS_MES, 0))
+    for metrica in METRICAS_MES:
+        mes[metrica] += nova[metrica] - (anterior[metrica] if anterior else 0)
+    if anterior is None:
+        _registrar_dia(estado, date)
+
+
+def _indice_mes(month_year: str) -> Optional[int]:
+    try:
+        return int(month_year[:4]) * 12 + int(month_year[5:7])
+    except ValueError:
+        return None
+
+
+def atualizar_sequencias_meses(estado: Dict[str, Any]) -> None:
+    """Recalcula as maiores sequências de meses seguidos de cada regra (uma passada pelos meses do usuário)."""
+    meses = sorted(
+        (indice, valores) for indice, valores in ((_indice_mes(m), v) for m, v in estado["meses"].items())
+        if indice is not None and valores["dias"] > 0
+    )
+    for regra in CONQUISTAS:
+        if regra["escopo"] != "sequencia_meses":
+            continue
+        condicao = OPERADORES[regra["condicao"]]
+        maior = atual = 0
+        indice_anterior = None
+        for indice, valores in meses:
+            if condicao(valores[regra["metrica"]], regra["limite"]):
+                atual = atual + 1 if atual and indice == indice_anterior + 1 else 1
+            else:
+                atual = 0
+            indice_anterior = indice
+            maior = max(maior, atual)
+        estado["sequencias_meses"][regra["key"]] = maior
+
+
+def aplicar_lote(
+    estados: Dict[Hashable, Dict[str, Any]],
+    novos: Sequence[Tuple[Hashable, str, float, Any]],
+    anteriores: Dict[Tuple[Hashable, str], Tuple[Optional[float], Any]],
+) -> None:
+    """
+    Aplica nos `estados` (um por user_id, já carregados ou novos) os dias `novos`
+    (user_id, date, pegada_total, input_data), na ordem, sobre os valores `anteriores`.
+    """
+    atuais: Dict[Tuple[Hashable, str], Dict[str, float]] = {}
+    for user_id, date, pegada_total, input_data in novos:
+        chave = (user_id, date)
+        anterior = atuais.get(chave)
+        if anterior is None and chave in anteriores:
+            anterior = contribuicao_dia(anteriores[chave][1], anteriores[chave][0])
+        nova = contribuicao_dia(input_data, pegada_total)
+        aplicar_dia(estados[user_id], date, nova, anterior)
+        atuais[chave] = nova
+    for user_id in {n[0] for n in novos}:
+        atualizar_sequencias_meses(estados[user_id])
+
+
+def construir_estado(dias: Iterable[Tuple[str, Optional[float], Any]]) -> Dict[str, Any]:
+    """Estado completo a partir de todos os dias (date, pegada_total, input_data) de um usuário."""
+    estado = novo_estado()
+    for date, pegada_total, input_data in dias:
+        aplicar_dia(estado, date, contribuicao_dia(input_data, pegada_total))
+    atualizar_sequencias_meses(estado)
+    return estado
+
+
+@rastreado("conquistas.avaliacao")
+def avaliar_conquistas(estado: Optional[Dict[str, Any]], month_year: str, hoje: Optional[Data] = None) -> Dict[str, Any]:
+    """Conquistas do usuário no mês, avaliando as regras sobre o estado (sem acessar os dias salvos)."""
+    estado = estado or novo_estado()
+    mes = estado["meses"].get(month_year) or dict.fromkeys(METRICAS_MES, 0)
+    achievements = []
+    for regra in CONQUISTAS:
+        escopo = regra["escopo"]
+        if escopo == "mes":
+            valor = mes[regra["metrica"]]
+            alvo = mes[regra["comparar_com"]] if "comparar_com" in regra else regra["valor"]
+        elif escopo == "sequencia_dias":
+            valor, alvo = estado["maior_sequencia"], regra["valor"]
+        else:
+            valor, alvo = estado["sequencias_meses"].get(regra["key"], 0), regra["valor"]
+        item = {"key": regra["key"], "title": regra["title"], "achieved": bool(OPERADORES[regra["operador"]](valor, alvo))}
+        if "details" in regra:
+            item["details"] = regra["details"].format(dias=int(mes["dias"]), sequencia=valor)
+        achievements.append(item)
+
+    # Sequência atual: a última, se chegou até hoje ou ontem
+    ultima = estado["sequencias"][-1] if estado["sequencias"] else None
+    hoje_ordinal = (hoje or Data.today()).toordinal()
+    sequencia_atual = ultima[1] - ultima[0] + 1 if ultima and ultima[1] >= hoje_ordinal - 1 else 0
+    return {
+        "month_year": month_year,
+        "days_logged": int(mes["dias"]),
+        "achievements": achievements,
+        "sequencia_atual": sequencia_atual,
+        "maior_sequencia": estado["maior_sequencia"],
+    }
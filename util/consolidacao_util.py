@@ -0,0 +1,44 @@
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from util.calculos_util import CATEGORIAS, calcular_categorias_lote
+
+# Linha de variação de um mês: [pegada_total, dias_registrados, *somas por categoria (CATEGORIAS)]
+Variacao = List[float]
+
+
+def acumular_deltas_mensais(
+    novos: Sequence[Tuple[Hashable, str, float, Any]],
+    anteriores: Dict[Tuple[Hashable, str], Tuple[Optional[float], Any]],
+) -> Dict[Tuple[Hashable, str], Variacao]:
+    """
+    Variação da consolidação mensal causada por gravar `novos` (user_id, date, pegada_total,
+    input_data), na ordem, sobre os valores `anteriores` de cada (user_id, date) já salvo.
+    Dias repetidos no lote são aplicados em sequência, como salvamentos individuais.
+    Retorna {(user_id, 'YYYY-MM'): variação}.
+
+    O total vem de `pegada_total` e as categorias de `input_data`. Com a pegada calculada no
+    servidor (a API e o Streamlit sempre calculam), os dois saem do mesmo cálculo, e o total do
+    mês é a soma das categorias mais os créditos sustentáveis, que não são uma categoria. Dias
+    antigos com a pegada do cliente (fatores_versao NULL) podem divergir até o recálculo.
+    """
+    chaves_anteriores = list(anteriores)
+    categorias_anteriores = calcular_categorias_lote([anteriores[c][1] for c in chaves_anteriores])
+    estado = {
+        chave: (float(anteriores[chave][0] or 0.0), categorias)
+        for chave, categorias in zip(chaves_anteriores, categorias_anteriores)
+    }
+    categorias_novas = calcular_categorias_lote([input_data for _, _, _, input_data in novos])
+
+    variacoes: Dict[Tuple[Hashable, str], Variacao] = {}
+    for (user_id, date, pegada_total, _), categorias in zip(novos, categorias_novas):
+        variacao = variacoes.setdefault((user_id, date[:7]), [0.0, 0] + [0.0] * len(CATEGORIAS))
+        anterior = estado.get((user_id, date))
+        variacao[0] += pegada_total
+        if anterior is None:
+            variacao[1] += 1
+        else:
+            variacao[0] -= anterior[0]
+        for j, c in enumerate(CATEGORIAS, start=2):
+            variacao[j] += categorias[c] - (anterior[1][c] if anterior else 0.0)
+        estado[(user_id, date)] = (pegada_total, categorias)
+    return variacoes
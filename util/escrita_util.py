@@ -0,0 +1,127 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Pedido:
+    __slots__ = ("item", "erro", "concluido")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.erro: Optional[BaseException] = None
+        self.concluido = threading.Event()
+
+
+class GravadorEmGrupo:
+    """
+    Group commit: agrupa gravações concorrentes e as grava juntas, em uma única transação,
+    a cada `intervalo` segundos ou a cada `max_itens` itens (o que vier primeiro). Sem
+    concorrência (último lote com um item), grava o que já estiver na fila sem esperar.
+    `enviar` só retorna depois que o lote que contém o item foi gravado (confirmação de
+    durabilidade); se o lote falhar, os itens são regravados um a um para que um item
+    inválido não derrube os demais, e quem enviou o item inválido recebe a exceção.
+    """
+
+    def __init__(self, gravar_lote: Callable[[List[Any]], None], max_itens: int = 256, intervalo: float = 0.005, nome: str = ""):
+        self.gravar_lote = gravar_lote
+        self.max_itens = max(1, int(max_itens))
+        self.intervalo = max(0.0, float(intervalo))
+        self.nome = nome
+        self._fila: "queue.Queue[Optional[_Pedido]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.lotes = 0
+        self.itens = 0
+        self.maior_lote = 0
+
+    def enviar(self, item: Any, timeout: Optional[float] = None) -> None:
+        """Enfileira o item e espera o commit do lote que o contém."""
+        pedido = _Pedido(item)
+        self._garantir_thread()
+        self._fila.put(pedido)
+        if not pedido.concluido.wait(timeout):
+            raise TimeoutError(f"Gravação em grupo '{self.nome}' não confirmada em {timeout}s")
+        if pedido.erro is not None:
+            raise pedido.erro
+
+    def _garantir_thread(self) -> None:
+        # A thread é criada no processo que grava (após o fork dos workers do gunicorn)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._fila = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._executar, name=f"gravador-{self.nome}", daemon=True)
+                self._thread.start()
+
+    def _executar(self) -> None:
+        fila = self._fila
+        ultimo_lote = 0
+        while True:
+            primeiro = fila.get()
+            if primeiro is None:
+                return
+            lote = [primeiro]
+            parar = False
+            # Só espera a janela se o último lote teve concorrência; com um único escritor
+            # grava na hora, sem somar `intervalo` à latência de cada salvamento
+            esperar = ultimo_lote > 1
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.max_itens:
+                restante = limite - time.monotonic() if esperar else 0
+                try:
+                    pedido = fila.get(timeout=restante) if restante > 0 else fila.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido is None:
+                    parar = True
+                    break
+                lote.append(pedido)
+            self._gravar(lote)
+            ultimo_lote = len(lote)
+            if parar:
+                return
+
+    def _gravar(self, lote: List[_Pedido]) -> None:
+        try:
+            self.gravar_lote([p.item for p in lote])
+        except Exception as e:
+            if len(lote) == 1:
+                lote[0].erro = e
+                return
+            logger.warning("Lote de %d gravações falhou (%s); regravando item a item", len(lote), e)
+            for pedido in lote:
+                try:
+                    self.gravar_lote([pedido.item])
+                except Exception as e:
+                    pedido.erro = e
+        finally:
+            self.lotes += 1
+            self.itens += len(lote)
+            self.maior_lote = max(self.maior_lote, len(lote))
+            for pedido in lote:
+                pedido.concluido.set()
+
+    def parar(self) -> None:
+        """Grava o que já está na fila e encerra a thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._fila.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def estatisticas(self):
+        return {
+            "nome": self.nome,
+            "lotes": self.lotes,
+            "itens": self.itens,
+            "maior_lote": self.maior_lote,
+            "media_por_lote": (self.itens / self.lotes) if self.lotes else 0.0,
+            "pendentes": self._fila.qsize(),
+        }
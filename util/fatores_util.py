@@ -0,0 +1,158 @@
+import hashlib
+import json
+import math
+from operator import itemgetter
+from typing import Dict, Any, Optional, Tuple
+
+from config.fatores_emissao import FATORES_EMISSAO, RENDIMENTO_COMBUSTIVEL_KM_LITRO
+
+# --- LAYOUT DO REGISTRO COMPACTO ---
+# Cada coluna do registro corresponde a uma parcela da pegada e a um coeficiente do vetor
+# de fatores. As colunas estão agrupadas por categoria, na mesma ordem em que as parcelas
+# são somadas. Combustível e veículo elétrico têm uma coluna por tipo; no máximo uma delas
+# é preenchida por registro.
+# (coluna, campo de entrada, valor padrão, grupo em FATORES_EMISSAO, fator)
+COLUNAS = (
+    ("consumo_energia_kwh", "consumo_energia_kwh", 0.0, "energia_combustivel", "eletricidade_kWh"),
+    ("num_botijoes_gas_13kg", "num_botijoes_gas_13kg", 0.0, "energia_combustivel", "gas_cozinha_13kg"),
+    ("litros_gasolina", None, 0.0, "energia_combustivel", "gasolina_litro"),
+    ("litros_etanol", None, 0.0, "energia_combustivel", "etanol_litro"),
+    ("litros_diesel", None, 0.0, "energia_combustivel", "diesel_litro"),
+    ("km_carro_eletrico", None, 0.0, "transporte", "carro_eletrico_km"),
+    ("km_moto_eletrica", None, 0.0, "transporte", "moto_km"),
+    ("km_onibus", "km_onibus", 0.0, "transporte", "onibus_km"),
+    ("km_metro", "km_metro", 0.0, "transporte", "metro_km"),
+    ("km_aviao_domestico", "km_aviao_domestico", 0.0, "transporte", "aviao_domestico_km"),
+    ("km_aviao_internacional", "km_aviao_internacional", 0.0, "transporte", "aviao_internacional_km"),
+    ("kg_carne_bovina", "kg_carne_bovina", 0.0, "alimentacao", "carne_bovina_kg"),
+    ("kg_carne_suina", "kg_carne_suina", 0.0, "alimentacao", "carne_suina_kg"),
+    ("kg_frango", "kg_frango", 0.0, "alimentacao", "frango_kg"),
+    ("kg_peixe", "kg_peixe", 0.0, "alimentacao", "peixe_kg"),
+    ("litros_leite", "litros_leite", 0.0, "alimentacao", "leite_litro"),
+    ("kg_queijo", "kg_queijo", 0.0, "alimentacao", "queijo_kg"),
+    ("duzias_ovo", "duzias_ovo", 0.0, "alimentacao", "ovo_duzia"),
+    ("kg_arroz", "kg_arroz", 0.0, "alimentacao", "arroz_kg"),
+    ("kg_feijao", "kg_feijao", 0.0, "alimentacao", "feijao_kg"),
+    ("kg_vegetais", "kg_vegetais", 0.0, "alimentacao", "vegetais_kg"),
+    ("num_comodos", "num_comodos", 1, "habitacao", "residencia_comodo"),
+    ("horas_ar_condicionado_mensal", "horas_ar_condicionado_dia", 0.0, "habitacao", "ar_condicionado_hora"),
+    ("horas_aquecedor_mensal", "horas_aquecedor_dia", 0.0, "habitacao", "aquecedor_hora"),
+    ("num_celulares", "num_celulares", 0.0, "consumo", "celular"),
+    ("num_laptops", "num_laptops", 0.0, "consumo", "laptop"),
+    ("num_geladeiras", "num_geladeiras", 0.0, "consumo", "geladeira"),
+    ("num_televisoes", "num_televisoes", 0.0, "consumo", "televisao"),
+    ("num_veiculos_eletricos_consumo", "num_veiculos_eletricos_consumo", 0.0, "consumo", "veiculo_eletrico"),
+    ("num_roupas_peca", "num_roupas_peca", 0.0, "consumo", "roupas_peca"),
+    ("num_sacos_lixo_100l", "num_sacos_lixo_100l", 0.0, "residuos", "lixo_comum_saco_100l"),
+    ("kg_lixo_reciclavel", "kg_lixo_reciclavel", 0.0, "residuos", "lixo_reciclavel_kg"),
+    ("kg_eletronico", "kg_eletronico", 0.0, "residuos", "eletronico_kg"),
+    ("kg_compostagem", "kg_compostagem", 0.0, "residuos", "compostagem_kg"),
+    ("num_voos_eventos_mes", "num_voos_eventos_ano", 0, "estilo_vida", "voos_eventos_ano"),
+    ("horas_streaming_mensal", "horas_streaming_dia", 0.0, "estilo_vida", "streaming_hora"),
+    ("num_compras_online_mes", "num_compras_online_mes", 0, "estilo_vida", "compras_online_mes"),
+    ("num_arvores_plantadas_mensal", "num_arvores_plantadas_mensal", 0.0, "sustentavel", "arvores_plantadas"),
+    ("kg_creditos_carbono", "kg_creditos_carbono", 0.0, "sustentavel", "creditos_carbono_kg"),
+)
+INDICE: Dict[str, int] = {coluna: j for j, (coluna, *_resto) in enumerate(COLUNAS)}
+
+# Faixas contíguas do registro somadas em cada parcela da pegada
+FAIXAS = {
+    "energia_combustivel": slice(0, 2),
+    "transporte_combustivel": slice(2, 5),
+    "transporte_eletrico": slice(5, 7),
+    "transporte_coletivo": slice(7, 11),
+    "alimentacao": slice(11, 21),
+    "habitacao": slice(21, 24),
+    "consumo": slice(24, 30),
+    "residuos": slice(30, 34),
+    "estilo_vida": slice(34, 37),
+    "sustentavel": slice(37, 39),
+}
+
+# Campos lidos diretamente do dicionário de entrada (as colunas por tipo são derivadas)
+CAMPOS_ENTRADA: Tuple[Tuple[str, Any], ...] = tuple((campo, padrao) for _, campo, padrao, _, _ in COLUNAS if campo is not None)
+INDICES_ENTRADA = tuple(j for j, (_, campo, _, _, _) in enumerate(COLUNAS) if campo is not None)
+LER_CAMPOS_ENTRADA = itemgetter(*(campo for campo, _ in CAMPOS_ENTRADA))
+
+# Conversões para base mensal aplicadas sobre as colunas de entrada
+MULTIPLICADORES_MENSAIS = {"horas_ar_condicionado_mensal": 30, "horas_aquecedor_mensal": 30, "horas_streaming_mensal": 30}
+DIVISORES_MENSAIS = {"num_voos_eventos_mes": 12}
+
+_VEICULOS_ELETRICOS = {"carro_eletrico": "km_carro_eletrico", "moto_eletrica": "km_moto_eletrica"}
+_TRANSPORTES_COLETIVOS = {
+    "onibus": "km_onibus",
+    "metro": "km_metro",
+    "aviao_domestico": "km_aviao_domestico",
+    "aviao_internacional": "km_aviao_internacional",
+}
+
+
+class TabelaFatores:
+    """
+    Fatores de emissão pré-compilados: vetor plano de coeficientes alinhado a COLUNAS e
+    tabelas de consulta para combustível, veículo elétrico e transporte coletivo.
+    Instâncias são imutáveis; para trocar os fatores, compile uma nova tabela.
+    """
+
+    __slots__ = ("fatores", "versao", "hash_conteudo", "coeficientes", "combustivel", "eletrico", "coletivo")
+
+    def __init__(self, fatores: Dict[str, Dict[str, float]], rendimentos: Dict[str, float], versao: Optional[str] = None):
+        coeficientes = []
+        for coluna, _, _, grupo, fator in COLUNAS:
+            try:
+                valor = float(fatores[grupo][fator])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Fator de emissão ausente ou inválido: {grupo}.{fator}")
+            if not math.isfinite(valor):
+                raise ValueError(f"Fator de emissão não finito: {grupo}.{fator}")
+            coeficientes.append(valor)
+        for tipo in ("gasolina", "etanol", "diesel"):
+            try:
+                rendimento = float(rendimentos[tipo])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Rendimento ausente ou inválido para o combustível: {tipo}")
+            if not math.isfinite(rendimento) or rendimento <= 0:
+                raise ValueError(f"Rendimento inválido para o combustível: {tipo}")
+
+        self.fatores = fatores
+        self.hash_conteudo = calcular_versao_fatores(fatores, rendimentos)
+        self.versao = versao or self.hash_conteudo
+        self.coeficientes: Tuple[float, ...] = tuple(coeficientes)
+        # tipo -> (coluna no registro, km por litro, fator por litro)
+        self.combustivel = {
+            tipo: (INDICE[f"litros_{tipo}"], float(rendimentos[tipo]), coeficientes[INDICE[f"litros_{tipo}"]])
+            for tipo in ("gasolina", "etanol", "diesel")
+        }
+        # tipo -> (coluna no registro, fator por km)
+        self.eletrico = {tipo: (INDICE[coluna], coeficientes[INDICE[coluna]]) for tipo, coluna in _VEICULOS_ELETRICOS.items()}
+        self.coletivo = {tipo: coeficientes[INDICE[coluna]] for tipo, coluna in _TRANSPORTES_COLETIVOS.items()}
+
+    def fator(self, coluna: str) -> float:
+        return self.coeficientes[INDICE[coluna]]
+
+
+def calcular_versao_fatores(fatores: Dict[str, Any], rendimentos: Dict[str, Any]) -> str:
+    """Identificador determinístico (hash do conteúdo) de um conjunto de fatores."""
+    canonico = json.dumps({"fatores": fatores, "rendimentos": rendimentos}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()[:16]
+
+
+# Tabela compilada uma única vez a partir de config/fatores_emissao.py (conjunto embutido)
+TABELA_FATORES = TabelaFatores(FATORES_EMISSAO, RENDIMENTO_COMBUSTIVEL_KM_LITRO)
+
+# --- TABELA ATIVA ---
+# Conjuntos versionados podem ser recarregados em tempo de execução (services/fatores_service.py).
+# A troca é a atribuição de uma única referência, atômica no CPython: cada cálculo usa
+# inteiramente a tabela antiga ou a nova, nunca uma mistura das duas.
+_tabela_ativa: TabelaFatores = TABELA_FATORES
+
+
+def obter_tabela_fatores() -> TabelaFatores:
+    """Tabela de fatores em uso no momento."""
+    return _tabela_ativa
+
+
+def ativar_tabela_fatores(tabela: TabelaFatores) -> None:
+    """Troca a tabela em uso por outra já validada e compilada."""
+    global _tabela_ativa
+    _tabela_ativa = tabela
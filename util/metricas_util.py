@@ -0,0 +1,456 @@
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from util.compartilhado_util import preparar_pasta
+from util.rastreio_util import registrar_trecho, trecho
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem cache compartilhado, a publicação não é usada
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Faixas (segundos) dos histogramas: de 100 µs (cálculo, consultas em cache) a 10 s
+LIMITES_PADRAO = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Contador:
+    """Contador monotônico por combinação de rótulos (tupla na ordem de `rotulos`)."""
+
+    tipo = "counter"
+
+    def __init__(self, registro: "RegistroMetricas", nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self._registro = registro
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, rotulos: Tuple = (), valor: float = 1.0) -> None:
+        if not self._registro.ativo:
+            return
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0.0) + valor
+
+    def exportar(self) -> Dict[Tuple, Any]:
+        with self._lock:
+            return dict(self._valores)
+
+
+class Histograma:
+    """
+    Histograma por combinação de rótulos: contagem por faixa (não acumulada), a última posição
+    para valores acima da maior faixa, e a soma dos valores.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, registro: "RegistroMetricas", nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                 limites: Iterable[float] = LIMITES_PADRAO):
+        self._registro = registro
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(sorted(limites))
+        self._valores: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, rotulos: Tuple, valor: float) -> None:
+        if not self._registro.ativo:
+            return
+        faixa = bisect.bisect_left(self.limites, valor)  # primeira faixa com limite >= valor
+        with self._lock:
+            contagens = self._valores.get(rotulos)
+            if contagens is None:
+                contagens = self._valores[rotulos] = [0] * (len(self.limites) + 1) + [0.0]
+            contagens[faixa] += 1
+            contagens[-1] += valor
+
+    def serie(self, rotulos: Tuple) -> list:
+        """Contagens de uma combinação de rótulos, para `observar_serie` (quem as guarda não monta os rótulos a cada vez)."""
+        with self._lock:
+            contagens = self._valores.get(rotulos)
+            if contagens is None:
+                contagens = self._valores[rotulos] = [0] * (len(self.limites) + 1) + [0.0]
+            return contagens
+
+    def observar_serie(self, contagens: list, valor: float) -> None:
+        if not self._registro.ativo:
+            return
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            contagens[faixa] += 1
+            contagens[-1] += valor
+
+    def exportar(self) -> Dict[Tuple, Any]:
+        with self._lock:
+            return {rotulos: list(contagens) for rotulos, contagens in self._valores.items()}
+
+
+class RegistroMetricas:
+    """
+    Métricas do processo (contadores e histogramas) no formato texto do Prometheus, sem
+    dependências. Cada worker publica periodicamente um instantâneo JSON em `pasta`, sempre no
+    mesmo arquivo (metricas-<pid>.json); `agregado()` soma os instantâneos de todos os workers
+    do host. O instantâneo de um worker encerrado é somado uma única vez a encerrados.json e
+    apagado, para os contadores não voltarem para trás sem acumular arquivos.
+    Coletores (`coletor(funcao)`) acrescentam contadores lidos de outras estatísticas no
+    momento da exportação. Com `ativo` False, as medições não fazem nada.
+    """
+
+    def __init__(self, ativo: bool = True, prefixo: str = "ecoechos_"):
+        self.ativo = ativo
+        self.prefixo = prefixo
+        self._metricas: Dict[str, Any] = {}
+        self._coletores: List[Callable[[], Iterable[Tuple[str, str, Tuple[str, ...], Dict[Tuple, float]]]]] = []
+        self._lock = threading.Lock()
+        self.pasta: Optional[str] = None
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _registrar(self, classe, nome: str, *args, **kwargs):
+        nome = self.prefixo + nome
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(self, nome, *args, **kwargs)
+            return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()) -> Contador:
+        return self._registrar(Contador, nome, ajuda, rotulos)
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (), limites: Iterable[float] = LIMITES_PADRAO) -> Histograma:
+        return self._registrar(Histograma, nome, ajuda, rotulos, limites)
+
+    def coletor(self, funcao: Callable[[], Iterable[Tuple[str, str, Tuple[str, ...], Dict[Tuple, float]]]]) -> None:
+        """`funcao()` devolve (nome, ajuda, nomes dos rótulos, {rótulos: valor}) de contadores."""
+        self._coletores.append(funcao)
+
+    def exportar(self) -> Dict[str, Dict[str, Any]]:
+        """Instantâneo serializável das métricas deste processo."""
+        exportacao = {}
+        for nome, metrica in list(self._metricas.items()):
+            exportacao[nome] = {
+                "tipo": metrica.tipo, "ajuda": metrica.ajuda, "rotulos": metrica.rotulos,
+                "limites": getattr(metrica, "limites", None), "valores": metrica.exportar(),
+            }
+        for coletor in self._coletores:
+            try:
+                for nome, ajuda, rotulos, valores in coletor():
+                    exportacao[self.prefixo + nome] = {"tipo": "counter", "ajuda": ajuda, "rotulos": tuple(rotulos), "limites": None, "valores": dict(valores)}
+            except Exception as e:
+                logger.warning("Coletor de métricas falhou: %s", e)
+        return exportacao
+
+    # --- Agregação entre workers ---
+    def _arquivo_worker(self, pid: int) -> str:
+        return os.path.join(self.pasta, f"metricas-{pid}.json")
+
+    def publicar(self) -> None:
+        if self.pasta is None:
+            return
+        try:
+            _gravar_json(self._arquivo_worker(os.getpid()), _para_json(self.exportar()))
+        except OSError as e:
+            logger.warning("Não foi possível publicar as métricas em %s: %s", self.pasta, e)
+
+    @contextmanager
+    def _travado(self):
+        # Entre workers: somar e apagar o instantâneo de um encerrado acontece uma única vez
+        fd = os.open(os.path.join(self.pasta, "trava"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _recolher_encerrados(self, incluir_proprio: bool = False) -> None:
+        """Soma a encerrados.json os instantâneos de pids que não existem mais e os apaga."""
+        encerrados = []
+        for nome in os.listdir(self.pasta):
+            if not (nome.startswith("metricas-") and nome.endswith(".json")):
+                continue
+            try:
+                pid = int(nome[len("metricas-"):-len(".json")])
+            except ValueError:
+                continue
+            if (pid != os.getpid() and not _pid_vivo(pid)) or (incluir_proprio and pid == os.getpid()):
+                encerrados.append(os.path.join(self.pasta, nome))
+        if not encerrados:
+            return
+        destino = os.path.join(self.pasta, "encerrados.json")
+        exportacoes = [_ler_json(caminho) for caminho in [destino] + encerrados]
+        _gravar_json(destino, _para_json(mesclar(e for e in exportacoes if e)))
+        for caminho in encerrados:
+            os.unlink(caminho)
+
+    def iniciar_publicacao(self, pasta: str, intervalo_segundos: float = 5.0) -> None:
+        """Publica o instantâneo deste worker em `pasta` a cada `intervalo_segundos`."""
+        if self._thread is not None:
+            return
+        preparar_pasta(pasta)
+        self.pasta = pasta
+        with self._travado():
+            # Um arquivo com o pid deste processo é de um worker encerrado que tinha o mesmo pid
+            self._recolher_encerrados(incluir_proprio=True)
+
+        def executar():
+            while not self._parar.wait(intervalo_segundos):
+                self.publicar()
+
+        self.publicar()
+        self._thread = threading.Thread(target=executar, name="publicacao-metricas", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        self.publicar()
+
+    def agregado(self) -> Dict[str, Dict[str, Any]]:
+        """Soma das métricas de todos os workers que publicaram em `pasta` (ou só as deste)."""
+        if self.pasta is None:
+            return self.exportar()
+        self.publicar()
+        try:
+            with self._travado():
+                self._recolher_encerrados()
+                exportacoes = [_ler_json(os.path.join(self.pasta, nome)) for nome in os.listdir(self.pasta) if nome.endswith(".json")]
+        except OSError as e:
+            logger.warning("Não foi possível agregar as métricas de %s: %s", self.pasta, e)
+            return self.exportar()
+        return mesclar(e for e in exportacoes if e)
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _para_json(exportacao: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # Chaves de rótulos (tuplas) viram pares [rótulos, valor]
+    return {nome: {**metrica, "valores": [[list(r), v] for r, v in metrica["valores"].items()]} for nome, metrica in exportacao.items()}
+
+
+def _ler_json(caminho: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        return {
+            nome: {
+                **metrica,
+                "rotulos": tuple(metrica["rotulos"]),
+                "limites": tuple(metrica["limites"]) if metrica["limites"] is not None else None,
+                "valores": {tuple(r): v for r, v in metrica["valores"]},
+            }
+            for nome, metrica in dados.items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _gravar_json(caminho: str, dados: Any) -> None:
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+    except OSError:
+        try:
+            os.unlink(temporario)
+        except OSError:
+            pass
+        raise
+
+
+def mesclar(exportacoes: Iterable[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Soma instantâneos de vários processos (contadores, gauges e cada faixa dos histogramas)."""
+    resultado: Dict[str, Dict[str, Any]] = {}
+    for exportacao in exportacoes:
+        for nome, metrica in exportacao.items():
+            destino = resultado.get(nome)
+            if destino is None or destino["limites"] != metrica["limites"]:
+                resultado[nome] = destino = {**metrica, "valores": {}}
+            for rotulos, valor in metrica["valores"].items():
+                atual = destino["valores"].get(rotulos)
+                if atual is None:
+                    destino["valores"][rotulos] = list(valor) if isinstance(valor, list) else valor
+                elif isinstance(valor, list):
+                    destino["valores"][rotulos] = [a + b for a, b in zip(atual, valor)]
+                else:
+                    destino["valores"][rotulos] = atual + valor
+    return resultado
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Tuple, le: Optional[str] = None) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if le is not None:
+        pares.append(f'le="{le}"')
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    valor = float(valor)
+    return str(int(valor)) if valor.is_integer() else repr(valor)
+
+
+def formatar(exportacao: Dict[str, Dict[str, Any]]) -> str:
+    """Exportação (ou agregação) no formato texto do Prometheus (versão 0.0.4)."""
+    linhas = []
+    for nome in sorted(exportacao):
+        metrica = exportacao[nome]
+        nomes = metrica["rotulos"]
+        linhas.append(f"# HELP {nome} {metrica['ajuda']}")
+        linhas.append(f"# TYPE {nome} {metrica['tipo']}")
+        for rotulos, valor in sorted(metrica["valores"].items(), key=lambda item: tuple(map(str, item[0]))):
+            if metrica["tipo"] != "histogram":
+                linhas.append(f"{nome}{_rotulos(nomes, rotulos)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            for limite, contagem in zip(metrica["limites"], valor):
+                acumulado += contagem
+                linhas.append(f"{nome}_bucket{_rotulos(nomes, rotulos, repr(limite))} {acumulado}")
+            acumulado += valor[len(metrica["limites"])]
+            linhas.append(f"{nome}_bucket{_rotulos(nomes, rotulos, '+Inf')} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(nomes, rotulos)} {_numero(valor[-1])}")
+            linhas.append(f"{nome}_count{_rotulos(nomes, rotulos)} {acumulado}")
+    return "\n".join(linhas) + "\n"
+
+
+class ChamadasMedidas:
+    """
+    Envolve um serviço de banco (db_service, MongoService, AsyncMongoService, memória) e mede
+    cada chamada de método: histograma por (backend, função), erros e consultas acima de
+    `lenta_segundos`, registradas no log e nas últimas `lentas_max` guardadas em `lentas`.
+    Geradores (síncronos e async) contam só o tempo gasto dentro deles, não o do consumidor.
+    Com uma requisição rastreada, cada chamada também vira um trecho `banco.<função>`.
+    Atributos que não são métodos (e `normalizar_id`) passam direto.
+    """
+
+    _IGNORAR = frozenset({"normalizar_id"})
+
+    def __init__(self, base: Any, backend: str, registro: "RegistroMetricas", lenta_segundos: float = 0.1, lentas_max: int = 100):
+        self.base = base
+        self.backend = backend
+        self.lenta_segundos = lenta_segundos
+        self.lentas: "deque[Dict[str, Any]]" = deque(maxlen=lentas_max)
+        self._duracao = registro.histograma("banco_duracao_segundos", "Duração das chamadas ao banco", ("backend", "funcao"))
+        self._erros = registro.contador("banco_erros_total", "Chamadas ao banco que terminaram em exceção", ("backend", "funcao"))
+        self._lentas = registro.contador("banco_consultas_lentas_total", "Chamadas ao banco acima do limite de consulta lenta", ("backend", "funcao"))
+
+    def _registrar(self, funcao: str, segundos: float, erro: bool) -> None:
+        rotulos = (self.backend, funcao)
+        self._duracao.observar(rotulos, segundos)
+        if erro:
+            self._erros.inc(rotulos)
+        if segundos >= self.lenta_segundos:
+            self._lentas.inc(rotulos)
+            self.lentas.append({"backend": self.backend, "funcao": funcao, "ms": round(1000 * segundos, 2), "em": time.time(), "erro": erro})
+            logger.warning("Consulta lenta: %s.%s levou %.1f ms", self.backend, funcao, 1000 * segundos)
+
+    def __getattr__(self, nome: str) -> Any:
+        valor = getattr(self.base, nome)
+        if nome.startswith("_") or nome in self._IGNORAR or not inspect.isroutine(valor):
+            return valor
+        medido = self._medir(nome, valor)
+        setattr(self, nome, medido)  # próximas chamadas não passam por __getattr__
+        return medido
+
+    def _medir(self, nome: str, funcao: Callable) -> Callable:
+        registrar = self._registrar
+        nome_trecho, backend = f"banco.{nome}", self.backend
+        if inspect.isasyncgenfunction(funcao):
+            @functools.wraps(funcao)
+            async def gerador_async(*args, **kwargs):
+                total, erro = 0.0, False
+                iterador = funcao(*args, **kwargs).__aiter__()
+                try:
+                    while True:
+                        inicio = time.perf_counter()
+                        try:
+                            item = await iterador.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        except BaseException:
+                            erro = True
+                            raise
+                        finally:
+                            total += time.perf_counter() - inicio
+                        yield item
+                finally:
+                    registrar(nome, total, erro)
+                    registrar_trecho(nome_trecho, total, backend=backend)
+            return gerador_async
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def corrotina(*args, **kwargs):
+                inicio, erro = time.perf_counter(), False
+                try:
+                    with trecho(nome_trecho, backend=backend):
+                        return await funcao(*args, **kwargs)
+                except BaseException:
+                    erro = True
+                    raise
+                finally:
+                    registrar(nome, time.perf_counter() - inicio, erro)
+            return corrotina
+        if inspect.isgeneratorfunction(funcao):
+            @functools.wraps(funcao)
+            def gerador(*args, **kwargs):
+                total, erro = 0.0, False
+                iterador = funcao(*args, **kwargs)
+                try:
+                    while True:
+                        inicio = time.perf_counter()
+                        try:
+                            item = next(iterador)
+                        except StopIteration:
+                            break
+                        except BaseException:
+                            erro = True
+                            raise
+                        finally:
+                            total += time.perf_counter() - inicio
+                        yield item
+                finally:
+                    iterador.close()
+                    registrar(nome, total, erro)
+                    registrar_trecho(nome_trecho, total, backend=backend)
+            return gerador
+
+        @functools.wraps(funcao)
+        def chamada(*args, **kwargs):
+            inicio, erro = time.perf_counter(), False
+            try:
+                with trecho(nome_trecho, backend=backend):
+                    return funcao(*args, **kwargs)
+            except BaseException:
+                erro = True
+                raise
+            finally:
+                registrar(nome, time.perf_counter() - inicio, erro)
+        return chamada
+
+
+# Registro do processo, usado pela API e pelos módulos de util (senhas, cálculo)
+metricas = RegistroMetricas(ativo=str(os.getenv("METRICAS", "1")).lower() in ("1", "true", "yes"))
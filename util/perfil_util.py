@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from util.rastreio_util import Rastreio
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _local(codigo) -> str:
+    arquivo = codigo.co_filename
+    if arquivo.startswith(_RAIZ + os.sep):
+        arquivo = os.path.relpath(arquivo, _RAIZ)
+    elif "site-packages" + os.sep in arquivo:
+        arquivo = arquivo.split("site-packages" + os.sep, 1)[1]
+    return f"{codigo.co_qualname} ({arquivo}:{codigo.co_firstlineno})"
+
+
+class AmostradorPerfil:
+    """
+    Perfil por amostragem de uma única requisição: uma thread lê a pilha das threads que
+    trabalham para ela a cada `intervalo` segundos (sys._current_frames):
+
+    - a thread do event loop, só quando a corrotina da requisição (`quadro_raiz`) está na
+      pilha, isto é, não enquanto o loop atende outras requisições;
+    - as threads com trechos abertos do rastreio (threadpool das rotas síncronas, ExecutorBanco).
+
+    Cada amostra vale o tempo desde a anterior, então atrasos da thread amostradora (ela também
+    precisa do GIL) não distorcem os pesos. Tempo próprio: a função estava no topo da pilha;
+    acumulado: estava em qualquer ponto dela.
+    """
+
+    def __init__(self, rastreio: Rastreio, quadro_raiz, thread_loop: int, intervalo: float = 0.001):
+        self.rastreio = rastreio
+        self.quadro_raiz = quadro_raiz
+        self.thread_loop = thread_loop
+        self.intervalo = max(0.0001, intervalo)
+        self.amostras = 0
+        self.segundos = 0.0
+        self._proprio: Dict[Any, float] = {}
+        self._acumulado: Dict[Any, float] = {}
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self) -> None:
+        self._thread = threading.Thread(target=self._amostrar, name="perfil", daemon=True)
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _pilha(self, quadro, ate=None) -> Optional[list]:
+        """Códigos da pilha, do topo até `ate` (inclusive); None se `ate` não estiver nela."""
+        codigos = []
+        while quadro is not None:
+            codigos.append(quadro.f_code)
+            if quadro is ate:
+                return codigos
+            quadro = quadro.f_back
+        return None if ate is not None else codigos
+
+    def _amostrar(self) -> None:
+        anterior = time.perf_counter()
+        while not self._parar.wait(self.intervalo):
+            agora = time.perf_counter()
+            peso, anterior = agora - anterior, agora
+            quadros = sys._current_frames()
+            if self._parar.is_set():
+                break  # o event loop já está em `parar` (esperando esta thread)
+            pilhas = []
+            quadro = quadros.get(self.thread_loop)
+            if quadro is not None:
+                pilhas.append(self._pilha(quadro, self.quadro_raiz))
+            for thread in list(self.rastreio.threads):
+                if thread != self.thread_loop and thread in quadros:
+                    pilhas.append(self._pilha(quadros[thread]))
+            for pilha in pilhas:
+                if not pilha:
+                    continue
+                self.amostras += 1
+                self.segundos += peso
+                self._proprio[pilha[0]] = self._proprio.get(pilha[0], 0.0) + peso
+                for codigo in set(pilha):
+                    self._acumulado[codigo] = self._acumulado.get(codigo, 0.0) + peso
+
+    def resultado(self, limite: int = 40) -> Dict[str, Any]:
+        """
+        Funções com mais tempo próprio e com mais tempo acumulado (até `limite` em cada lista),
+        com os dois tempos em ms e em % do tempo amostrado.
+        """
+        total = self.segundos or 1.0
+
+        def linha(item: Tuple[Any, float]) -> Dict[str, Any]:
+            codigo, acumulado = item
+            proprio = self._proprio.get(codigo, 0.0)
+            return {
+                "funcao": _local(codigo),
+                "proprio_ms": round(1000 * proprio, 2),
+                "acumulado_ms": round(1000 * acumulado, 2),
+                "proprio_pct": round(100 * proprio / total, 1),
+                "acumulado_pct": round(100 * acumulado / total, 1),
+            }
+
+        proprio = sorted(self._proprio, key=self._proprio.get, reverse=True)[:limite]
+        acumulado = sorted(self._acumulado.items(), key=lambda item: (-item[1], -self._proprio.get(item[0], 0.0)))[:limite]
+        return {
+            "intervalo_ms": round(1000 * self.intervalo, 3),
+            "amostras": self.amostras,
+            "amostrado_ms": round(1000 * self.segundos, 2),
+            "tempo_proprio": [linha((codigo, self._acumulado[codigo])) for codigo in proprio],
+            "tempo_acumulado": [linha(item) for item in acumulado],
+        }
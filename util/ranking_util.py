@@ -0,0 +1,693 @@
+import bisect
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as Data, timedelta
+from itertools import groupby
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from util.cache_util import AUSENTE, CacheLRU
+from util.rastreio_util import trecho
+
+# Chave de ordenação do ranking: (-total, user_id) -> maior pegada primeiro, empate pelo id
+Chave = Tuple[float, Any]
+
+
+class _No:
+    __slots__ = ("chave", "proximos", "larguras")
+
+    def __init__(self, chave, nivel: int):
+        self.chave = chave
+        self.proximos: List[Optional["_No"]] = [None] * nivel
+        # larguras[i]: quantas posições o ponteiro do nível i avança (para calcular posições)
+        self.larguras: List[int] = [1] * nivel
+
+
+class ListaIndexada:
+    """
+    Skip list indexável: inserção, remoção, posição de uma chave e acesso por posição em
+    O(log n) esperado. As chaves devem ser únicas e comparáveis entre si.
+    """
+
+    NIVEL_MAXIMO = 32
+
+    def __init__(self):
+        self._cabeca = _No(None, self.NIVEL_MAXIMO)
+        self._cabeca.larguras = [0] * self.NIVEL_MAXIMO
+        self._nivel = 1
+        self._tamanho = 0
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def _caminho(self, chave) -> Tuple[List[_No], List[int]]:
+        """Último nó antes de `chave` em cada nível e a posição (0 = cabeça) de cada um."""
+        anteriores = [self._cabeca] * self.NIVEL_MAXIMO
+        posicoes = [0] * self.NIVEL_MAXIMO
+        no, posicao = self._cabeca, 0
+        for i in range(self._nivel - 1, -1, -1):
+            while no.proximos[i] is not None and no.proximos[i].chave < chave:
+                posicao += no.larguras[i]
+                no = no.proximos[i]
+            anteriores[i] = no
+            posicoes[i] = posicao
+        return anteriores, posicoes
+
+    def inserir(self, chave) -> None:
+        anteriores, posicoes = self._caminho(chave)
+        nivel = 1
+        while nivel < self.NIVEL_MAXIMO and random.random() < 0.25:
+            nivel += 1
+        if nivel > self._nivel:
+            for i in range(self._nivel, nivel):
+                self._cabeca.larguras[i] = self._tamanho + 1
+            self._nivel = nivel
+        novo = _No(chave, nivel)
+        posicao = posicoes[0] + 1  # posição (1 = primeira) do novo nó
+        for i in range(self._nivel):
+            anterior = anteriores[i]
+            if i < nivel:
+                novo.proximos[i] = anterior.proximos[i]
+                anterior.proximos[i] = novo
+                novo.larguras[i] = anterior.larguras[i] - (posicao - posicoes[i]) + 1
+                anterior.larguras[i] = posicao - posicoes[i]
+            else:
+                anterior.larguras[i] += 1
+        self._tamanho += 1
+
+    def remover(self, chave) -> bool:
+        anteriores, _ = self._caminho(chave)
+        alvo = anteriores[0].proximos[0]
+        if alvo is None or alvo.chave != chave:
+            return False
+        for i in range(self._nivel):
+            anterior = anteriores[i]
+            if anterior.proximos[i] is alvo:
+                anterior.proximos[i] = alvo.proximos[i]
+                anterior.larguras[i] += alvo.larguras[i] - 1
+            else:
+                anterior.larguras[i] -= 1
+        while self._nivel > 1 and self._cabeca.proximos[self._nivel - 1] is None:
+            self._nivel -= 1
+        self._tamanho -= 1
+        return True
+
+    def posicao(self, chave) -> int:
+        """Quantas chaves são menores que `chave` (posição 0-based, se ela estiver na lista)."""
+        return self._caminho(chave)[1][0]
+
+    def fatia(self, inicio: int, quantidade: int) -> List[Any]:
+        """Até `quantidade` chaves a partir da posição `inicio` (0-based)."""
+        if inicio < 0:
+            quantidade += inicio
+            inicio = 0
+        if quantidade <= 0 or inicio >= self._tamanho:
+            return []
+        # Desce pelos níveis até a posição `inicio` e segue pelo nível 0
+        no, posicao = self._cabeca, 0
+        for i in range(self._nivel - 1, -1, -1):
+            while no.proximos[i] is not None and posicao + no.larguras[i] <= inicio:
+                posicao += no.larguras[i]
+                no = no.proximos[i]
+        chaves = []
+        no = no.proximos[0]
+        while no is not None and len(chaves) < quantidade:
+            chaves.append(no.chave)
+            no = no.proximos[0]
+        return chaves
+
+
+class PlacarMensal:
+    """Ranking de um mês em memória: total e nome de cada usuário e a ordem em uma ListaIndexada."""
+
+    def __init__(self, linhas: Iterable[Tuple[Hashable, Optional[str], float]] = ()):
+        self._lock = threading.Lock()
+        self._lista = ListaIndexada()
+        self._totais: Dict[Hashable, float] = {}
+        self._nomes: Dict[Hashable, Optional[str]] = {}
+        for user_id, username, total in linhas:
+            self._definir(user_id, float(total or 0.0))
+            self._nomes[user_id] = username
+
+    def __len__(self) -> int:
+        return len(self._lista)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._totais
+
+    def _definir(self, user_id, total: Optional[float]) -> None:
+        anterior = self._totais.pop(user_id, None)
+        if anterior is not None:
+            self._lista.remover((-anterior, user_id))
+        if total is not None:
+            self._totais[user_id] = total
+            self._lista.inserir((-total, user_id))
+
+    def atualizar(self, user_id, total: Optional[float], username: Optional[str] = None) -> None:
+        """Novo total do usuário no mês (None remove o usuário do ranking)."""
+        with self._lock:
+            self._definir(user_id, None if total is None else float(total))
+            if total is None:
+                self._nomes.pop(user_id, None)
+            elif username is not None or user_id not in self._nomes:
+                self._nomes[user_id] = username
+
+    def renomear(self, user_id, username: str) -> None:
+        with self._lock:
+            if user_id in self._nomes:
+                self._nomes[user_id] = username
+
+    def _linhas(self, inicio: int, chaves: List[Chave]) -> List[Dict[str, Any]]:
+        return [
+            {"posicao": inicio + i + 1, "user_id": user_id, "username": self._nomes.get(user_id), "total_pegada": -total}
+            for i, (total, user_id) in enumerate(chaves)
+        ]
+
+    def pagina(self, limite: int, apos: Optional[Chave] = None) -> List[Dict[str, Any]]:
+        """
+        Até `limite` posições, do primeiro lugar ou logo depois da chave `apos`
+        (total, user_id) da última linha da página anterior (keyset).
+        """
+        with self._lock:
+            inicio = 0
+            if apos is not None:
+                chave = (-apos[0], apos[1])
+                inicio = self._lista.posicao(chave)
+                if self._lista.fatia(inicio, 1) == [chave]:
+                    inicio += 1  # a chave do cursor ainda está no ranking: começa na seguinte
+            chaves = self._lista.fatia(inicio, limite)
+            return self._linhas(inicio, chaves)
+
+    def posicao(self, user_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            total = self._totais.get(user_id)
+            if total is None:
+                return None
+            inicio = self._lista.posicao((-total, user_id))
+            return self._linhas(inicio, [(-total, user_id)])[0]
+
+    def ao_redor(self, user_id, k: int) -> List[Dict[str, Any]]:
+        """O usuário e até `k` posições antes e depois dele."""
+        with self._lock:
+            total = self._totais.get(user_id)
+            if total is None:
+                return []
+            posicao = self._lista.posicao((-total, user_id))
+            inicio = max(0, posicao - k)
+            return self._linhas(inicio, self._lista.fatia(inicio, posicao + k + 1 - inicio))
+
+
+class Placares:
+    """
+    Placares mensais do processo, carregados sob demanda (`carregar(month_year)` devolve
+    (user_id, username, total) de cada usuário com registro no mês) e mantidos em um CacheLRU.
+    Salvamentos deste processo atualizam o placar na hora; o TTL (`recarga`) limita por quanto
+    tempo salvamentos feitos em outros workers ficam de fora.
+
+    Com `compartilhado`, cada mês tem uma versão no quadro do host: `registrar_gravacao` a
+    incrementa, e os placares dos outros workers carregados em versão anterior são recarregados
+    na consulta seguinte, a partir da fotografia do mês gravada pelo primeiro worker que o leu
+    do banco (só ele consulta o banco). `registrar_renomeacao` faz o mesmo com todos os meses.
+    """
+
+    def __init__(self, carregar: Callable[[str], Iterable[Tuple[Hashable, Optional[str], float]]],
+                 meses_maximo: int = 24, recarga: Optional[float] = 60.0, compartilhado=None):
+        self.carregar = carregar
+        self.recarga = recarga
+        self.compartilhado = compartilhado
+        # month_year -> [placar, versão do mês no quadro quando foi carregado]
+        self._cache = CacheLRU(meses_maximo, ttl=recarga, nome="placares")
+        self._lock_carga = threading.Lock()
+        self._versao_nomes = 0
+        self.cargas = 0
+        self.cargas_compartilhadas = 0
+        self.segundos_carga = 0.0
+
+    def _versao(self, month_year: str) -> int:
+        return self.compartilhado.versao(("placar", month_year)) if self.compartilhado is not None else 0
+
+    def _atual(self, month_year: str) -> Optional[PlacarMensal]:
+        if self.compartilhado is not None:
+            versao_nomes = self.compartilhado.versao(("placares", "nomes"))
+            if versao_nomes != self._versao_nomes:
+                # Usuário renomeado em outro worker: todos os meses carregados antes ficam velhos
+                self._cache.limpar()
+                self._versao_nomes = versao_nomes
+        item = self._cache.obter(month_year, None)
+        if item is None or item[1] != self._versao(month_year):
+            return None
+        return item[0]
+
+    def obter(self, month_year: str) -> PlacarMensal:
+        placar = self._atual(month_year)
+        if placar is not None:
+            return placar
+        with self._lock_carga:
+            # Outra thread pode ter carregado o mês enquanto esperávamos
+            placar = self._atual(month_year)
+            if placar is None:
+                inicio = time.perf_counter()
+                # Versão lida antes da carga: uma gravação durante a leitura força nova carga
+                versao = self._versao(month_year)
+                fotografia = ("placar", month_year, self._versao_nomes)
+                linhas = AUSENTE
+                if self.compartilhado is not None:
+                    linhas = self.compartilhado.obter(fotografia, versao, self.recarga)
+                if linhas is AUSENTE:
+                    linhas = list(self.carregar(month_year))
+                    self.cargas += 1
+                    if self.compartilhado is not None:
+                        self.compartilhado.guardar(fotografia, versao, linhas)
+                else:
+                    self.cargas_compartilhadas += 1
+                with trecho("ranking.agregacao", mes=month_year, linhas=len(linhas)):
+                    placar = PlacarMensal(linhas)
+                self.segundos_carga += time.perf_counter() - inicio
+                self._cache.definir(month_year, [placar, versao])
+            return placar
+
+    def carregado(self, month_year: str) -> Optional[PlacarMensal]:
+        """Placar do mês se já estiver em memória e atualizado (sem carregar)."""
+        return self._atual(month_year)
+
+    def registrar_gravacao(self, month_year: str, placar: Optional[PlacarMensal] = None) -> Optional[int]:
+        """
+        Avisa os outros workers de um salvamento no mês. `placar`: o placar deste worker, já
+        atualizado com o salvamento; continua válido se nenhum outro worker gravou no meio.
+        Devolve a nova versão do mês (None sem `compartilhado`).
+        """
+        if self.compartilhado is None:
+            return None
+        versao = self.compartilhado.incrementar(("placar", month_year))
+        item = self._cache.obter(month_year, None)
+        if placar is not None and item is not None and item[0] is placar and item[1] == versao - 1:
+            item[1] = versao
+        return versao
+
+    def descartar(self, month_year: str) -> None:
+        self._cache.remover(month_year)
+
+    def renomear(self, user_id, username: str) -> None:
+        for placar, _ in self._cache.valores():
+            placar.renomear(user_id, username)
+
+    def registrar_renomeacao(self) -> Optional[int]:
+        """Avisa os outros workers de uma troca de nome (chame depois de `renomear`); devolve a nova versão dos nomes."""
+        if self.compartilhado is None:
+            return None
+        versao = self.compartilhado.incrementar(("placares", "nomes"))
+        with self._lock_carga:
+            if versao == self._versao_nomes + 1:
+                self._versao_nomes = versao
+        return versao
+
+    def registrar_cadastro(self, user_id, username: str) -> Optional[int]:
+        """
+        Põe um usuário recém-cadastrado, com 0, nos meses carregados e avisa os outros workers
+        (pela versão dos nomes, que os faz recarregar); devolve a nova versão dos nomes.
+        """
+        for placar, _ in self._cache.valores():
+            if user_id not in placar:
+                placar.atualizar(user_id, 0.0, username)
+        return self.registrar_renomeacao()
+
+    def limpar(self) -> None:
+        self._cache.limpar()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            **self._cache.estatisticas(),
+            "cargas": self.cargas,
+            "cargas_compartilhadas": self.cargas_compartilhadas,
+            "segundos_carga": round(self.segundos_carga, 3),
+        }
+
+
+# --- Rankings de janelas arbitrárias (semana, trimestre, ano, últimos N dias, intervalo) ---
+_PERIODOS = (
+    (re.compile(r"^(\d{4})-(\d{2})$"), "mes"),
+    (re.compile(r"^(\d{4})-W(\d{2})$"), "semana"),
+    (re.compile(r"^(\d{4})-Q([1-4])$"), "trimestre"),
+    (re.compile(r"^(\d{4})$"), "ano"),
+    (re.compile(r"^(\d{1,3})d$"), "ultimos_dias"),
+)
+
+
+def intervalo_periodo(periodo: str, hoje: Optional[Data] = None) -> Tuple[Data, Data]:
+    """
+    Primeiro e último dia (inclusive) de um período: 'YYYY-MM' (mês), 'YYYY-Www' (semana ISO),
+    'YYYY-Qn' (trimestre), 'YYYY' (ano) ou 'Nd' (últimos N dias, até hoje).
+    ValueError se o formato não for reconhecido.
+    """
+    for padrao, tipo in _PERIODOS:
+        m = padrao.match(periodo.strip())
+        if not m:
+            continue
+        numeros = [int(g) for g in m.groups()]
+        if tipo == "mes":
+            inicio = Data(numeros[0], numeros[1], 1)
+            proximo = Data(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+            return inicio, proximo - timedelta(days=1)
+        if tipo == "semana":
+            inicio = Data.fromisocalendar(numeros[0], numeros[1], 1)
+            return inicio, inicio + timedelta(days=6)
+        if tipo == "trimestre":
+            inicio = Data(numeros[0], 3 * numeros[1] - 2, 1)
+            fim = Data(numeros[0] + numeros[1] // 4, 3 * numeros[1] % 12 + 1, 1) - timedelta(days=1)
+            return inicio, fim
+        if tipo == "ano":
+            return Data(numeros[0], 1, 1), Data(numeros[0], 12, 31)
+        if not 1 <= numeros[0] <= 366:
+            raise ValueError("Use de 1d a 366d")
+        fim = hoje or Data.today()
+        return fim - timedelta(days=numeros[0] - 1), fim
+    raise ValueError(f"Período não reconhecido: {periodo!r}")
+
+
+class SomasPrefixadas:
+    """
+    Pegada diária de cada usuário em uma árvore de Fenwick (BIT) sobre as posições dos dias com
+    registro (ordinais, em ordem). O total de uma janela custa duas buscas binárias e duas somas
+    de prefixo, O(log n) por usuário, sem reler os dias. Regravar um dia ou acrescentar um depois
+    do último custa O(log n); um dia novo no meio (preenchimento retroativo) refaz só os nós da
+    árvore a partir dele.
+    """
+
+    def __init__(self, linhas: Iterable[Tuple[Hashable, int, float]] = ()):
+        # linhas: (user_id, dia ordinal, pegada_total), em ordem de usuário e dia
+        self._dias: Dict[Hashable, List[int]] = {}
+        self._valores: Dict[Hashable, List[float]] = {}
+        self._arvores: Dict[Hashable, List[float]] = {}
+        for user_id, dias in groupby(linhas, key=lambda r: r[0]):
+            dias = list(dias)
+            self._dias[user_id] = [r[1] for r in dias]
+            self._valores[user_id] = [float(r[2] or 0.0) for r in dias]
+            self._arvores[user_id] = [0.0]
+            self._reconstruir(user_id, 0)
+
+    def _reconstruir(self, user_id, posicao: int) -> None:
+        """Refaz os nós da árvore que cobrem `posicao` em diante (valores mudaram de lá até o fim)."""
+        arvore, valores = self._arvores[user_id], self._valores[user_id]
+        n = len(valores)
+        del arvore[posicao + 1:]
+        arvore.extend(valores[posicao:])
+        # Nós anteriores, já completos, cujos pais estão entre os refeitos
+        j = posicao
+        while j > 0:
+            pai = j + (j & -j)
+            if pai <= n:
+                arvore[pai] += arvore[j]
+            j -= j & -j
+        for j in range(posicao + 1, n + 1):
+            pai = j + (j & -j)
+            if pai <= n:
+                arvore[pai] += arvore[j]
+
+    @staticmethod
+    def _prefixo(arvore: List[float], fim: int) -> float:
+        """Soma das posições antes de `fim`."""
+        soma = 0.0
+        while fim > 0:
+            soma += arvore[fim]
+            fim -= fim & -fim
+        return soma
+
+    def definir(self, user_id, dia: int, total: float) -> None:
+        """Grava (ou substitui) o total do dia do usuário."""
+        if user_id not in self._dias:
+            self._dias[user_id], self._valores[user_id], self._arvores[user_id] = [], [], [0.0]
+        dias, valores = self._dias[user_id], self._valores[user_id]
+        i = bisect.bisect_left(dias, dia)
+        if i < len(dias) and dias[i] == dia:
+            arvore, delta = self._arvores[user_id], total - valores[i]
+            valores[i] = total
+            j = i + 1
+            while j < len(arvore):
+                arvore[j] += delta
+                j += j & -j
+            return
+        dias.insert(i, dia)
+        valores.insert(i, total)
+        self._reconstruir(user_id, i)
+
+    def substituir(self, inicio: int, fim: int, linhas: Iterable[Tuple[Hashable, int, float]]) -> None:
+        """Troca os dias de `inicio` a `fim` (ordinais, inclusive) de todos os usuários pelos de `linhas` (em ordem de usuário e dia)."""
+        novos = {user_id: list(dias) for user_id, dias in groupby(linhas, key=lambda r: r[0])}
+        for user_id in list(self._dias) + [u for u in novos if u not in self._dias]:
+            if user_id not in self._dias:
+                self._dias[user_id], self._valores[user_id], self._arvores[user_id] = [], [], [0.0]
+            dias, valores = self._dias[user_id], self._valores[user_id]
+            a = bisect.bisect_left(dias, inicio)
+            b = bisect.bisect_right(dias, fim)
+            linhas_usuario = novos.get(user_id, ())
+            if a == b and not linhas_usuario:
+                continue
+            dias[a:b] = [r[1] for r in linhas_usuario]
+            valores[a:b] = [float(r[2] or 0.0) for r in linhas_usuario]
+            if not dias:
+                del self._dias[user_id], self._valores[user_id], self._arvores[user_id]
+                continue
+            self._reconstruir(user_id, a)
+
+    def total(self, user_id, inicio: int, fim: int) -> Optional[float]:
+        """Soma de `inicio` a `fim` (ordinais, inclusive); None se o usuário não tem dias na janela."""
+        dias = self._dias.get(user_id)
+        if not dias:
+            return None
+        a = bisect.bisect_left(dias, inicio)
+        b = bisect.bisect_right(dias, fim)
+        if a == b:
+            return None
+        arvore = self._arvores[user_id]
+        return self._prefixo(arvore, b) - self._prefixo(arvore, a)
+
+    def usuarios(self) -> List[Hashable]:
+        return list(self._dias)
+
+
+def _meses(inicio: Data, fim: Data) -> List[Tuple[int, int]]:
+    """(ano, mês) de `inicio` a `fim`, em ordem."""
+    meses = []
+    ano, mes = inicio.year, inicio.month
+    while (ano, mes) <= (fim.year, fim.month):
+        meses.append((ano, mes))
+        ano, mes = ano + mes // 12, mes % 12 + 1
+    return meses
+
+
+class RankingsPorJanela:
+    """
+    Rankings de janelas arbitrárias de dias, calculados sobre SomasPrefixadas. Os dias são lidos
+    por mês, sob demanda: `carregar(inicio, fim)` devolve (user_id, username, 'YYYY-MM-DD',
+    pegada_total) dos dias de `inicio` a `fim` (inclusive), em ordem de usuário e data, e uma
+    consulta só lê os meses da janela que ainda não estão em memória ou ficaram desatualizados
+    (uma leitura por sequência de meses seguidos). Cada janela consultada vira um PlacarMensal
+    guardado em um CacheLRU; salvamentos deste processo atualizam as somas e as janelas.
+
+    Como nos Placares, um mês fica desatualizado após `recarga` segundos e, com `compartilhado`,
+    assim que outro worker grava nele ou troca um nome (versões ("placar", mês) e
+    ("placares", "nomes") do quadro, incrementadas pelos Placares). No máximo `meses_maximo`
+    meses ficam em memória (LRU; uma janela maior que isso mantém só os próprios meses).
+
+    Com `carregar_usuarios` (devolve (user_id, username) de todos os usuários cadastrados, relido
+    junto com os nomes), quem não tem dias na janela entra com 0, como no ranking mensal.
+    """
+
+    def __init__(self, carregar: Callable[[str, str], Iterable[Tuple[Hashable, Optional[str], str, float]]],
+                 janelas_maximo: int = 64, recarga: Optional[float] = 60.0, compartilhado=None,
+                 meses_maximo: int = 24,
+                 carregar_usuarios: Optional[Callable[[], Iterable[Tuple[Hashable, Optional[str]]]]] = None):
+        self.carregar = carregar
+        self.carregar_usuarios = carregar_usuarios
+        self.recarga = recarga if recarga and recarga > 0 else None
+        self.compartilhado = compartilhado
+        self.meses_maximo = max(1, int(meses_maximo))
+        self._janelas = CacheLRU(janelas_maximo, nome="rankings_janela")
+        self._lock = threading.RLock()
+        self._somas = SomasPrefixadas()
+        self._nomes: Dict[Hashable, Optional[str]] = {}
+        # 'YYYY-MM' -> [versão do mês no quadro quando foi lido, momento da leitura], do menos ao mais usado
+        self._carregados: "OrderedDict[str, list]" = OrderedDict()
+        # Usuários cadastrados (com carregar_usuarios) e o momento da leitura
+        self._usuarios: Dict[Hashable, Optional[str]] = {}
+        self._usuarios_em: Optional[float] = None
+        self._versao_nomes = 0
+        self.meses_descartados = 0
+        self.cargas = 0
+        self.segundos_carga = 0.0
+
+    def _versao(self, month_year: str) -> int:
+        return self.compartilhado.versao(("placar", month_year)) if self.compartilhado is not None else 0
+
+    def _atualizar(self, inicio: Data, fim: Data) -> None:
+        """Lê do banco os meses da janela que faltam ou estão desatualizados."""
+        if self.compartilhado is not None:
+            versao_nomes = self.compartilhado.versao(("placares", "nomes"))
+            if versao_nomes != self._versao_nomes:
+                # Nome trocado ou usuário cadastrado em outro worker: relê os meses e os usuários ao consultá-los
+                for item in self._carregados.values():
+                    item[0] = None
+                self._usuarios_em = None
+                self._versao_nomes = versao_nomes
+        agora = time.monotonic()
+        if self.carregar_usuarios is not None and (
+            self._usuarios_em is None or (self.recarga and agora - self._usuarios_em > self.recarga)
+        ):
+            self._usuarios = dict(self.carregar_usuarios())
+            self._usuarios_em = agora
+            self._janelas.limpar()
+        meses = _meses(inicio, fim)
+        pendentes = []
+        for ano, mes in meses:
+            chave = f"{ano:04d}-{mes:02d}"
+            item = self._carregados.get(chave)
+            if item is None or item[0] != self._versao(chave) or (self.recarga and agora - item[1] > self.recarga):
+                pendentes.append((ano, mes))
+            else:
+                self._carregados.move_to_end(chave)
+        sequencia: List[Tuple[int, int]] = []
+        for ano_mes in pendentes:
+            if sequencia and ano_mes != (sequencia[-1][0] + sequencia[-1][1] // 12, sequencia[-1][1] % 12 + 1):
+                self._carregar_meses(sequencia)
+                sequencia = []
+            sequencia.append(ano_mes)
+        if sequencia:
+            self._carregar_meses(sequencia)
+        self._descartar_excedentes({f"{ano:04d}-{mes:02d}" for ano, mes in meses})
+
+    def _descartar_excedentes(self, em_uso: set) -> None:
+        """Tira da memória os meses menos usados além de `meses_maximo` (nunca os da janela em uso)."""
+        for chave in list(self._carregados):
+            if len(self._carregados) <= self.meses_maximo:
+                break
+            if chave in em_uso:
+                continue
+            del self._carregados[chave]
+            ano, mes = int(chave[:4]), int(chave[5:7])
+            inicio = Data(ano, mes, 1).toordinal()
+            fim = (Data(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)).toordinal()
+            self._somas.substituir(inicio, fim, ())
+            for janela, _ in self._janelas.itens():
+                if janela[0] <= fim and janela[1] >= inicio:
+                    self._janelas.remover(janela)
+            self.meses_descartados += 1
+
+    def _carregar_meses(self, meses: List[Tuple[int, int]]) -> None:
+        inicio_carga = time.perf_counter()
+        (ano, mes), (ano_fim, mes_fim) = meses[0], meses[-1]
+        inicio = Data(ano, mes, 1)
+        fim = Data(ano_fim + mes_fim // 12, mes_fim % 12 + 1, 1) - timedelta(days=1)
+        # Versões lidas antes da leitura: uma gravação durante a leitura força nova carga
+        versoes = {chave: self._versao(chave) for chave in (f"{a:04d}-{m:02d}" for a, m in meses)}
+        nomes = self._nomes
+
+        def linhas():
+            for user_id, username, date, pegada_total in self.carregar(inicio.isoformat(), fim.isoformat()):
+                try:
+                    dia = Data.fromisoformat(str(date)[:10]).toordinal()
+                except ValueError:
+                    continue
+                nomes[user_id] = username
+                yield user_id, dia, pegada_total
+
+        with trecho("ranking.agregacao", janela="dias", inicio=inicio.isoformat(), fim=fim.isoformat()):
+            self._somas.substituir(inicio.toordinal(), fim.toordinal(), linhas())
+        agora = time.monotonic()
+        for chave, versao in versoes.items():
+            self._carregados[chave] = [versao, agora]
+            self._carregados.move_to_end(chave)
+        for janela, _ in self._janelas.itens():
+            if janela[0] <= fim.toordinal() and janela[1] >= inicio.toordinal():
+                self._janelas.remover(janela)
+        self.segundos_carga += time.perf_counter() - inicio_carga
+        self.cargas += 1
+
+    def obter(self, inicio: Data, fim: Data) -> PlacarMensal:
+        """Ranking da janela de `inicio` a `fim` (inclusive)."""
+        chave = (inicio.toordinal(), fim.toordinal())
+        with self._lock:
+            self._atualizar(inicio, fim)
+            placar = self._janelas.obter(chave)
+            if placar is AUSENTE:
+                somas = self._somas
+                # Usuários cadastrados sem dias na janela entram com 0
+                usuarios = dict.fromkeys(self._usuarios)
+                usuarios.update(dict.fromkeys(somas.usuarios()))
+                totais = ((u, somas.total(u, *chave)) for u in usuarios)
+                with trecho("ranking.agregacao", inicio=inicio.isoformat(), fim=fim.isoformat()):
+                    placar = PlacarMensal(
+                        (u, self._nomes.get(u, self._usuarios.get(u)), t if t is not None else 0.0)
+                        for u, t in totais if t is not None or u in self._usuarios
+                    )
+                self._janelas.definir(chave, placar)
+            return placar
+
+    def registrar_dia(self, user_id, date: str, total: float, username: Optional[str] = None) -> None:
+        """Aplica um dia salvo por este processo nas somas e nas janelas em memória que o contêm."""
+        try:
+            dia = Data.fromisoformat(str(date)[:10]).toordinal()
+        except ValueError:
+            return
+        with self._lock:
+            if str(date)[:7] not in self._carregados:
+                return  # mês não lido ainda: a primeira consulta que o incluir lê o dia do banco
+            self._somas.definir(user_id, dia, float(total))
+            if username is not None or user_id not in self._nomes:
+                self._nomes[user_id] = username
+            for (inicio, fim), placar in self._janelas.itens():
+                if inicio <= dia <= fim:
+                    placar.atualizar(user_id, self._somas.total(user_id, inicio, fim), self._nomes.get(user_id, self._usuarios.get(user_id)))
+
+    def registrar_gravacao(self, month_year: str, versao: Optional[int]) -> None:
+        """
+        Nova versão do mês no quadro após um salvamento deste processo (já aplicado com
+        `registrar_dia`): o mês continua atualizado se nenhum outro worker gravou no meio.
+        """
+        if versao is None:
+            return
+        with self._lock:
+            item = self._carregados.get(month_year)
+            if item is not None and item[0] == versao - 1:
+                item[0] = versao
+
+    def registrar_renomeacao(self, versao: Optional[int]) -> None:
+        """Nova versão dos nomes no quadro após uma troca de nome deste processo (já aplicada com `renomear`)."""
+        if versao is None:
+            return
+        with self._lock:
+            if versao == self._versao_nomes + 1:
+                self._versao_nomes = versao
+
+    def registrar_cadastro(self, user_id, username: str) -> None:
+        """Põe um usuário recém-cadastrado, com 0, nas janelas em memória (junte com Placares.registrar_cadastro)."""
+        if self.carregar_usuarios is None:
+            return
+        with self._lock:
+            self._usuarios[user_id] = username
+            for placar in self._janelas.valores():
+                if user_id not in placar:
+                    placar.atualizar(user_id, 0.0, username)
+
+    def conhece(self, user_id) -> bool:
+        with self._lock:
+            return user_id in self._nomes
+
+    def renomear(self, user_id, username: str) -> None:
+        with self._lock:
+            if user_id in self._nomes:
+                self._nomes[user_id] = username
+            if user_id in self._usuarios:
+                self._usuarios[user_id] = username
+        for placar in self._janelas.valores():
+            placar.renomear(user_id, username)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            **self._janelas.estatisticas(),
+            "cargas": self.cargas,
+            "segundos_carga": round(self.segundos_carga, 3),
+            "meses_carregados": len(self._carregados),
+            "meses_descartados": self.meses_descartados,
+        }
@@ -0,0 +1,242 @@
+import functools
+import inspect
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Rastreio instalado no processo (RASTREIO=1 ou PERFIL_TOKEN definido), lido na importação como
+# METRICAS em metricas_util. Sem ele, `rastreado` devolve a própria função.
+INSTALADO = str(os.getenv("RASTREIO", "0")).lower() in ("1", "true", "yes") or bool(os.getenv("PERFIL_TOKEN", "").strip())
+
+# Rastreio da requisição em andamento e o trecho aberto nele (0: a própria requisição).
+# Fora de uma requisição rastreada vale None e `trecho` devolve um contexto vazio.
+_atual: ContextVar[Optional[Tuple["Rastreio", int]]] = ContextVar("rastreio", default=None)
+
+
+class _Nulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, tipo, exc, tb):
+        return False
+
+
+_NULO = _Nulo()
+
+
+class Rastreio:
+    """
+    Trechos (spans) de uma requisição: nome, trecho pai, início e duração a partir do início da
+    requisição, thread e atributos. Os trechos podem ser registrados de qualquer thread que
+    herde o contexto (threadpool do FastAPI, ExecutorBanco) e são guardados crus; `exportar`
+    os formata (o ExportadorRastreio o chama fora da requisição). Acima de `trechos_max`,
+    são só contados em `descartados`. Com `perfil`, guarda também as threads com trechos
+    abertos, para o AmostradorPerfil.
+    """
+
+    def __init__(self, trechos_max: int = 500, perfil: bool = False):
+        self.id = "%016x" % random.getrandbits(64)
+        self.em = time.time()
+        self.inicio = time.perf_counter()
+        self.duracao = 0.0
+        # (id, pai, nome, início, fim, thread, atributos)
+        self.trechos: List[tuple] = []
+        self.trechos_max = trechos_max
+        self.descartados = 0
+        self._ids = itertools.count(1)
+        self.threads: Optional[Dict[int, int]] = {} if perfil else None
+
+    def ativar(self):
+        """Torna este o rastreio do contexto atual; devolve o token para `desativar`."""
+        return _atual.set((self, 0))
+
+    def desativar(self, token) -> None:
+        self.duracao = time.perf_counter() - self.inicio
+        _atual.reset(token)
+
+    def _registrar(self, nome: str, pai: int, id_: int, inicio: float, fim: float, atributos: Dict[str, Any]) -> None:
+        if len(self.trechos) >= self.trechos_max:
+            self.descartados += 1
+            return
+        self.trechos.append((id_, pai, nome, inicio, fim, threading.get_ident(), atributos))
+
+    def exportar(self, **campos) -> Dict[str, Any]:
+        nomes = {t.ident: t.name for t in threading.enumerate()}
+        trechos = [
+            {
+                "id": id_,
+                "pai": pai,
+                "nome": nome,
+                "inicio_ms": round(1000 * (inicio - self.inicio), 3),
+                "duracao_ms": round(1000 * (fim - inicio), 3),
+                "thread": nomes.get(thread, str(thread)),
+                **atributos,
+            }
+            for id_, pai, nome, inicio, fim, thread, atributos in sorted(self.trechos, key=lambda t: (t[3], t[0]))
+        ]
+        return {
+            "rastreio": self.id,
+            "em": self.em,
+            **campos,
+            "duracao_ms": round(1000 * self.duracao, 3),
+            "trechos": trechos,
+            "trechos_descartados": self.descartados,
+        }
+
+
+class _Trecho:
+    __slots__ = ("rastreio", "pai", "nome", "atributos", "id", "inicio", "_token")
+
+    def __init__(self, rastreio: Rastreio, pai: int, nome: str, atributos: Dict[str, Any]):
+        self.rastreio = rastreio
+        self.pai = pai
+        self.nome = nome
+        self.atributos = atributos
+
+    def __enter__(self):
+        rastreio = self.rastreio
+        self.id = next(rastreio._ids)
+        self._token = _atual.set((rastreio, self.id))
+        if rastreio.threads is not None:
+            thread = threading.get_ident()
+            rastreio.threads[thread] = rastreio.threads.get(thread, 0) + 1
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, exc, tb):
+        fim = time.perf_counter()
+        rastreio = self.rastreio
+        if rastreio.threads is not None:
+            thread = threading.get_ident()
+            if rastreio.threads.get(thread, 0) <= 1:
+                rastreio.threads.pop(thread, None)
+            else:
+                rastreio.threads[thread] -= 1
+        _atual.reset(self._token)
+        if tipo is not None:
+            self.atributos["erro"] = tipo.__name__
+        rastreio._registrar(self.nome, self.pai, self.id, self.inicio, fim, self.atributos)
+        return False
+
+
+def trecho(nome: str, **atributos):
+    """Contexto que registra um trecho no rastreio atual; sem rastreio, não faz nada (só lê o contexto)."""
+    atual = _atual.get()
+    if atual is None:
+        return _NULO
+    return _Trecho(atual[0], atual[1], nome, atributos)
+
+
+def registrar_trecho(nome: str, segundos: float, **atributos) -> None:
+    """Registra um trecho já medido (ex.: tempo somado de um gerador), terminando agora."""
+    atual = _atual.get()
+    if atual is None:
+        return
+    rastreio, pai = atual
+    fim = time.perf_counter()
+    rastreio._registrar(nome, pai, next(rastreio._ids), fim - segundos, fim, atributos)
+
+
+def rastreado(nome: str, **atributos) -> Callable[[Callable], Callable]:
+    """Decorador: cada chamada da função (síncrona ou async) vira um trecho `nome`."""
+    def decorar(funcao: Callable) -> Callable:
+        if not INSTALADO:
+            return funcao
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def corrotina(*args, **kwargs):
+                with trecho(nome, **atributos):
+                    return await funcao(*args, **kwargs)
+            return corrotina
+
+        @functools.wraps(funcao)
+        def chamada(*args, **kwargs):
+            with trecho(nome, **atributos):
+                return funcao(*args, **kwargs)
+        return chamada
+    return decorar
+
+
+class ExportadorRastreio:
+    """
+    Grava os rastreios em um arquivo JSONL (um rastreio por linha). A requisição só põe o
+    rastreio na fila; uma thread própria formata e grava o que houver a cada `intervalo`
+    segundos, em um único write com O_APPEND, então vários workers podem gravar no mesmo
+    arquivo. Com `fila_max` rastreios pendentes, os novos são descartados.
+    """
+
+    def __init__(self, arquivo: str, intervalo: float = 0.5, fila_max: int = 10000):
+        self.arquivo = arquivo
+        self.intervalo = intervalo
+        self.fila_max = fila_max
+        self._fila: Deque[Tuple[Rastreio, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.gravados = 0
+        self.descartados = 0
+        self.erros = 0
+
+    def _garantir_thread(self) -> None:
+        # Uma thread por processo (criada após o fork dos workers do gunicorn)
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._parar.clear()
+                    self._thread = threading.Thread(target=self._gravar, name="rastreio", daemon=True)
+                    self._pid = os.getpid()
+                    self._thread.start()
+
+    def enviar(self, rastreio: Rastreio, **campos) -> None:
+        self._garantir_thread()
+        if len(self._fila) >= self.fila_max:
+            self.descartados += 1
+            return
+        self._fila.append((rastreio, campos))
+
+    def _descarregar(self) -> None:
+        linhas = []
+        while self._fila:
+            rastreio, campos = self._fila.popleft()
+            linhas.append(json.dumps(rastreio.exportar(**campos), ensure_ascii=False, default=str))
+        if not linhas:
+            return
+        try:
+            fd = os.open(self.arquivo, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, ("\n".join(linhas) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+            self.gravados += len(linhas)
+        except OSError:
+            self.erros += len(linhas)
+
+    def _gravar(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self._descarregar()
+        self._descarregar()
+
+    def parar(self) -> None:
+        """Grava o que ainda estiver na fila e encerra a thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._parar.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "arquivo": self.arquivo,
+            "pendentes": len(self._fila),
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "erros": self.erros,
+        }
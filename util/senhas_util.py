@@ -0,0 +1,233 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from typing import Any, Callable, Dict, Optional
+
+from passlib.context import CryptContext
+
+from util.cache_util import AUSENTE, CacheLRU
+from util.metricas_util import metricas
+from util.rastreio_util import registrar_trecho
+
+# Esquema de criptografia: "bcrypt" é uma escolha forte e segura.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+DURACAO_SENHAS = metricas.histograma(
+    "senhas_duracao_segundos", "Hash e verificação de senhas (bcrypt), com a espera no pool", ("operacao",)
+)
+
+
+class FilaSenhasCheia(Exception):
+    """Hashing de senhas sobrecarregado; o cliente deve tentar de novo após `retry_after` segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Serviço de senhas ocupado; tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TempoSenhasEsgotado(Exception):
+    """A operação não terminou em `timeout` segundos (a fila não está necessariamente cheia)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Tempo esgotado no serviço de senhas; tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+
+
+# Executadas nos processos do pool (precisam ser funções de módulo para serem serializadas)
+def _gerar_hash(senha: str) -> str:
+    return pwd_context.hash(senha)
+
+
+def _verificar(senha: str, hash_senha: str) -> bool:
+    try:
+        return pwd_context.verify(senha, hash_senha)
+    except Exception:
+        # Hash inválido ou outro erro: senha não confere
+        return False
+
+
+class ExecutorSenhas:
+    """
+    Hash e verificação de senhas (bcrypt) em um pool de processos próprio, para que um pico
+    de logins não ocupe as threads e a CPU usadas pelos outros endpoints. No máximo `fila_max`
+    operações ficam pendentes (na fila ou em execução); acima disso a chamada falha na hora
+    com FilaSenhasCheia. Depois de `timeout` segundos a chamada falha com TempoSenhasEsgotado,
+    mas a vaga só volta quando o trabalho sai do pool (cancelado, se ainda estava na fila, ou
+    terminado). Com `processos=0`, executa na própria thread (sem pool).
+    """
+
+    def __init__(self, processos: int = 2, fila_max: int = 16, timeout: float = 10.0):
+        self.processos = max(0, int(processos))
+        self.fila_max = max(1, int(fila_max))
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(self.fila_max)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._latencias: "deque[float]" = deque(maxlen=1000)
+        self.pendentes = 0
+        self.concluidas = 0
+        self.rejeitadas = 0
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        # Um pool por processo, criado após o fork dos workers do gunicorn. Os processos do
+        # pool usam o contexto padrão (fork no Linux: sem reimportar o módulo principal, o que
+        # quebraria sob o streamlit) e só executam o bcrypt
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(self.processos)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _retry_after(self) -> int:
+        media = (sum(self._latencias) / len(self._latencias)) if self._latencias else 0.3
+        return max(1, math.ceil(self.pendentes * media / max(1, self.processos)))
+
+    def _reservar(self) -> float:
+        if not self._vagas.acquire(blocking=False):
+            with self._lock:
+                self.rejeitadas += 1
+            raise FilaSenhasCheia(self._retry_after())
+        with self._lock:
+            self.pendentes += 1
+        return time.perf_counter()
+
+    def _liberar(self, inicio: float, funcao: Callable[..., Any]) -> None:
+        # Chamada quando o trabalho termina; no pool, pelo callback do future (outra thread)
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            self.pendentes -= 1
+            self.concluidas += 1
+            self._latencias.append(duracao)
+        self._vagas.release()
+        DURACAO_SENHAS.observar((funcao.__name__.lstrip("_"),), duracao)
+
+    def _submeter(self, inicio: float, funcao: Callable[..., Any], *args):
+        try:
+            futuro = self._obter_pool().submit(funcao, *args)
+        except BaseException:
+            self._liberar(inicio, funcao)
+            raise
+        futuro.add_done_callback(lambda _: self._liberar(inicio, funcao))
+        return futuro
+
+    def _executar(self, funcao: Callable[..., Any], *args) -> Any:
+        inicio = self._reservar()
+        try:
+            if not self.processos:
+                try:
+                    return funcao(*args)
+                finally:
+                    self._liberar(inicio, funcao)
+            futuro = self._submeter(inicio, funcao, *args)
+            try:
+                return futuro.result(self.timeout)
+            except TempoEsgotado:
+                futuro.cancel()  # ainda na fila: não chega a rodar
+                raise TempoSenhasEsgotado(self._retry_after())
+        finally:
+            registrar_trecho(f"senhas.{funcao.__name__.lstrip('_')}", time.perf_counter() - inicio)
+
+    async def _executar_async(self, funcao: Callable[..., Any], *args) -> Any:
+        # Versão para rotas async: espera o processo do pool sem ocupar nenhuma thread
+        inicio = self._reservar()
+        try:
+            if not self.processos:
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(None, funcao, *args)
+                finally:
+                    self._liberar(inicio, funcao)
+            # wait_for cancela o future do asyncio, que cancela o do pool se ainda estiver na fila
+            futuro = self._submeter(inicio, funcao, *args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(futuro), self.timeout)
+            except asyncio.TimeoutError:
+                raise TempoSenhasEsgotado(self._retry_after())
+        finally:
+            registrar_trecho(f"senhas.{funcao.__name__.lstrip('_')}", time.perf_counter() - inicio)
+
+    def gerar_hash(self, senha: str) -> str:
+        return self._executar(_gerar_hash, senha)
+
+    def verificar(self, senha: str, hash_senha: str) -> bool:
+        return self._executar(_verificar, senha, hash_senha)
+
+    async def gerar_hash_async(self, senha: str) -> str:
+        return await self._executar_async(_gerar_hash, senha)
+
+    async def verificar_async(self, senha: str, hash_senha: str) -> bool:
+        return await self._executar_async(_verificar, senha, hash_senha)
+
+    def parar(self) -> None:
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            latencias = sorted(self._latencias)
+            return {
+                "processos": self.processos,
+                "fila_max": self.fila_max,
+                "pendentes": self.pendentes,
+                "concluidas": self.concluidas,
+                "rejeitadas": self.rejeitadas,
+                "latencia_media_ms": round(1000 * sum(latencias) / len(latencias), 2) if latencias else 0.0,
+                "latencia_p95_ms": round(1000 * latencias[int(0.95 * (len(latencias) - 1))], 2) if latencias else 0.0,
+                "latencia_max_ms": round(1000 * latencias[-1], 2) if latencias else 0.0,
+            }
+
+
+# Executor do processo, compartilhado por db_service e mongo_service
+executor_senhas = ExecutorSenhas(
+    processos=int(os.getenv("SENHAS_PROCESSOS", str(min(2, os.cpu_count() or 1)))),
+    fila_max=int(os.getenv("SENHAS_FILA_MAX", "16")),
+    timeout=float(os.getenv("SENHAS_TIMEOUT_SEGUNDOS", "10")),
+)
+
+
+class LimitadorFalhas:
+    """
+    Limita tentativas que falham por chave (ex.: username no login): depois de `max_falhas`
+    falhas dentro de `janela` segundos, a chave fica bloqueada até o fim da janela, sem
+    gastar CPU verificando senha. Guarda no máximo `tamanho_maximo` chaves (LRU).
+    """
+
+    def __init__(self, max_falhas: int = 5, janela: float = 300.0, tamanho_maximo: int = 100000):
+        self.max_falhas = max(1, int(max_falhas))
+        self.janela = float(janela)
+        self._falhas = CacheLRU(tamanho_maximo, ttl=self.janela, nome="falhas_login")
+        self._lock = threading.Lock()
+        self.bloqueios = 0
+
+    def bloqueado(self, chave: str) -> Optional[int]:
+        """Segundos até liberar a chave, ou None se ela pode tentar."""
+        registro = self._falhas.obter(chave)
+        if registro is AUSENTE or registro[0] < self.max_falhas:
+            return None
+        restante = registro[1] + self.janela - time.monotonic()
+        if restante <= 0:
+            return None
+        with self._lock:
+            self.bloqueios += 1
+        return max(1, math.ceil(restante))
+
+    def registrar_falha(self, chave: str) -> None:
+        with self._lock:
+            registro = self._falhas.obter(chave)
+            if registro is AUSENTE or registro[1] + self.janela <= time.monotonic():
+                # Primeira falha da janela: o TTL do cache conta a partir dela
+                self._falhas.definir(chave, [1, time.monotonic()])
+            else:
+                registro[0] += 1
+
+    def limpar(self, chave: str) -> None:
+        self._falhas.remover(chave)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {**self._falhas.estatisticas(), "max_falhas": self.max_falhas, "janela_segundos": self.janela, "bloqueios": self.bloqueios}